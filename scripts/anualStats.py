@@ -1,9 +1,10 @@
 import sqlite3
 import matplotlib.pyplot as plt
 from operator import add
+from db_utils import connect
 
 try:
-    sqliteConnection = sqlite3.connect('brueter.sqlite')
+    sqliteConnection = connect(readonly=True)
     cursor = sqliteConnection.cursor()
 except sqlite3.Error as error:
     print("Error while connecting to sqlite", error)
@@ -1,6 +1,7 @@
-import sqlite3
 import csv
 import os
+from db_utils import connect
+from geocode_store import csv_json, store
 
 DB = os.environ.get('BRUETER_DB', 'brueter.sqlite')
 IN_CSV = os.environ.get('BAD_COORDS_OUT', 'reports/geocode_bad_coords_results.csv')
@@ -9,7 +10,7 @@ if not os.path.exists(IN_CSV):
     print('Input CSV not found:', IN_CSV)
     raise SystemExit(1)
 
-conn = sqlite3.connect(DB)
+conn = connect(DB)
 cur = conn.cursor()
 
 rows = []
@@ -29,7 +30,6 @@ for r in rows:
     lat = r.get('lat')
     lon = r.get('lon')
     address = r.get('address') or ''
-    status = r.get('status') or ''
 
     if provider in ('osm', 'google') and lat and lon:
         try:
@@ -41,12 +41,10 @@ for r in rows:
             continue
 
         if provider == 'osm':
-            cur.execute('INSERT OR REPLACE INTO geolocation_osm(web_id, longitude, latitude, location, complete_response) VALUES (?,?,?,?,?)',
-                        (web_id_int, lonf, latf, address, status))
+            store(cur, 'osm', web_id_int, lonf, latf, address, csv_json(r))
             applied_osm += 1
         else:
-            cur.execute('INSERT OR REPLACE INTO geolocation_google(web_id, longitude, latitude, location, complete_response) VALUES (?,?,?,?,?)',
-                        (web_id_int, lonf, latf, address, status))
+            store(cur, 'google', web_id_int, lonf, latf, address, csv_json(r))
             applied_google += 1
         applied += 1
 
@@ -0,0 +1,45 @@
+"""Apply a changeset written by `nabuPageScraper.py --changeset=PATH` to brueter.sqlite in one transaction.
+
+Every change is checked against the DB first (see changeset.py); on a
+conflict nothing is written unless --force is given.
+
+Usage: python scripts/apply_changeset.py PATH [--db=brueter.sqlite] [--force]
+"""
+import os
+import sys
+
+from changeset import ChangesetConflict, apply_changeset
+from db_utils import connect
+
+DB = os.environ.get('BRUETER_DB', 'brueter.sqlite')
+
+
+def main():
+    db = DB
+    force = False
+    paths = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--db='):
+            db = arg.split('=', 1)[1]
+        elif arg == '--force':
+            force = True
+        else:
+            paths.append(arg)
+    if len(paths) != 1:
+        sys.exit(__doc__.strip().splitlines()[-1])
+    conn = connect(db)
+    try:
+        writer = apply_changeset(conn, paths[0], force=force)
+    except ChangesetConflict as e:
+        print(e)
+        print('Nothing was applied.')
+        sys.exit(1)
+    finally:
+        conn.close()
+    for line in writer.conflicts:
+        print('Applied despite conflict:', line)
+    print('Applied {}: {}, already applied {}'.format(paths[0], writer.summary(), writer.skipped))
+
+
+if __name__ == '__main__':
+    main()
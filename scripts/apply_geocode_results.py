@@ -1,6 +1,7 @@
-import sqlite3
 import csv
 import os
+from db_utils import connect
+from geocode_store import csv_json, store
 
 DB = os.environ.get('BRUETER_DB', 'brueter.sqlite')
 IN_CSV = 'reports/geocode_missing_results.csv'
@@ -12,7 +13,7 @@ def main():
     if not os.path.exists(IN_CSV):
         print('Input CSV not found:', IN_CSV)
         return
-    conn = sqlite3.connect(DB)
+    conn = connect(DB)
     cur = conn.cursor()
     updated = 0
     with open(IN_CSV, newline='', encoding='utf-8') as fh:
@@ -25,15 +26,13 @@ def main():
             address = row.get('address')
             if provider == 'osm' and not is_blank(lat) and not is_blank(lon):
                 try:
-                    cur.execute(('INSERT OR REPLACE INTO geolocation_osm (web_id, longitude, latitude, location, complete_response) '
-                                 'VALUES (?,?,?,?,?)'), (web_id, lon, lat, address, str(row)))
+                    store(cur, 'osm', web_id, lon, lat, address, csv_json(row))
                     updated += 1
                 except Exception as e:
                     print('DB write error for', web_id, e)
             elif provider == 'google' and not is_blank(lat) and not is_blank(lon):
                 try:
-                    cur.execute(('INSERT OR REPLACE INTO geolocation_google (web_id, longitude, latitude, location, complete_response) '
-                                 'VALUES (?,?,?,?,?)'), (web_id, lon, lat, address, str(row)))
+                    store(cur, 'google', web_id, lon, lat, address, csv_json(row))
                     updated += 1
                 except Exception as e:
                     print('DB write error for', web_id, e)
@@ -55,7 +54,7 @@ if not os.path.exists(IN_CSV):
     print('Input CSV not found:', IN_CSV)
     raise SystemExit(1)
 
-conn = sqlite3.connect(DB)
+conn = connect(DB)
 cur = conn.cursor()
 
 rows = []
@@ -75,7 +74,6 @@ for r in rows:
     lat = r.get('lat')
     lon = r.get('lon')
     address = r.get('address') or ''
-    status = r.get('status') or ''
 
     if provider in ('osm', 'google') and lat and lon:
         try:
@@ -87,12 +85,10 @@ for r in rows:
             continue
 
         if provider == 'osm':
-            cur.execute('INSERT OR REPLACE INTO geolocation_osm(web_id, longitude, latitude, location, complete_response) VALUES (?,?,?,?,?)',
-                        (int(web_id), lonf, latf, address, status))
+            store(cur, 'osm', int(web_id), lonf, latf, address, csv_json(r))
             applied_osm += 1
         else:
-            cur.execute('INSERT OR REPLACE INTO geolocation_google(web_id, longitude, latitude, location, complete_response) VALUES (?,?,?,?,?)',
-                        (int(web_id), lonf, latf, address, status))
+            store(cur, 'google', int(web_id), lonf, latf, address, csv_json(r))
             applied_google += 1
         applied += 1
 
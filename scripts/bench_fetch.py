@@ -0,0 +1,60 @@
+"""Benchmark: sequential urlopen loop vs. the asyncio crawl engine.
+
+Starts the local NABU stand-in (see nabu_standin.py) with a simulated round
+trip latency and reports pages per second for both variants. Both variants
+fetch and parse each page.
+
+Run: python scripts/bench_fetch.py [--pages 300] [--latency-ms 50] [--rps 0] [--max-in-flight 4] [--pages-dir DIR]
+"""
+import argparse
+import time
+from urllib.request import urlopen
+
+from nabu_parse import get_data
+from nabu_standin import start_server
+from crawl_engine import run_crawl
+
+
+def run_sequential(url, ids):
+    for web_id in ids:
+        get_data(web_id, urlopen(url + '?ID=' + str(web_id)).read())
+
+
+def run_concurrent(url, ids, rps, max_in_flight):
+    def check(web_id, record, error):
+        if error is not None:
+            raise error
+    run_crawl(ids, check, url=url, rps=rps, max_in_flight=max_in_flight)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--pages', type=int, default=300)
+    ap.add_argument('--latency-ms', type=float, default=50)
+    ap.add_argument('--rps', type=float, default=0, help='requests per second budget (0 = unlimited)')
+    ap.add_argument('--max-in-flight', type=int, default=4)
+    ap.add_argument('--pages-dir', help='replay saved pages instead of generated ones')
+    args = ap.parse_args()
+
+    server, url = start_server(pages_dir=args.pages_dir, latency_ms=args.latency_ms,
+                               web_ids=None if args.pages_dir else range(1, args.pages + 1))
+    ids = list(server.RequestHandlerClass.web_ids)[:args.pages]
+    try:
+        t0 = time.perf_counter()
+        run_sequential(url, ids)
+        seq = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        run_concurrent(url, ids, args.rps, args.max_in_flight)
+        conc = time.perf_counter() - t0
+    finally:
+        server.shutdown()
+
+    print(f'pages={len(ids)} latency={args.latency_ms}ms rps={args.rps or "unlimited"} max_in_flight={args.max_in_flight}')
+    print(f'sequential: {len(ids) / seq:8.1f} pages/s ({seq:.2f}s)')
+    print(f'concurrent: {len(ids) / conc:8.1f} pages/s ({conc:.2f}s)')
+    print(f'speedup   : {seq / conc:8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
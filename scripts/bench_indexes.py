@@ -0,0 +1,126 @@
+"""Benchmark of the web_id / filter indexes (schema migration 7) as the DB grows.
+
+For every size a synthetic brueter.sqlite is built at schema version 6
+(no indexes on gebaeudebrueter) and a copy is migrated to the current
+version. Both answer the queries the stages run:
+  lookup   single-row SELECT by web_id (geocode_bad_coords, compute_cleaned_street)
+  batch    RecordWriter's checksum SELECT for a batch of 200 web_ids
+  pending  generateLocationForPageMap's new IN (1, 2)
+  markers  count_markers' filtered three-way LEFT JOIN, web_id only
+  map      generateMultiSpeciesMap's filtered three-way LEFT JOIN
+Reports ms per query for both and whether the results are identical, and
+prints the query plans of the indexed DB with --plans.
+
+Usage: python scripts/bench_indexes.py [--sizes=1000,10000,100000] [--lookups=200] [--plans]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from db_utils import connect
+from migrations import MAP_ELIGIBLE, migrate
+
+QUERIES = {
+    'lookup': 'SELECT strasse, plz, ort FROM gebaeudebrueter WHERE web_id=?',
+    'batch': 'SELECT web_id, checksum, fp_address, fp_text, new FROM gebaeudebrueter WHERE web_id IN ({})',
+    'pending': 'SELECT web_id, strasse, ort, plz, beschreibung, new from gebaeudebrueter where new IN (1, 2)',
+    'markers': ('SELECT b.web_id, o.latitude AS osm_latitude, o.longitude AS osm_longitude, '
+                'gg.latitude AS google_latitude, gg.longitude AS google_longitude '
+                'FROM gebaeudebrueter b '
+                'LEFT JOIN geolocation_osm o ON b.web_id=o.web_id '
+                'LEFT JOIN geolocation_google gg ON b.web_id=gg.web_id '
+                'WHERE (b.is_test IS NULL OR b.is_test=0) AND (b.noSpecies IS NULL OR b.noSpecies=0)'),
+    'map': ('SELECT b.web_id, b.bezirk, b.plz, b.ort, b.strasse, b.strasse_original, b.beschreibung, '
+            'b.mauersegler, b.sperling, b.schwalbe, b.fledermaus, b.star, b.andere, '
+            'o.latitude AS osm_latitude, o.longitude AS osm_longitude, '
+            'gg.latitude AS google_latitude, gg.longitude AS google_longitude '
+            'FROM gebaeudebrueter b '
+            'LEFT JOIN geolocation_osm o ON b.web_id = o.web_id '
+            'LEFT JOIN geolocation_google gg ON b.web_id = gg.web_id '
+            'WHERE ' + MAP_ELIGIBLE.replace('is_test', 'b.is_test').replace('noSpecies', 'b.noSpecies')),
+}
+
+
+def build(path, size, rng):
+    """A version-6 DB with `size` records in random web_id order, 90% OSM / 50% Google coordinates."""
+    conn = connect(path, upgrade=False)
+    migrate(conn, verbose=False, target=6, backup=False)
+    web_ids = rng.sample(range(1, size * 3), size)
+    rows = []
+    for web_id in web_ids:
+        species = [int(rng.random() < 0.3) for _ in range(6)]
+        rows.append((web_id, 'Bezirk', 10000 + web_id % 900, 'Berlin', 'Straße {}'.format(web_id), 'Text ' * 20,
+                     'x{}'.format(web_id), rng.choice((0,) * 98 + (1, 2)), int(not any(species)),
+                     int(rng.random() < 0.001)) + tuple(species))
+    conn.executemany('INSERT INTO gebaeudebrueter (web_id, bezirk, plz, ort, strasse, beschreibung, checksum, new, '
+                     'noSpecies, is_test, mauersegler, sperling, schwalbe, fledermaus, star, andere) '
+                     'VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)', rows)
+    for table, share in (('geolocation_osm', 0.9), ('geolocation_google', 0.5)):
+        conn.executemany('INSERT INTO ' + table + ' (web_id, longitude, latitude, location, complete_response) '
+                         'VALUES (?, ?, ?, ?, ?)',
+                         [(web_id, 13.4, 52.5, 'Berlin', '{}') for web_id in web_ids if rng.random() < share])
+    conn.commit()
+    conn.close()
+    return web_ids
+
+
+def timed(conn, name, params_list):
+    """(ms per query, hash of all results; row order is not compared, the plans may differ in it)."""
+    query = QUERIES[name]
+    results = []
+    start = time.perf_counter()
+    for params in params_list:
+        sql = query.format(','.join('?' * len(params))) if name == 'batch' else query
+        results.append(conn.execute(sql, params).fetchall())
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / len(params_list), hash(repr([sorted(rows, key=repr) for rows in results]))
+
+
+def main():
+    opts = {'sizes': '1000,10000,100000', 'lookups': '200'}
+    for arg in sys.argv[1:]:
+        if arg.startswith('--') and '=' in arg:
+            key, value = arg[2:].split('=', 1)
+            if key not in opts:
+                sys.exit('unknown option --' + key)
+            opts[key] = value
+    plans = '--plans' in sys.argv[1:]
+    workdir = tempfile.mkdtemp(prefix='bench_indexes_')
+    rng = random.Random(7)
+    print('{:>8} {:>8} {:>11} {:>11} {:>8}'.format('rows', 'query', 'before ms', 'after ms', 'speedup'))
+    try:
+        for size in [int(s) for s in opts['sizes'].split(',')]:
+            before_path = os.path.join(workdir, 'before_{}.sqlite'.format(size))
+            after_path = os.path.join(workdir, 'after_{}.sqlite'.format(size))
+            web_ids = build(before_path, size, rng)
+            shutil.copy(before_path, after_path)
+            after = connect(after_path, upgrade=False)
+            migrate(after, verbose=False, backup=False)
+            before = connect(before_path, upgrade=False)
+            lookups = int(opts['lookups'])
+            params = {
+                'lookup': [(rng.choice(web_ids),) for _ in range(lookups)],
+                'batch': [tuple(rng.sample(web_ids, min(200, size))) for _ in range(max(1, lookups // 20))],
+                'pending': [()] * 5, 'markers': [()] * 3, 'map': [()] * 3,
+            }
+            for name in QUERIES:
+                before_ms, before_hash = timed(before, name, params[name])
+                after_ms, after_hash = timed(after, name, params[name])
+                print('{:8} {:>8} {:11.3f} {:11.3f} {:7.1f}x{}'.format(
+                    size, name, before_ms, after_ms, before_ms / after_ms,
+                    '' if before_hash == after_hash else '  RESULT DIFFERS'))
+                if plans:
+                    sql = QUERIES[name].format(','.join('?' * len(params[name][0])))
+                    for row in after.execute('EXPLAIN QUERY PLAN ' + sql, params[name][0]):
+                        print('{:>19}{}'.format('', row[3]))
+            before.close()
+            after.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Micro-benchmark: per-record cost of sanitize_date + stripped (nabu_normalize) vs the original code.
+
+Field values come from the raw-HTML archive when it has any, else from
+nabu_standin pages, plus every DATE_FIXUPS key and a few odd strings. Each
+record normalizes erstbeobachtung with sanitize_date and plz, ort, strasse,
+anhang with stripped, as get_data does. The results are compared with the
+original implementations first; any difference exits with status 1.
+
+"cold" clears the sanitize_date cache before every pass, "warm" keeps it.
+
+Usage: python scripts/bench_normalize.py [--pages=N] [--repeat=N] [--archive=DIR]
+"""
+import contextlib
+import io
+import sys
+import time
+import unicodedata
+
+import dateutil.parser as parser
+
+from nabu_normalize import DATE_FIXUPS, sanitize_date, stripped
+from nabu_parse import _extract_fast
+from page_archive import ARCHIVE_DIR
+from check_parser_parity import archived_pages, standin_pages
+
+STRIPPED_FIELDS = ('plz', 'ort', 'strasse', 'anhang')
+ODD_VALUES = ['12.6.12', '31.02.2019', '05.13.2019', ' 01.05.2019', '2019-05-01', 'irgendwann',
+              'Haupt\x00straße 1', 'Ort\u200b', 'PLZ\t12345\n', 'x', 'Straße ', '']
+
+
+def reference_sanitize_date(date_text):
+    """sanitize_date as it was before nabu_normalize (if-chain + dateutil for every value)."""
+    unkown = 'unbekannt'
+    if date_text == '':
+        return unkown
+    if date_text == 'unbekannt':
+        return unkown
+    if date_text == '?':
+        return unkown
+    if date_text == 'o.D.':
+        return unkown
+    if date_text == 'Salinger':
+        return unkown
+    if date_text == 'o.D. ':
+        return unkown
+    if date_text == 'Nicht angegeben':
+        return unkown
+
+    if date_text == 'Mai 2019':
+        date_text = '01.05.2019'
+    if date_text == 'Juni 2014, Mai 2016':
+        date_text = '01.06.2014'
+    if date_text == 'Juni 2019':
+        date_text = '01.06.2019'
+    if date_text == 'Mai 2018':
+        date_text = '01.05.2018'
+    if date_text == 'Mai 2016':
+        date_text = '01.05.2016'
+    if date_text == 'Sommer 2019':
+        date_text = '21.06.2019'
+    if date_text == 'Herbst 2019':
+        date_text = '23.09.2019'
+    if date_text == '18.06-15':
+        date_text = '18.06.2015'
+    if date_text == 'Juli 2019':
+        date_text = '01.07.2019'
+    if date_text == '004.05.2009':
+        date_text = '04.05.2009'
+    if date_text == '04.2018':
+        date_text = '01.04.2018'
+    if date_text == '28.06,16':
+        date_text = '28.06.2016'
+    if date_text == 'Mai 2015':
+        date_text = '01.05.2015'
+    if date_text == 'Juli 2020':
+        date_text = '01.07.2020'
+    if date_text == 'Juni 2020':
+        date_text = '01.06.2020'
+    if date_text == 'Mai 2020':
+        date_text = '01.05.2020'
+    if date_text == '30.06./02.07.18':
+        date_text = '02.07.2018'
+
+    try:
+        date = parser.parse(date_text,dayfirst=True)
+    except:
+        print('Cannot convert: ' + date_text)
+        return unkown
+
+    return date
+
+
+def reference_stripped(s):
+    return ''.join(ch for ch in s if unicodedata.category(ch)[0] != "C")
+
+
+def records(pages):
+    out = []
+    for web_id, body in pages:
+        f = _extract_fast(body)
+        if f is not None:
+            out.append((f['erstbeobachtung'],) + tuple(f[name] for name in STRIPPED_FIELDS))
+    for value in list(DATE_FIXUPS) + ODD_VALUES:
+        out.append((value, value, value, value, value))
+    return out
+
+
+def normalize_all(recs, date_fn, strip_fn):
+    return [(date_fn(d),) + tuple(strip_fn(v) for v in rest) for d, *rest in recs]
+
+
+def bench(recs, date_fn, strip_fn, repeat, before=None):
+    best = None
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        normalize_all(recs, date_fn, strip_fn)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    n = 500
+    repeat = 5
+    archive_dir = ARCHIVE_DIR
+    for arg in sys.argv[1:]:
+        if arg.startswith('--pages='):
+            n = int(arg.split('=', 1)[1])
+        elif arg.startswith('--repeat='):
+            repeat = int(arg.split('=', 1)[1])
+        elif arg.startswith('--archive='):
+            archive_dir = arg.split('=', 1)[1]
+    pages = list(archived_pages(archive_dir))[:n]
+    source = 'archive'
+    if not pages:
+        pages = list(standin_pages(n))
+        source = 'standin'
+    recs = records(pages)
+
+    # "Cannot convert" lines are expected for the odd values
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = normalize_all(recs, reference_sanitize_date, reference_stripped)
+        sanitize_date.cache_clear()
+        actual = normalize_all(recs, sanitize_date, stripped)
+        old = bench(recs, reference_sanitize_date, reference_stripped, repeat)
+        cold = bench(recs, sanitize_date, stripped, repeat, before=sanitize_date.cache_clear)
+        warm = bench(recs, sanitize_date, stripped, repeat)
+    mismatches = [(r, e, a) for r, e, a in zip(recs, expected, actual) if e != a]
+    for r, e, a in mismatches:
+        print('Mismatch for {!r}:\n  original: {!r}\n  new:      {!r}'.format(r, e, a))
+
+    print('{} records from {} ({} pages), best of {}'.format(len(recs), source, len(pages), repeat))
+    for label, seconds in (('original', old), ('nabu_normalize cold', cold), ('nabu_normalize warm', warm)):
+        print('{:20} {:8.2f} us/record  ({:.1f}x)'.format(label, seconds / len(recs) * 1e6, old / seconds))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
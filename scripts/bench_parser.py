@@ -0,0 +1,50 @@
+"""Micro-benchmark: records/s of get_data (targeted tokenizer) vs get_data_soup (BeautifulSoup).
+
+Pages come from the raw-HTML archive when it has any, else from nabu_standin.
+
+Usage: python scripts/bench_parser.py [--pages=N] [--repeat=N] [--archive=DIR]
+"""
+import sys
+import time
+
+from nabu_parse import get_data, get_data_soup
+from page_archive import ARCHIVE_DIR
+from check_parser_parity import archived_pages, standin_pages
+
+
+def bench(parse, pages, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for web_id, body in pages:
+            parse(web_id, body)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    n = 200
+    repeat = 3
+    archive_dir = ARCHIVE_DIR
+    for arg in sys.argv[1:]:
+        if arg.startswith('--pages='):
+            n = int(arg.split('=', 1)[1])
+        elif arg.startswith('--repeat='):
+            repeat = int(arg.split('=', 1)[1])
+        elif arg.startswith('--archive='):
+            archive_dir = arg.split('=', 1)[1]
+    pages = list(archived_pages(archive_dir))[:n]
+    source = 'archive'
+    if not pages:
+        pages = [(web_id, body.encode('utf-8')) for web_id, body in standin_pages(n)]
+        source = 'standin'
+    soup = bench(get_data_soup, pages, repeat)
+    fast = bench(get_data, pages, repeat)
+    print('{} pages from {}, best of {}'.format(len(pages), source, repeat))
+    print('get_data_soup: {:8.1f} records/s'.format(len(pages) / soup))
+    print('get_data:      {:8.1f} records/s  ({:.1f}x)'.format(len(pages) / fast, soup / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Scaling benchmark of the replay parse stage (parse_stage.py) over worker processes.
+
+Archives N nabu_standin pages into a temp dir (or uses --archive=DIR), then
+for each process count re-derives the whole table: parse_pages feeding one
+RecordWriter on a fresh brueter.sqlite. Reports records/s, the speedup over
+one process and whether every run wrote the same records.
+
+Usage: python scripts/bench_replay.py [--pages=2000] [--processes=1,2,4] [--chunk=64] [--archive=DIR]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from nabu_store import RecordWriter
+from page_archive import PageArchive, replay_records
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'initializeDB.sql')
+
+
+def build_archive(path, n):
+    from nabu_standin import render_detail
+    archive = PageArchive(path)
+    try:
+        for web_id in range(1, n + 1):
+            archive.store(web_id, render_detail(web_id).encode('utf-8'))
+    finally:
+        archive.close()
+
+
+def rederive(archive_dir, workdir, processes, chunk):
+    db = os.path.join(workdir, 'replay_{}.sqlite'.format(processes))
+    if os.path.exists(db):
+        os.remove(db)
+    conn = sqlite3.connect(db)
+    with open(SCHEMA, encoding='utf-8') as f:
+        conn.executescript(f.read())
+    writer = RecordWriter(conn)
+    start = time.perf_counter()
+    count = 0
+    for web_id, values, error in replay_records(archive_dir, processes=processes, chunk_size=chunk):
+        if error is None:
+            writer.write(values)
+            count += 1
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    checksums = conn.execute('SELECT GROUP_CONCAT(checksum) FROM (SELECT checksum FROM gebaeudebrueter '
+                             'ORDER BY web_id)').fetchone()[0]
+    conn.close()
+    return count, elapsed, checksums
+
+
+def main():
+    opts = {'pages': '2000', 'processes': ','.join(str(p) for p in sorted({1, 2, os.cpu_count() or 1})),
+            'chunk': '64', 'archive': ''}
+    for arg in sys.argv[1:]:
+        if arg.startswith('--') and '=' in arg:
+            key, value = arg[2:].split('=', 1)
+            if key not in opts:
+                sys.exit('unknown option --' + key)
+            opts[key] = value
+    with tempfile.TemporaryDirectory(prefix='bench_replay_') as workdir:
+        archive_dir = opts['archive']
+        if not archive_dir:
+            archive_dir = os.path.join(workdir, 'archive')
+            build_archive(archive_dir, int(opts['pages']))
+        print('{} cores; archive {}'.format(os.cpu_count(), archive_dir))
+        base = reference = None
+        for processes in [int(p) for p in opts['processes'].split(',')]:
+            count, elapsed, checksums = rederive(archive_dir, workdir, processes, int(opts['chunk']))
+            base = base or elapsed
+            reference = reference or checksums
+            print('{:3} processes: {:6} records in {:6.2f}s  {:8.1f} records/s  ({:.2f}x){}'.format(
+                processes, count, elapsed, count / elapsed, base / elapsed,
+                '' if checksums == reference else '  RESULT DIFFERS'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Throughput benchmark of the scraper entry points against the local NABU stand-in.
+
+Starts nabu_standin.py in-process (size, latency and error injection are
+configurable), creates a fresh brueter.sqlite from initializeDB.sql in a
+temp dir and runs each scenario in its own Python process:
+
+  crawl           nabuPageScraper.py               (empty DB, every page)
+  incremental     nabuPageScraper.py --incremental (listing diff + revisit sample)
+  refetch         full_refetch_and_diff.py         (empty HTTP cache, every page parsed)
+  refetch_cached  full_refetch_and_diff.py         (second run, 304 / body-hash hits)
+  replay          nabuPageScraper.py --replay      (archive only, no network)
+
+Per scenario it records wall time, pages fetched, records written, pages/s,
+time spent in get_data (summed over worker threads; not captured for the
+replay pool), time spent writing batches (RecordWriter.flush) and peak RSS,
+and writes everything to a JSON file. The temp dir (DB, archive, cache) is
+removed afterwards unless --keep is given.
+
+Usage: python scripts/bench_scrapers.py [--size=1000] [--latency-ms=0] [--error-rate=0]
+       [--rps=0] [--max-in-flight=8] [--scenarios=crawl,refetch,...] [--out=reports/bench_scrapers.json] [--keep]
+"""
+import contextlib
+import json
+import os
+import platform
+import runpy
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA = os.path.join(SCRIPTS_DIR, '..', 'initializeDB.sql')
+
+SCENARIOS = {
+    'crawl': ('nabuPageScraper.py', []),
+    'incremental': ('nabuPageScraper.py', ['--incremental']),
+    'refetch': ('full_refetch_and_diff.py', []),
+    'refetch_cached': ('full_refetch_and_diff.py', []),
+    'replay': ('nabuPageScraper.py', ['--replay']),
+}
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0), 1)
+
+
+def run_child(name, workdir):
+    """Run one scenario in this process and print its stats as JSON (last stdout line)."""
+    os.chdir(workdir)
+    lock = threading.Lock()
+    stats = {'pages_fetched': 0, 'records': 0, 'parse_seconds': 0.0, 'write_seconds': 0.0}
+
+    def timed(fn, key):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with lock:
+                    stats[key] += time.perf_counter() - start
+        return wrapper
+
+    def counted(fn):
+        def wrapper(*args, **kwargs):
+            with lock:
+                stats['pages_fetched'] += 1
+            return fn(*args, **kwargs)
+        return wrapper
+
+    # patch before the scrapers import these names
+    import nabu_fetch
+    import nabu_parse
+    import nabu_store
+    nabu_parse.get_data = timed(nabu_parse.get_data, 'parse_seconds')
+    nabu_fetch.fetch_detail = counted(nabu_fetch.fetch_detail)
+    nabu_fetch.fetch_detail_conditional = counted(nabu_fetch.fetch_detail_conditional)
+    flush = nabu_store.RecordWriter.flush
+    mark_unchanged = nabu_store.RecordWriter.mark_unchanged
+
+    def timed_flush(self):
+        start = time.perf_counter()
+        outcomes = flush(self)
+        stats['write_seconds'] += time.perf_counter() - start
+        stats['records'] += len(outcomes)
+        return outcomes
+
+    def counted_mark_unchanged(self, web_id):
+        stats['records'] += 1
+        return mark_unchanged(self, web_id)
+
+    nabu_store.RecordWriter.flush = timed_flush
+    nabu_store.RecordWriter.mark_unchanged = counted_mark_unchanged
+
+    script, args = SCENARIOS[name]
+    sys.argv = [script] + args
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        runpy.run_path(os.path.join(SCRIPTS_DIR, script), run_name='__main__')
+    elapsed = time.perf_counter() - start
+    done = stats['pages_fetched'] if name != 'replay' else stats['records']
+    stats.update({
+        'scenario': name,
+        'seconds': round(elapsed, 3),
+        'pages_per_second': round(done / elapsed, 1) if elapsed else None,
+        'parse_seconds': None if name == 'replay' else round(stats['parse_seconds'], 3),
+        'write_seconds': round(stats['write_seconds'], 3),
+        'peak_rss_mb': _peak_rss_mb(),
+    })
+    print(json.dumps(stats))
+
+
+def main():
+    opts = {'size': '1000', 'latency-ms': '0', 'error-rate': '0', 'rps': '0', 'max-in-flight': '8',
+            'scenarios': ','.join(SCENARIOS), 'out': os.path.join('reports', 'bench_scrapers.json')}
+    for arg in sys.argv[1:]:
+        if arg.startswith('--') and '=' in arg:
+            key, value = arg[2:].split('=', 1)
+            if key not in opts:
+                sys.exit('unknown option --' + key)
+            opts[key] = value
+    keep = '--keep' in sys.argv[1:]
+    from nabu_standin import start_server
+
+    size = int(opts['size'])
+    server, base_url = start_server(web_ids=range(1, size + 1), latency_ms=float(opts['latency-ms']),
+                                    error_rate=float(opts['error-rate']), error_codes=(500, 503, 0))
+    workdir = tempfile.mkdtemp(prefix='bench_scrapers_')
+    env = dict(os.environ, NABU_URL=base_url, SCRAPER_RPS=opts['rps'], SCRAPER_MAX_IN_FLIGHT=opts['max-in-flight'],
+               SCRAPER_BACKOFF_SECONDS=os.environ.get('SCRAPER_BACKOFF_SECONDS', '0.5'),
+               PAGE_ARCHIVE=os.path.join(workdir, 'archive'),
+               DETAIL_CACHE=os.path.join(workdir, 'cache', 'detail_cache.sqlite'),
+               PYTHONWARNINGS='ignore')
+    results = []
+    try:
+        conn = sqlite3.connect(os.path.join(workdir, 'brueter.sqlite'))
+        with open(SCHEMA, encoding='utf-8') as f:
+            conn.executescript(f.read())
+        conn.close()
+        for name in opts['scenarios'].split(','):
+            if name not in SCENARIOS:
+                sys.exit('unknown scenario ' + name)
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', name, workdir],
+                                  env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(proc.stderr)
+                sys.exit('scenario {} failed'.format(name))
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print('{:15} {:8.2f}s {:8.1f} pages/s  parse {}  write {}s  peak {} MB'.format(
+                name, result['seconds'], result['pages_per_second'],
+                '-' if result['parse_seconds'] is None else '{}s'.format(result['parse_seconds']),
+                result['write_seconds'], result['peak_rss_mb']))
+    finally:
+        server.shutdown()
+        if keep:
+            print('Kept', workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    out = opts['out']
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump({
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'config': {k: v for k, v in opts.items() if k != 'out'},
+            'workdir': workdir if keep else None,
+            'results': results,
+        }, f, indent=2)
+    print('Results written to', out)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,197 @@
+"""Changesets: scraped record changes as JSONL, written without touching the DB and applied later.
+
+`nabuPageScraper.py --changeset=PATH` crawls as usual but hands the records
+to ChangesetWriter instead of RecordWriter. brueter.sqlite is only opened
+read-only to look up the stored checksums (without it every record becomes
+an insert). Each line of the changeset is one insert or update:
+
+  {"op": "update", "web_id": 123, "old_checksum": "...", "new_checksum": "...",
+   "record": {"bezirk": ..., ..., "andere": 0}}
+
+apply_changeset() (scripts/apply_changeset.py) loads a changeset in a single
+transaction through RecordWriter. Every line is checked first: the record
+must still hash to new_checksum, and the DB must still hold old_checksum
+(or no row, for an insert). Lines that are already applied are skipped.
+Any other mismatch is a conflict and nothing is written unless forced.
+
+merge_changesets() combines the per-shard changesets of sharded_crawl.py.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from nabu_store import COLUMNS, WRITE_BATCH, RecordWriter
+
+RECORD_COLUMNS = COLUMNS[1:-1]
+
+
+class ChangesetConflict(Exception):
+    pass
+
+
+def _json_value(value):
+    # the sqlite3 datetime adapter stores the same text
+    return value.isoformat(' ') if isinstance(value, datetime) else value
+
+
+def _checksum(values):
+    return hashlib.sha3_224(''.join(map(str, values)).encode('utf-8')).hexdigest()
+
+
+def stored_checksums(conn, web_ids):
+    """{web_id: checksum} of the rows in gebaeudebrueter for web_ids (missing ids are absent)."""
+    stored = {}
+    web_ids = list(set(web_ids))
+    for i in range(0, len(web_ids), 500):
+        chunk = web_ids[i:i + 500]
+        query = 'SELECT web_id, checksum FROM gebaeudebrueter WHERE web_id IN ({})'.format(','.join('?' * len(chunk)))
+        stored.update(conn.execute(query, chunk).fetchall())
+    return stored
+
+
+class ChangesetWriter:
+    """RecordWriter stand-in that appends inserts/updates to a JSONL changeset instead of the DB.
+
+    `conn` (read-only is enough) supplies the stored checksums; with None
+    every record is written as an insert.
+    """
+
+    journal = None
+
+    def __init__(self, path, conn=None, batch_size=WRITE_BATCH):
+        self.path = path
+        self.conn = conn
+        self.batch_size = max(1, int(batch_size))
+        self.batch = []
+        self.added = []
+        self.updated = []
+        self.unchanged = []
+        self.address_changed = []
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, values):
+        self.batch.append(values)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def mark_unchanged(self, web_id):
+        self.unchanged.append(web_id)
+
+    def flush(self):
+        """Append the buffered records that differ from the DB; returns [(web_id, outcome)]."""
+        if not self.batch:
+            return []
+        batch, self.batch = self.batch, []
+        stored = stored_checksums(self.conn, [values[0] for values in batch]) if self.conn is not None else {}
+        outcomes = []
+        for values in batch:
+            web_id, checksum = values[0], values[-1]
+            old = stored.get(web_id)
+            if old == checksum:
+                outcome = 'unchanged'
+            else:
+                outcome = 'added' if old is None else 'updated'
+                self.file.write(json.dumps({
+                    'op': 'insert' if old is None else 'update',
+                    'web_id': web_id,
+                    'old_checksum': old,
+                    'new_checksum': checksum,
+                    'record': dict(zip(RECORD_COLUMNS, map(_json_value, values[1:-1]))),
+                }, ensure_ascii=False) + '\n')
+            stored[web_id] = checksum
+            outcomes.append((web_id, outcome))
+            getattr(self, outcome).append(web_id)
+        self.file.flush()
+        return outcomes
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def summary(self):
+        return 'changeset {}: {} inserts, {} updates, unchanged {}'.format(
+            self.path, len(self.added), len(self.updated), len(self.unchanged))
+
+
+def read_changeset(path):
+    """Yield the changeset lines as dicts."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def merge_changesets(shards, out_path):
+    """Merge shard changesets [(path, lo, hi)] into one, sorted by web_id; returns the number of changes.
+
+    Each web_id must lie in its shard's range [lo, hi) (hi None: open) and
+    appear in one shard only; otherwise ChangesetConflict is raised and
+    nothing is written. Within a shard the later line for a web_id wins.
+    """
+    merged = {}
+    owner = {}
+    problems = []
+    for path, lo, hi in shards:
+        for change in read_changeset(path):
+            web_id = change['web_id']
+            if web_id < lo or (hi is not None and web_id >= hi):
+                problems.append('ID = {} in {} is outside its range {}-{}'.format(web_id, path, lo, hi or ''))
+            elif owner.setdefault(web_id, path) != path:
+                problems.append('ID = {} is in {} and {}'.format(web_id, owner[web_id], path))
+            else:
+                first = merged.get(web_id)
+                if first is not None:
+                    change = dict(change, op=first['op'], old_checksum=first['old_checksum'])
+                merged[web_id] = change
+    if problems:
+        raise ChangesetConflict('Shards do not merge cleanly:\n  ' + '\n  '.join(problems))
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        for web_id in sorted(merged):
+            f.write(json.dumps(merged[web_id], ensure_ascii=False) + '\n')
+    return len(merged)
+
+
+def apply_changeset(conn, path, force=False):
+    """Apply a changeset in one transaction; returns the RecordWriter (added/updated/... lists).
+
+    Raises ChangesetConflict, before writing anything, if a record does not
+    match its checksum or the DB changed since the changeset was made
+    (force=True applies those lines anyway, corrupt records are never applied).
+    """
+    changes = {}
+    for change in read_changeset(path):
+        # a web_id crawled twice: the later record wins, checked against the first old_checksum
+        first = changes.get(change['web_id'])
+        if first is not None:
+            change = dict(change, op=first['op'], old_checksum=first['old_checksum'])
+        changes[change['web_id']] = change
+    stored = stored_checksums(conn, list(changes))
+    records = []
+    conflicts = []
+    skipped = 0
+    for web_id, change in sorted(changes.items()):
+        values = (web_id,) + tuple(change['record'][name] for name in RECORD_COLUMNS)
+        if _checksum(values) != change['new_checksum']:
+            raise ChangesetConflict('ID = {}: record does not match new_checksum'.format(web_id))
+        current = stored.get(web_id)
+        if current == change['new_checksum']:
+            skipped += 1
+            continue
+        if current != change['old_checksum']:
+            conflicts.append('ID = {}: {} expects checksum {}, DB has {}'.format(
+                web_id, change['op'], change['old_checksum'], current))
+        records.append(values + (change['new_checksum'],))
+    if conflicts and not force:
+        raise ChangesetConflict('{} of {} changes conflict with the DB:\n  {}'.format(
+            len(conflicts), len(changes), '\n  '.join(conflicts)))
+    # one batch -> one transaction
+    writer = RecordWriter(conn, batch_size=len(records) + 1)
+    for values in records:
+        writer.write(values)
+    writer.flush()
+    writer.skipped = skipped
+    writer.conflicts = conflicts
+    return writer
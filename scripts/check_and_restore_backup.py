@@ -1,32 +1,36 @@
+"""Restore the newest snapshot (db_backup.py) if it holds more gebaeudebrueter rows than the live DB."""
 import os
-import shutil
-import sqlite3
+
+from db_backup import BackupError, find_entry, restore, row_counts
+from db_utils import connect
 
 DB = 'brueter.sqlite'
-BACKUP = 'brueter.sqlite.bak'
-PRE_RESTORE = 'brueter.sqlite.pre_restore.bak'
 
 
 def count_rows(db_path):
     if not os.path.exists(db_path):
         return None
     try:
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        cur.execute("SELECT count(*) FROM gebaeudebrueter")
-        c = cur.fetchone()[0]
-        conn.close()
-        return c
+        conn = connect(db_path, readonly=True, upgrade=False)
+        try:
+            return row_counts(conn).get('gebaeudebrueter')
+        finally:
+            conn.close()
     except Exception as e:
         print(f"Error reading {db_path}: {e}")
         return None
 
 
 def main():
+    try:
+        entry = find_entry('latest')
+    except BackupError as e:
+        print(f"{e}. Nothing to restore.")
+        return
     print(f"Live DB: {DB}")
-    print(f"Backup : {BACKUP}")
+    print(f"Backup : {entry['id']} ({entry['file']})")
     live_count = count_rows(DB)
-    backup_count = count_rows(BACKUP)
+    backup_count = entry['rows'].get('gebaeudebrueter')
     print(f"Live count   = {live_count}")
     print(f"Backup count = {backup_count}")
 
@@ -37,18 +41,13 @@ def main():
         print("Live DB missing or unreadable. Restoring backup to live DB.")
     if backup_count > (live_count or 0):
         print("Backup has more entries than live DB — restoring.")
-        # create pre-restore backup of current DB
-        if os.path.exists(DB):
-            if not os.path.exists(PRE_RESTORE):
-                shutil.copyfile(DB, PRE_RESTORE)
-                print(f"Created pre-restore backup: {PRE_RESTORE}")
-            else:
-                print(f"Pre-restore backup already exists: {PRE_RESTORE}")
-        # restore
-        shutil.copyfile(BACKUP, DB)
-        print(f"Restored {BACKUP} -> {DB}")
-        new_count = count_rows(DB)
-        print(f"New live count = {new_count}")
+        # restore() snapshots the current DB first (label pre_restore)
+        try:
+            restore(entry['id'], DB)
+        except BackupError as e:
+            raise SystemExit(str(e))
+        print(f"Restored {entry['id']} -> {DB}")
+        print(f"New live count = {count_rows(DB)}")
     else:
         print("No restore needed: backup does not contain more entries.")
 
@@ -0,0 +1,176 @@
+"""Check that migrations.py brings every kind of DB it meets to the current schema.
+
+Migrates, in a temp dir, a set of fixture DBs (FIXTURES: an empty file, the
+initializeDB.sql schema with a duplicate web_id, a gebaeudebrueter-only DB
+like noSpecies.sqlite, duplicates with dd.mm.yyyy dates, a DB left at
+version 7 without the geolocation tables, a DB whose fingerprints the old
+step 5 back-filled) and copies of the real DBs given with --db (default:
+brueter.sqlite and noSpecies.sqlite, where present). For each it checks that:
+
+  - user_version reaches CURRENT_VERSION,
+  - no gebaeudebrueter row is lost (rows + gebaeudebrueter_duplicates),
+  - of duplicate web_ids the most recently updated row is kept,
+  - map_points matches a fresh derivation (map_points.stale_points),
+  - no fp_address is a hash of the stored (post-processed) address columns.
+
+Prints one line per DB and exits with status 1 on any failure. The real DBs
+themselves are never written.
+
+Usage: python scripts/check_migrations.py [--db=PATH ...]
+"""
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+from map_points import stale_points
+from migrations import CURRENT_VERSION, migrate
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'initializeDB.sql')
+
+_ROW = ("INSERT INTO gebaeudebrueter (web_id, plz, ort, strasse, update_date, mauersegler) "
+        "VALUES (?, 10115, 'Berlin', ?, ?, ?)")
+
+
+# strasse of the duplicate row migration 7 has to keep
+NEWEST = 'newest duplicate'
+
+
+def _records(conn, rows, newest=()):
+    """rows: (web_id, update_date); the rows at the positions in newest get strasse NEWEST."""
+    conn.executemany(_ROW, [(web_id, NEWEST if k in newest else 'Straße {}'.format(web_id), date, web_id % 2)
+                            for k, (web_id, date) in enumerate(rows)])
+
+
+def _initialize_db(conn):
+    with open(SCHEMA, encoding='utf-8') as f:
+        conn.executescript(f.read())
+    _records(conn, [(1, '2020-01-01 10:00:00'), (2, '2021-05-02 10:00:00'), (2, '2022-05-02 10:00:00')], newest={2})
+    conn.execute("INSERT INTO geolocation_osm (web_id, longitude, latitude, location, complete_response) "
+                 "VALUES (1, 13.4, 52.5, 'Straße 1', ?)", (str({'display_name': 'Straße 1, 10115, Berlin'}),))
+
+
+def _gebaeudebrueter_only(conn):
+    with open(SCHEMA, encoding='utf-8') as f:
+        conn.executescript(f.read())
+    conn.execute('DROP TABLE geolocation_google')
+    conn.execute('DROP TABLE geolocation_osm')
+    _records(conn, [(10, '2019-03-01 08:00:00'), (11, None)])
+
+
+def _converted_dates(conn):
+    # update_date as convert_date_format.py writes it; as text 31.12.2019 sorts after 01.02.2021
+    _gebaeudebrueter_only(conn)
+    _records(conn, [(20, '01.02.2021'), (20, '31.12.2019'), (21, None), (21, '15.06.2018'), (22, '2020-03-01 08:00:00'),
+                    (22, '02.03.2020')], newest={0, 3, 5})
+
+
+def _stuck_at_7(conn):
+    # what an older step 1 left behind on a gebaeudebrueter-only DB before step 8 failed
+    _gebaeudebrueter_only(conn)
+    conn.commit()
+    migrate(conn, verbose=False, target=7, backup=False)
+    conn.execute('DROP TABLE IF EXISTS geolocation_google')
+    conn.execute('DROP TABLE IF EXISTS geolocation_osm')
+
+
+def _backfilled_fingerprints(conn):
+    # what the old step 5 wrote: hashes of the stored columns, which generateLocationForPageMap.py rewrites
+    _initialize_db(conn)
+    conn.commit()
+    migrate(conn, verbose=False, target=9, backup=False)
+    rows = conn.execute('SELECT rowid, plz, ort, strasse FROM gebaeudebrueter').fetchall()
+    conn.executemany('UPDATE gebaeudebrueter SET fp_address=? WHERE rowid=?',
+                     [(_address_hash(row[1:]), row[0]) for row in rows])
+
+
+def _address_hash(values):
+    return hashlib.sha3_224('\x1f'.join(map(str, values)).encode('utf-8')).hexdigest()
+
+
+# name -> function filling a new DB
+FIXTURES = {
+    'empty': lambda conn: None,
+    'initializeDB.sql': _initialize_db,
+    'gebaeudebrueter only': _gebaeudebrueter_only,
+    'dd.mm.yyyy duplicates': _converted_dates,
+    'version 7 without geolocation tables': _stuck_at_7,
+    'version 9 with back-filled fingerprints': _backfilled_fingerprints,
+}
+
+
+def _count(conn, table):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone():
+        return 0
+    return conn.execute('SELECT COUNT(*) FROM "{}"'.format(table)).fetchone()[0]
+
+
+def check(path):
+    """Migrate the DB at path; returns the list of problems."""
+    conn = sqlite3.connect(path)
+    try:
+        before = _count(conn, 'gebaeudebrueter') + _count(conn, 'gebaeudebrueter_duplicates')
+        try:
+            migrate(conn, verbose=False, backup=False)
+        except sqlite3.Error as e:
+            return ['migration failed: {!r}'.format(e)]
+        problems = []
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != CURRENT_VERSION:
+            problems.append('schema version {}, expected {}'.format(version, CURRENT_VERSION))
+        after = _count(conn, 'gebaeudebrueter') + _count(conn, 'gebaeudebrueter_duplicates')
+        if after != before:
+            problems.append('{} records before, {} after'.format(before, after))
+        if _count(conn, 'gebaeudebrueter_duplicates'):
+            moved = conn.execute('SELECT COUNT(*) FROM gebaeudebrueter_duplicates WHERE strasse=?',
+                                 (NEWEST,)).fetchone()[0]
+            if moved:
+                problems.append('newest row of {} web_ids moved to gebaeudebrueter_duplicates'.format(moved))
+        stale = stale_points(conn)
+        if stale:
+            problems.append('{} stale map_points rows'.format(len(stale)))
+        backfilled = sum(fp == _address_hash(values) for fp, *values in conn.execute(
+            'SELECT fp_address, plz, ort, strasse FROM gebaeudebrueter WHERE fp_address IS NOT NULL'))
+        if backfilled:
+            problems.append('{} rows with back-filled fingerprints'.format(backfilled))
+        return problems
+    finally:
+        conn.close()
+
+
+def main():
+    dbs = [arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--db=')]
+    if not dbs:
+        dbs = [path for path in ('brueter.sqlite', 'noSpecies.sqlite') if os.path.exists(path)]
+    failed = 0
+    with tempfile.TemporaryDirectory(prefix='check_migrations_') as workdir:
+        cases = []
+        for k, (name, fill) in enumerate(FIXTURES.items()):
+            path = os.path.join(workdir, 'fixture_{}.sqlite'.format(k))
+            conn = sqlite3.connect(path)
+            fill(conn)
+            conn.commit()
+            conn.close()
+            cases.append((name, path))
+        for k, db in enumerate(dbs):
+            path = os.path.join(workdir, 'db_{}.sqlite'.format(k))
+            # backup API copy: includes commits still in the WAL, leaves the DB untouched
+            source = sqlite3.connect(Path(db).absolute().as_uri() + '?mode=ro', uri=True)
+            target = sqlite3.connect(path)
+            source.backup(target)
+            source.close()
+            target.close()
+            cases.append((db, path))
+        for name, path in cases:
+            problems = check(path)
+            failed += bool(problems)
+            print('{:40} {}'.format(name, 'ok' if not problems else '; '.join(problems)))
+    print('Checked {} DBs, {} failed'.format(len(cases), failed))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
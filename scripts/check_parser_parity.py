@@ -0,0 +1,96 @@
+"""Check that get_data gives exactly the same record as the BeautifulSoup reference.
+
+Runs both parsers over every page in the raw-HTML archive (latest body per
+web_id, see page_archive.py), over --standin synthetic pages from
+nabu_standin.py (default 100) and over the MARKUP_CASES fixtures: a stand-in
+page whose beschreibung textarea starts with markup the two parsers have to
+treat alike. Any difference in the record tuple or checksum is printed and
+the script exits with status 1; so does a run without any archive or
+stand-in page to check.
+
+Usage: python scripts/check_parser_parity.py [--archive=DIR] [--standin=N]
+"""
+import os
+import sys
+
+from nabu_parse import get_data, get_data_soup
+from page_archive import ARCHIVE_DIR, PageArchive
+
+
+# inserted at the start of the beschreibung textarea
+MARKUP_CASES = (
+    'x<script>var a = "<b>";</script>y',
+    'x<style>td { color: red }</style>y',
+    'x<template>b<i>c</i>d</template>y',
+    'a<i>b<template>c</i>d</template>e',
+    'a<ruby>b<rt>c</rt><rp>(</rp></ruby>d',
+    'a<noscript>b</noscript>c',
+    'a<b>b</i>c</b>d',
+    'a &amp; &lt;b&gt; &#228; &auml; &unknown; b',
+    'a<!-- comment -->b',
+    'a<br>b<br/>c',
+)
+
+
+def _result(parse, web_id, body):
+    try:
+        return parse(web_id, body)
+    except Exception as e:
+        return 'error: ' + repr(e)
+
+
+def archived_pages(path):
+    if not os.path.isdir(path):
+        return
+    archive = PageArchive(path)
+    try:
+        for web_id, digest in archive.latest():
+            if archive.has(digest):
+                yield web_id, archive.read(digest)
+    finally:
+        archive.close()
+
+
+def standin_pages(n):
+    from nabu_standin import render_detail
+    for web_id in range(1, n + 1):
+        yield web_id, render_detail(web_id)
+
+
+def markup_pages():
+    from nabu_standin import render_detail
+    for i, markup in enumerate(MARKUP_CASES, 1):
+        page = render_detail(i)
+        yield i, page.replace('<textarea name="beschreibung">', '<textarea name="beschreibung">' + markup, 1)
+
+
+def main():
+    archive_dir = ARCHIVE_DIR
+    standin = 100
+    for arg in sys.argv[1:]:
+        if arg.startswith('--archive='):
+            archive_dir = arg.split('=', 1)[1]
+        elif arg.startswith('--standin='):
+            standin = int(arg.split('=', 1)[1])
+    pages = list(archived_pages(archive_dir))
+    if standin:
+        pages += list(standin_pages(standin))
+    if not pages:
+        sys.exit('No pages to check: {} has no archived pages and --standin=0'.format(archive_dir))
+    pages += list(markup_pages())
+    mismatches = 0
+    for web_id, body in pages:
+        expected = _result(get_data_soup, web_id, body)
+        actual = _result(get_data, web_id, body)
+        if expected != actual:
+            mismatches += 1
+            print('Mismatch for ID = {}'.format(web_id))
+            print('  soup: {}'.format(expected))
+            print('  fast: {}'.format(actual))
+    print('Checked {} pages, {} mismatches'.format(len(pages), mismatches))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
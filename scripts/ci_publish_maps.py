@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 import subprocess
 import shutil
-import sqlite3
 import re
 import sys
 from pathlib import Path
 import datetime
 
+from db_utils import connect
+from migrations import migrate
+
 repo = Path.cwd()
 tmp = repo / 'out' / 'tmp_maps'
 db = repo / 'brueter.sqlite'
@@ -19,7 +21,14 @@ if not db.exists():
     print('DB not found:', db)
     sys.exit(2)
 
-shutil.copy(db, tmp / 'brueter.sqlite')
+# backup API copy (includes commits still in the WAL), brought to the current schema;
+# the live DB is not touched
+live = connect(str(db), readonly=True, upgrade=False)
+copy = connect(str(tmp / 'brueter.sqlite'), upgrade=False)
+live.backup(copy)
+live.close()
+migrate(copy, backup=False)
+copy.close()
 
 py = sys.executable
 scripts = [repo / 'scripts' / 'long_lat_to_map_by_species.py', repo / 'scripts' / 'generateLocationMap.py']
@@ -44,17 +53,10 @@ def extract_ids(path: Path):
 
 html_ids = extract_ids(species) | extract_ids(meldungen)
 
-con = sqlite3.connect(str(tmp / 'brueter.sqlite'))
+con = connect(str(tmp / 'brueter.sqlite'), readonly=True)
 cur = con.cursor()
-cur.execute('''
-        SELECT DISTINCT g.web_id
-        FROM gebaeudebrueter g
-        LEFT JOIN geolocation_osm o ON g.web_id=o.web_id
-        LEFT JOIN geolocation_google gg ON g.web_id=gg.web_id
-        WHERE (o.web_id IS NOT NULL OR gg.web_id IS NOT NULL)
-            AND (IFNULL(g.is_test,0)<>1)
-            AND (IFNULL(g.noSpecies,0)<>1)
-''')
+# the records the generators put on the maps (see map_points.py)
+cur.execute('SELECT web_id FROM map_points WHERE on_map = 1')
 geo_ids = set(r[0] for r in cur.fetchall())
 con.close()
 
@@ -1,11 +1,11 @@
-import sqlite3
-import shutil
 import os
 import datetime
 import re
 
+from db_utils import connect
+from db_backup import snapshot
+
 DB = 'brueter.sqlite'
-BACKUP = 'brueter.sqlite.bak'
 
 
 def parse_date(s):
@@ -53,14 +53,9 @@ def main():
     if not os.path.exists(DB):
         print(f"Database '{DB}' not found in current directory.")
         return
-    # backup
-    if not os.path.exists(BACKUP):
-        shutil.copyfile(DB, BACKUP)
-        print(f"Backup created: {BACKUP}")
-    else:
-        print(f"Backup already exists: {BACKUP}")
-
-    conn = sqlite3.connect(DB)
+    conn = connect(DB)
+    # backup (an unchanged DB reuses the existing snapshot file)
+    print(f"Backup created: {snapshot(conn, 'convert_date_format')['path']}")
     try:
         convert_table(conn, 'gebaeudebrueter', ['erstbeobachtung', 'update_date'])
         cur = conn.cursor()
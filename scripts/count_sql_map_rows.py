@@ -1,7 +1,7 @@
-import sqlite3
+from db_utils import connect
 
-conn = sqlite3.connect('brueter.sqlite')
+conn = connect(readonly=True)
 cur = conn.cursor()
-q = ("SELECT count(*) FROM gebaeudebrueter b LEFT JOIN geolocation_osm o ON b.web_id=o.web_id LEFT JOIN geolocation_google gg ON b.web_id=gg.web_id WHERE ((o.latitude IS NOT NULL AND o.longitude IS NOT NULL AND o.latitude!='None' AND o.longitude!='None') OR (gg.latitude IS NOT NULL AND gg.longitude IS NOT NULL AND gg.latitude!='None' AND gg.longitude!='None')) AND b.web_id!=1784")
+q = ("SELECT count(*) FROM map_points WHERE source IS NOT NULL AND web_id!=1784")
 print(cur.execute(q).fetchone()[0])
 conn.close()
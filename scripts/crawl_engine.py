@@ -0,0 +1,289 @@
+"""Asyncio crawl engine shared by the NABU scrapers.
+
+`crawl()` takes web_ids and yields (web_id, record, error) as detail pages
+complete. Throughput is bounded by one politeness budget: requests per second
+(SCRAPER_RPS) and max requests in flight (SCRAPER_MAX_IN_FLIGHT), see
+nabu_fetch.py. The blocking urlopen + parse runs in a small thread pool so the
+event loop only schedules work.
+
+Failures are classified (nabu_fetch.classify_error). Transient ones (timeout,
+5xx, network) are retried at the end of the run in up to SCRAPER_RETRIES
+rounds with jittered exponential backoff; a circuit breaker pauses all workers
+when many requests in a row fail, so an outage does not burn through the
+whole id list. Pages that still fail are yielded with a CrawlError.
+
+web_ids can also be an IdStream: a blocking id source (the listing download,
+see nabu_fetch.stream_listing / nabu_parse.iter_listing_ids) read on its own
+thread, so detail pages are fetched while the listing is still arriving.
+
+`run_crawl()` is the synchronous entry point used by nabuPageScraper.py,
+full_refetch_and_diff.py and scrape_missing_webids.py. It flushes the DB
+writer when the crawl finishes, fails or is cancelled (Ctrl+C).
+"""
+import asyncio
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from nabu_fetch import (URL, DEFAULT_RPS, DEFAULT_MAX_IN_FLIGHT, TIMEOUT, RETRIES, BACKOFF, BREAKER_THRESHOLD,
+                        BREAKER_COOLDOWN, TRANSIENT, classify_error, fetch_detail)
+from nabu_parse import get_data
+
+_DONE = object()
+
+
+class RateLimiter:
+    """Space request starts at least 1/rps seconds apart (rps <= 0 disables the limit)."""
+
+    def __init__(self, rps):
+        self.interval = 1.0 / rps if rps and rps > 0 else 0.0
+        self.next_slot = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class CircuitBreaker:
+    """Pause all workers after `threshold` consecutive transient failures (threshold <= 0 disables it).
+
+    The first pause lasts `cooldown` seconds; if the requests after a pause
+    fail again the next pause is twice as long (up to max_cooldown). Any
+    answer from the site, including a 404, closes the breaker again.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN, max_cooldown=600.0):
+        self.threshold = int(threshold)
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.opened = 0
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            delay = self.open_until - loop.time()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    def success(self):
+        self.failures = 0
+        self.cooldown = self.base_cooldown
+
+    def failure(self):
+        self.failures += 1
+        now = asyncio.get_running_loop().time()
+        if self.threshold > 0 and self.failures >= self.threshold and now >= self.open_until:
+            self.open_until = now + self.cooldown
+            self.opened += 1
+            print('Site looks down ({} failures in a row), pausing crawl for {:g}s'.format(
+                self.failures, self.cooldown))
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+
+
+class IdStream:
+    """Wrap a blocking iterable of web_ids so crawl() reads it on a background thread.
+
+    `ids` lists every id received so far (the whole listing once the crawl is done).
+    """
+
+    def __init__(self, iterable):
+        self.iterable = iterable
+        self.ids = []
+
+
+class _IterIds:
+    def __init__(self, iterable):
+        self.it = iter(iterable)
+
+    async def next(self):
+        return next(self.it, _DONE)
+
+    def close(self):
+        pass
+
+
+class _StreamIds:
+    """Feed an IdStream into an asyncio.Queue from a daemon thread."""
+
+    def __init__(self, stream, loop):
+        self.stream = stream
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.stop = threading.Event()
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def _put(self, item):
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+        except RuntimeError:  # event loop already closed
+            self.stop.set()
+
+    def _pump(self):
+        try:
+            for web_id in self.stream.iterable:
+                if self.stop.is_set():
+                    return
+                self._put(web_id)
+        except Exception as e:
+            self._put(e)
+        else:
+            self._put(_DONE)
+
+    async def next(self):
+        item = await self.queue.get()
+        if item is _DONE or isinstance(item, Exception):
+            # leave the end marker for the other workers
+            self.queue.put_nowait(item)
+            if item is not _DONE:
+                raise item
+            return _DONE
+        self.stream.ids.append(item)
+        return item
+
+    def close(self):
+        self.stop.set()
+
+
+class CrawlError(Exception):
+    """Final failure of a page; `kind` is nabu_fetch.classify_error() of the last exception."""
+
+    def __init__(self, kind, cause, attempts):
+        super().__init__(kind, cause, attempts)
+        self.kind = kind
+        self.cause = cause
+        self.attempts = attempts
+
+    def __str__(self):
+        return '{} after {} attempt(s): {!r}'.format(self.kind, self.attempts, self.cause)
+
+
+def backoff_delay(round_no, base=BACKOFF):
+    """Delay before retry round 1, 2, ...: base * 2**(round_no-1), jittered by +-50%."""
+    return base * 2 ** (round_no - 1) * random.uniform(0.5, 1.5)
+
+
+def fetch_and_parse(web_id, url=URL, timeout=TIMEOUT):
+    return get_data(web_id, fetch_detail(web_id, url, timeout))
+
+
+async def crawl(web_ids, url=URL, rps=DEFAULT_RPS, max_in_flight=DEFAULT_MAX_IN_FLIGHT, timeout=TIMEOUT,
+                job=fetch_and_parse, retries=RETRIES, backoff=BACKOFF, breaker=None):
+    """Yield (web_id, record, error) for every web_id in completion order.
+
+    `job(web_id, url, timeout)` runs in a worker thread and returns the record.
+    If it raises, error is a CrawlError (record is None); transient failures
+    are only reported once the retry rounds are used up. An exception from
+    an IdStream source (e.g. the listing download failing) ends the crawl
+    and is raised to the caller.
+    Closing the generator (or cancelling the task consuming it) stops all
+    workers; requests already on the wire finish in the background.
+    """
+    loop = asyncio.get_running_loop()
+    max_in_flight = max(1, int(max_in_flight))
+    limiter = RateLimiter(rps)
+    breaker = breaker if breaker is not None else CircuitBreaker()
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    results = asyncio.Queue(maxsize=max_in_flight * 2)
+    retry = []
+
+    async def worker(ids, attempt):
+        # all workers pull from the same source; safe because they share one thread
+        while True:
+            web_id = await ids.next()
+            if web_id is _DONE:
+                return
+            await breaker.wait()
+            await limiter.wait()
+            try:
+                record = await loop.run_in_executor(executor, job, web_id, url, timeout)
+            except Exception as e:
+                kind = classify_error(e)
+                if kind in TRANSIENT:
+                    breaker.failure()
+                    if attempt < retries:
+                        retry.append(web_id)
+                        continue
+                else:
+                    breaker.success()
+                await results.put((web_id, None, CrawlError(kind, e, attempt + 1)))
+            else:
+                breaker.success()
+                await results.put((web_id, record, None))
+
+    async def run_round(ids, attempt):
+        tasks = [asyncio.ensure_future(worker(ids, attempt)) for _ in range(max_in_flight)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            ids.close()
+            for task in tasks:
+                task.cancel()
+
+    failure = []
+
+    async def supervise():
+        try:
+            if isinstance(web_ids, IdStream):
+                await run_round(_StreamIds(web_ids, loop), 0)
+            else:
+                await run_round(_IterIds(web_ids), 0)
+            attempt = 0
+            while retry:
+                attempt += 1
+                ids = sorted(retry)
+                retry.clear()
+                delay = backoff_delay(attempt, backoff)
+                print('Retry round {}/{}: {} pages in {:.1f}s'.format(attempt, retries, len(ids), delay))
+                await asyncio.sleep(delay)
+                await run_round(_IterIds(ids), attempt)
+        except Exception as e:
+            failure.append(e)
+        await results.put(_DONE)
+
+    supervisor = asyncio.ensure_future(supervise())
+    try:
+        while True:
+            item = await results.get()
+            if item is _DONE:
+                break
+            yield item
+        await supervisor
+        if failure:
+            raise failure[0]
+    finally:
+        supervisor.cancel()
+        await asyncio.gather(supervisor, return_exceptions=True)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_crawl(web_ids, on_record, writer=None, **budget):
+    """Crawl web_ids and call on_record(web_id, record, error) for each finished page.
+
+    on_record runs on the calling thread, so it may use the caller's sqlite
+    connection. Returning False from it stops the crawl early. `writer.flush()`
+    is called however the crawl ends. `budget` is passed on to crawl()
+    (url, rps, max_in_flight, timeout, job, retries, backoff, breaker).
+    """
+    async def main():
+        pages = crawl(web_ids, **budget)
+        try:
+            async for web_id, record, error in pages:
+                if on_record(web_id, record, error) is False:
+                    break
+        finally:
+            await pages.aclose()
+
+    try:
+        asyncio.run(main())
+    finally:
+        if writer is not None:
+            writer.flush()
@@ -0,0 +1,76 @@
+"""Persistent crawl journal in brueter.sqlite.
+
+crawl_runs has one row per scraper run (finished_at stays NULL while it is
+running or after it died); crawl_journal has one row per processed web_id
+and run with its outcome ('added', 'updated', 'unchanged' or 'error').
+Journal rows go through the same connection as the records, so RecordWriter
+commits a batch and its journal entries together: after a crash the journal
+says exactly which records are in the DB.
+
+`--resume` continues the last unfinished run of a script: everything but
+errors is skipped, and the reports are built from the whole run.
+"""
+
+
+def ensure_journal_tables(conn, temp=False):
+    """Create the journal tables if missing; temp=True creates empty ones for a read-only connection."""
+    create = 'CREATE TEMP TABLE IF NOT EXISTS ' if temp else 'CREATE TABLE IF NOT EXISTS '
+    conn.execute(create + 'crawl_runs ('
+                 'run_id INTEGER PRIMARY KEY, script TEXT NOT NULL, started_at TEXT, finished_at TEXT, note TEXT)')
+    conn.execute(create + 'crawl_journal ('
+                 'run_id INTEGER NOT NULL, web_id INTEGER NOT NULL, outcome TEXT NOT NULL, error TEXT, at TEXT, '
+                 'PRIMARY KEY (run_id, web_id))')
+
+
+class CrawlJournal:
+    def __init__(self, conn, script, resume=False, note=None):
+        self.conn = conn
+        self.dirty = False
+        ensure_journal_tables(conn)
+        row = None
+        if resume:
+            row = conn.execute('SELECT run_id, note FROM crawl_runs WHERE script=? AND finished_at IS NULL '
+                               'ORDER BY run_id DESC LIMIT 1', (script,)).fetchone()
+        self.resumed = row is not None
+        if row is None:
+            cur = conn.execute('INSERT INTO crawl_runs (script, started_at, note) VALUES (?,DATETIME(\'now\'),?)',
+                               (script, note))
+            self.run_id, self.note = cur.lastrowid, note
+        else:
+            self.run_id, self.note = row
+        conn.commit()
+        self.done = {web_id for (web_id,) in conn.execute(
+            'SELECT web_id FROM crawl_journal WHERE run_id=? AND outcome<>\'error\'', (self.run_id,))}
+
+    def set_note(self, note):
+        self.conn.execute('UPDATE crawl_runs SET note=? WHERE run_id=?', (note, self.run_id))
+        self.conn.commit()
+        self.note = note
+
+    def record(self, web_id, outcome, error=None):
+        self.record_many([(web_id, outcome)], error)
+
+    def record_many(self, outcomes, error=None):
+        """Journal [(web_id, outcome)]; committed with the caller's next commit."""
+        self.conn.executemany('INSERT OR REPLACE INTO crawl_journal (run_id, web_id, outcome, error, at) '
+                              'VALUES (?,?,?,?,DATETIME(\'now\'))',
+                              [(self.run_id, web_id, outcome, error) for web_id, outcome in outcomes])
+        self.dirty = True
+
+    def commit(self):
+        if self.dirty:
+            self.conn.commit()
+            self.dirty = False
+
+    def ids(self, outcome):
+        return [web_id for (web_id,) in self.conn.execute(
+            'SELECT web_id FROM crawl_journal WHERE run_id=? AND outcome=? ORDER BY web_id', (self.run_id, outcome))]
+
+    def errors(self):
+        return self.conn.execute('SELECT web_id, error FROM crawl_journal WHERE run_id=? AND outcome=\'error\' '
+                                 'ORDER BY web_id', (self.run_id,)).fetchall()
+
+    def finish(self):
+        self.conn.execute('UPDATE crawl_runs SET finished_at=DATETIME(\'now\') WHERE run_id=?', (self.run_id,))
+        self.conn.commit()
+        self.dirty = False
@@ -0,0 +1,223 @@
+"""Online snapshots of brueter.sqlite through the SQLite backup API, deduplicated and pruned.
+
+snapshot() copies the DB with Connection.backup in steps of BACKUP_STEP_PAGES
+pages, so a crawl or geocoder writing meanwhile is only paused between steps
+(with WAL, readers are never blocked). It reads the committed state through
+SQLite, WAL included, so no checkpoint or file copy is needed. If another
+connection writes during the copy, SQLite restarts the copy. A busy DB
+therefore needs quiet moments for a backup to finish.
+
+Snapshots are stored by content: backups/snap_<sha256>.sqlite. Taking a
+snapshot of an unchanged DB adds an entry to backups/manifest.json, but no
+file. Every entry records the row count of each table for the restore check.
+
+After each snapshot the retention policy prunes entries. It keeps:
+  BACKUP_KEEP_LAST    the newest N entries (default 10)
+  BACKUP_KEEP_DAILY   the newest entry of each of the last N days (default 7)
+  BACKUP_KEEP_WEEKLY  the newest entry of each of the last N ISO weeks (default 8)
+Files that no entry references any more are deleted.
+
+restore() first verifies the snapshot's hash. It then snapshots the live DB
+(label pre_restore) and copies the snapshot into the live DB in one backup
+step. Finally it checks every table's row count against the manifest.
+
+Usage:
+  python scripts/db_backup.py [--db=brueter.sqlite] [--label=manual]   snapshot + prune
+  python scripts/db_backup.py --list
+  python scripts/db_backup.py --prune
+  python scripts/db_backup.py --restore=latest|<id>|<label> [--db=brueter.sqlite]
+Env: BRUETER_BACKUP_DIR (default backups), BACKUP_STEP_PAGES (default 1024),
+     BACKUP_STEP_SLEEP (seconds between steps, default 0.005), BACKUP_KEEP_*
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from db_utils import DB_PATH, connect
+
+BACKUP_DIR = os.environ.get('BRUETER_BACKUP_DIR', 'backups')
+STEP_PAGES = int(os.environ.get('BACKUP_STEP_PAGES', 1024))
+STEP_SLEEP = float(os.environ.get('BACKUP_STEP_SLEEP', 0.005))
+KEEP_LAST = int(os.environ.get('BACKUP_KEEP_LAST', 10))
+KEEP_DAILY = int(os.environ.get('BACKUP_KEEP_DAILY', 7))
+KEEP_WEEKLY = int(os.environ.get('BACKUP_KEEP_WEEKLY', 8))
+
+
+class BackupError(Exception):
+    pass
+
+
+def _manifest_path(backup_dir):
+    return os.path.join(backup_dir, 'manifest.json')
+
+
+def load_manifest(backup_dir=BACKUP_DIR):
+    """Snapshot entries, oldest first."""
+    try:
+        with open(_manifest_path(backup_dir), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def _save_manifest(backup_dir, entries):
+    tmp = _manifest_path(backup_dir) + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=1)
+    os.replace(tmp, _manifest_path(backup_dir))
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_counts(conn):
+    """{table: rows} for every table of the DB."""
+    tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table' "
+                                               "AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    return {name: conn.execute('SELECT COUNT(*) FROM "{}"'.format(name)).fetchone()[0] for name in tables}
+
+
+def snapshot(conn, label='manual', backup_dir=BACKUP_DIR, prune_after=True):
+    """Back up the DB of `conn` into backup_dir; returns the manifest entry (its 'path' is the snapshot file)."""
+    os.makedirs(backup_dir, exist_ok=True)
+    tmp = os.path.join(backup_dir, '.snapshot-{}.sqlite'.format(os.getpid()))
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    target = sqlite3.connect(tmp)
+    try:
+        conn.backup(target, pages=STEP_PAGES, sleep=STEP_SLEEP)
+        # a single self-contained file: opening the snapshot creates no -wal/-shm
+        target.execute('PRAGMA journal_mode=DELETE')
+        rows = row_counts(target)
+    finally:
+        target.close()
+    sha256 = _sha256(tmp)
+    name = 'snap_{}.sqlite'.format(sha256)
+    if os.path.exists(os.path.join(backup_dir, name)):
+        os.remove(tmp)
+    else:
+        os.replace(tmp, os.path.join(backup_dir, name))
+    created = datetime.now()
+    entry = {'id': '{}-{}'.format(created.strftime('%Y%m%d%H%M%S%f'), label), 'label': label,
+             'created': created.isoformat(timespec='seconds'), 'sha256': sha256, 'file': name, 'rows': rows}
+    entries = load_manifest(backup_dir) + [entry]
+    _save_manifest(backup_dir, entries)
+    if prune_after:
+        prune(backup_dir)
+    return dict(entry, path=os.path.join(backup_dir, name))
+
+
+def retained(entries, now=None):
+    """The entries the retention policy keeps (entries oldest first)."""
+    now = now or datetime.now()
+    # ids start with the creation time down to microseconds, so they sort chronologically
+    newest_first = sorted(entries, key=lambda e: e['id'], reverse=True)
+    keep = {e['id'] for e in newest_first[:KEEP_LAST]}
+    days, weeks = set(), set()
+    for entry in newest_first:
+        created = datetime.fromisoformat(entry['created'])
+        day, week = created.date(), created.isocalendar()[:2]
+        if now - created < timedelta(days=KEEP_DAILY) and day not in days:
+            days.add(day)
+            keep.add(entry['id'])
+        if now - created < timedelta(weeks=KEEP_WEEKLY) and week not in weeks:
+            weeks.add(week)
+            keep.add(entry['id'])
+    return [e for e in entries if e['id'] in keep]
+
+
+def prune(backup_dir=BACKUP_DIR):
+    """Apply the retention policy; returns the number of snapshot files deleted."""
+    entries = load_manifest(backup_dir)
+    kept = retained(entries)
+    if len(kept) != len(entries):
+        _save_manifest(backup_dir, kept)
+    referenced = {e['file'] for e in kept}
+    removed = 0
+    for path in Path(backup_dir).glob('snap_*.sqlite'):
+        if path.name not in referenced:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def find_entry(which, backup_dir=BACKUP_DIR):
+    """Manifest entry by id, 'latest' or label (newest match)."""
+    for entry in reversed(load_manifest(backup_dir)):
+        if which in ('latest', entry['id'], entry['label']):
+            return entry
+    raise BackupError('No snapshot {!r} in {}'.format(which, _manifest_path(backup_dir)))
+
+
+def restore(which='latest', db=DB_PATH, backup_dir=BACKUP_DIR):
+    """Restore a snapshot into db (after a pre_restore snapshot); returns the entry. Raises BackupError."""
+    entry = find_entry(which, backup_dir)
+    path = os.path.join(backup_dir, entry['file'])
+    if not os.path.exists(path) or _sha256(path) != entry['sha256']:
+        raise BackupError('Snapshot {} is missing or damaged: {}'.format(entry['id'], path))
+    source = sqlite3.connect(Path(path).absolute().as_uri() + '?mode=ro', uri=True)
+    live = connect(db, upgrade=False)
+    try:
+        if live.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0]:
+            snapshot(live, 'pre_restore', backup_dir, prune_after=False)
+        source.backup(live)
+    finally:
+        source.close()
+        live.close()
+    check = connect(db, readonly=True, upgrade=False)
+    try:
+        rows = row_counts(check)
+    finally:
+        check.close()
+    if rows != entry['rows']:
+        raise BackupError('Row counts after restoring {} differ: expected {}, found {}'.format(
+            entry['id'], entry['rows'], rows))
+    return entry
+
+
+def main():
+    db = DB_PATH
+    label = 'manual'
+    which = None
+    for arg in sys.argv[1:]:
+        if arg.startswith('--db='):
+            db = arg.split('=', 1)[1]
+        elif arg.startswith('--label='):
+            label = arg.split('=', 1)[1]
+        elif arg.startswith('--restore='):
+            which = arg.split('=', 1)[1]
+    if '--list' in sys.argv[1:]:
+        for entry in load_manifest():
+            print('{id:40} {created}  {file:.21}...  {rows}'.format(
+                **dict(entry, rows=sum(entry['rows'].values()))))
+        return
+    if '--prune' in sys.argv[1:]:
+        print('Removed {} snapshot files'.format(prune()))
+        return
+    if which is not None:
+        try:
+            entry = restore(which, db)
+        except BackupError as e:
+            sys.exit(str(e))
+        print('Restored {} into {}; row counts match ({} tables)'.format(entry['id'], db, len(entry['rows'])))
+        return
+    # any schema version can be backed up
+    conn = connect(db, readonly=True, upgrade=False)
+    try:
+        entry = snapshot(conn, label)
+    finally:
+        conn.close()
+    print('Snapshot {} -> {}'.format(entry['id'], entry['path']))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,9 @@
-import sqlite3
+from db_utils import connect
 
 DB = 'brueter.sqlite'
 
 def main():
-    conn = sqlite3.connect(DB)
+    conn = connect(DB, readonly=True)
     cur = conn.cursor()
     cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
     tables = [r[0] for r in cur.fetchall()]
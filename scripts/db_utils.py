@@ -0,0 +1,72 @@
+"""One place to open brueter.sqlite with the settings all scripts should share.
+
+connect() switches the DB to WAL, so readers (map generators, reports) no
+longer block the writer (scraper, geocoder) and vice versa, and sets:
+  synchronous=NORMAL   commits no longer fsync; WAL keeps the DB consistent after a crash
+  cache_size           page cache per connection (env SQLITE_CACHE_MB, default 64)
+  mmap_size            memory-mapped reads (env SQLITE_MMAP_MB, default 256)
+  temp_store=MEMORY    sort/temp tables in RAM
+  busy_timeout         wait for a concurrent writer instead of failing (env SQLITE_BUSY_TIMEOUT, seconds, default 30)
+
+connect(readonly=True) opens a read-only URI connection (`mode=ro`) for
+reporting scripts: it cannot write by accident and never takes the write lock.
+
+A writable connect() first brings the DB to the current schema
+(migrations.py, which snapshots the DB before steps that move or rewrite
+rows), so all scripts can rely on the current columns. A read-only open of an
+outdated DB raises SchemaError instead of migrating behind the caller's back;
+run the scraper or scripts/migrations.py first.
+
+WAL keeps recent commits in brueter.sqlite-wal until a checkpoint; back up
+with db_backup.snapshot() (backup API), or copy the file only after checkpoint().
+
+Env: BRUETER_DB (default brueter.sqlite)
+"""
+import os
+import sqlite3
+from pathlib import Path
+
+from migrations import CURRENT_VERSION, migrate, schema_version
+
+DB_PATH = os.environ.get('BRUETER_DB', 'brueter.sqlite')
+CACHE_MB = int(os.environ.get('SQLITE_CACHE_MB', 64))
+MMAP_MB = int(os.environ.get('SQLITE_MMAP_MB', 256))
+BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', 30))
+
+
+class SchemaError(Exception):
+    pass
+
+
+def connect(path=DB_PATH, readonly=False, upgrade=True, **kwargs):
+    """sqlite3.connect with WAL, the shared pragmas and the current schema; readonly=True opens it with mode=ro.
+
+    upgrade=False skips the migrations (changeset dry runs must not write at all)
+    and, for readonly=True, the schema version check.
+    """
+    kwargs.setdefault('timeout', BUSY_TIMEOUT)
+    if readonly:
+        # ro must not create a missing file, and mode=ro needs an URI
+        conn = sqlite3.connect(Path(path).absolute().as_uri() + '?mode=ro', uri=True, **kwargs)
+        version = schema_version(conn)
+        if upgrade and version < CURRENT_VERSION:
+            conn.close()
+            raise SchemaError('{} has schema version {}, current is {}; migrate it first with: '
+                              'python scripts/migrations.py --db={}'.format(path, version, CURRENT_VERSION, path))
+    else:
+        conn = sqlite3.connect(path, **kwargs)
+        if path != ':memory:':
+            conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA cache_size=-{}'.format(CACHE_MB * 1024))
+    conn.execute('PRAGMA mmap_size={}'.format(MMAP_MB * 1024 * 1024))
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA busy_timeout={}'.format(int(kwargs['timeout'] * 1000)))
+    if upgrade and not readonly:
+        migrate(conn)
+    return conn
+
+
+def checkpoint(conn):
+    """Move everything from the WAL into the main DB file (before copying the file)."""
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
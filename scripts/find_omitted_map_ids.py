@@ -1,22 +1,18 @@
-import sqlite3
 from pathlib import Path
 import re
 import csv
 
+from db_utils import connect
+
 DB = Path('brueter.sqlite')
 DOCS = Path('docs')
 OUT = Path('reports') / 'omitted_from_maps.csv'
 
 def geolocated_web_ids(db_path):
-    con = sqlite3.connect(db_path)
+    con = connect(str(db_path), readonly=True)
     cur = con.cursor()
-    cur.execute('''
-        SELECT DISTINCT g.web_id
-        FROM gebaeudebrueter g
-        LEFT JOIN geolocation_osm o ON g.web_id=o.web_id
-        LEFT JOIN geolocation_google gg ON g.web_id=gg.web_id
-        WHERE o.web_id IS NOT NULL OR gg.web_id IS NOT NULL
-    ''')
+    # records with usable coordinates (see map_points.py)
+    cur.execute('SELECT web_id FROM map_points WHERE source IS NOT NULL')
     rows = cur.fetchall()
     con.close()
     return set(r[0] for r in rows)
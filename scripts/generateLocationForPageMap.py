@@ -9,6 +9,9 @@ import re
 import sys
 import random
 from address_utils import sanitize_street, geocode_with_fallbacks
+from http_client import get_client, geopy_adapter_factory, format_stats
+from db_utils import connect
+from geocode_store import google_json, osm_json, store
 
 db_path = 'brueter.sqlite'
 for arg in sys.argv[1:]:
@@ -17,7 +20,7 @@ for arg in sys.argv[1:]:
         break
 db_path = os.environ.get('BRUETER_DB', db_path)
 try:
-    sqliteConnection = sqlite3.connect(db_path)
+    sqliteConnection = connect(db_path)
     cursor = sqliteConnection.cursor()
 except sqlite3.Error as error:
     print("Error while connecting to sqlite", error)
@@ -33,15 +36,16 @@ if not key:
 gmaps = None
 if key:
     try:
-        gmaps = googlemaps.Client(key=key)
+        gmaps = googlemaps.Client(key=key, requests_session=get_client().session)
     except Exception as e:
         print(f"WARN: Google client init failed: {e}. Proceeding without Google geocoding.")
 else:
     print('WARN: No Google API key found. Proceeding with OSM-only geocoding.')
 
-cursor.execute('SELECT web_id, strasse, ort, plz, beschreibung from gebaeudebrueter where new=1')
+cursor.execute('SELECT web_id, strasse, ort, plz, beschreibung, new from gebaeudebrueter where new IN (1, 2)')
 data = cursor.fetchall()
-# only updates new entries which are set to new=1
+# only updates new entries: new=1 address changed -> geocode; new=2 only text changed -> no geocoding,
+# just redo street flags and source prefix (set by the scrapers from the field fingerprints, see nabu_store.py)
 
 # Use a clear, identifiable user agent per Nominatim policy.
 # Include a way to contact or a project URL.
@@ -57,9 +61,11 @@ if ua_url:
     # prepend + per convention for URLs in UA
     ua_extra.append(f'+{ua_url}')
 ua = ua_base if not ua_extra else f"{ua_base} ({'; '.join(ua_extra)})"
+# Nominatim and Google share one pooled keep-alive session (http_client.py)
 locator = Nominatim(
     scheme='https',
     user_agent=ua,
+    adapter_factory=geopy_adapter_factory(),
 )
 # Be conservative with rate limiting to avoid overload denial.
 # Add retries and a wait between retries.
@@ -82,36 +88,35 @@ for arg in sys.argv[1:]:
             limit = int(arg.split("=", 1)[1])
         except Exception:
             pass
-for (web_id, strasse, ort, plz, beschreibung) in data:
+for (web_id, strasse, ort, plz, beschreibung, new) in data:
     if limit is not None and index >= limit:
         break
     clean_strasse, flags, original_strasse = sanitize_street(str(strasse))
     # If no street present after cleaning, skip geocoding (do not geocode by PLZ only)
     location = None
-    if clean_strasse:
+    used_addr = None
+    if clean_strasse and new == 1:
         # Try geocoding with fallback variants using the RateLimiter-wrapped geocode callable
         time.sleep(random.uniform(0.05, 0.25))
         try:
-            location, used_addr = geocode_with_fallbacks(lambda a: geocode(a, timeout=10), clean_strasse, plz or '', ort or 'Berlin', max_attempts=max_retries, pause=min_delay)
+            location, used_addr = geocode_with_fallbacks(lambda a: geocode(a, timeout=10, addressdetails=True), clean_strasse, plz or '', ort or 'Berlin', max_attempts=max_retries, pause=min_delay)
         except Exception as e:
             print(f"OSM geocode error for {web_id}: {e}.")
             location = None
-    else:
+    elif not clean_strasse:
         print(f"Skipping geocode for web_id {web_id}: no street provided")
     if location:
         point = tuple(location.point)
         latitude = str(point[0])
         longitude = str(point[1])
-        query = ('INSERT OR REPLACE INTO geolocation_osm'
-                 '(web_id, longitude, latitude, location, complete_response)'
-                 'VALUES (?,?,?,?,?)')
-        value = (web_id, longitude, latitude, str(location), str(location))
-        cursor.execute(query, value)
+        store(cursor, 'osm', web_id, longitude, latitude, str(location), osm_json(location))
     else:
         latitude = None
         longitude = None
+    address = used_addr or f"{clean_strasse}, {plz or ''}, {ort or 'Berlin'}, Deutschland"
     print(f'{web_id} {address}')
-    if gmaps:
+    # like OSM, Google needs a street (or an address OSM already resolved); no PLZ/Ort-only lookups
+    if gmaps and new == 1 and (clean_strasse or used_addr):
         try:
             geocode_result = gmaps.geocode(address)
             if geocode_result:
@@ -119,11 +124,7 @@ for (web_id, strasse, ort, plz, beschreibung) in data:
                 latitude = geocode_result[0]['geometry']['location']['lat']
                 location = geocode_result[0]['formatted_address']
                 print(location)
-                query = ('INSERT OR REPLACE INTO geolocation_google'
-                         '(web_id, longitude, latitude, location, complete_response)'
-                         'VALUES (?,?,?,?,?)')
-                value = (web_id, longitude, latitude, location, str(geocode_result))
-                cursor.execute(query, value)
+                store(cursor, 'google', web_id, longitude, latitude, location, google_json(geocode_result))
             else:
                 print(f"Google geocode returned no results for {web_id}.")
         except googlemaps.exceptions.ApiError as e:
@@ -143,7 +144,7 @@ for (web_id, strasse, ort, plz, beschreibung) in data:
         elif not new_beschreibung.startswith(prefix):
             new_beschreibung = prefix + new_beschreibung
 
-    # Persist flags and original street into gebaeudebrueter. Columns may be added via migration helper.
+    # Persist flags and original street into gebaeudebrueter (columns from migrations.py).
     query = ('UPDATE gebaeudebrueter SET new=0, strasse_original=?, has_comma=?, has_slash=?, has_range=?, '
              'multiple_numbers=?, multiple_streets=?, kept_text_after_number=?, beschreibung=? WHERE web_id=?')
     value = (
@@ -157,17 +158,13 @@ for (web_id, strasse, ort, plz, beschreibung) in data:
         new_beschreibung,
         web_id,
     )
-    try:
-        cursor.execute(query, value)
-    except sqlite3.OperationalError as e:
-        # If columns do not exist yet, fall back to updating only new flag.
-        print(f"DB update warning (missing columns?): {e}. Updating only new flag.")
-        query2 = ('UPDATE gebaeudebrueter set new=0 where web_id=?')
-        cursor.execute(query2, (web_id,))
+    cursor.execute(query, value)
     sqliteConnection.commit()
     print(f'{len(data)}, {index}')
     index += 1
-    time.sleep(0.5)
+    if new == 1:
+        time.sleep(0.5)
 
+print(format_stats())
 if (sqliteConnection):
     sqliteConnection.close()
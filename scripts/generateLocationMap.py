@@ -1,6 +1,7 @@
 import sqlite3
 import folium
 from folium import plugins
+from db_utils import connect
 
 # Zentrale Konfiguration für dieses Skript
 CONFIG = {
@@ -9,9 +10,9 @@ CONFIG = {
     'NABU_BASE_URL': 'http://www.gebaeudebrueter-in-berlin.de/index.php',
 }
 
-# Generate Meldungen map from database, prefer OSM coords then Google as fallback
+# Generate Meldungen map from database; map_points picks OSM coords, else Google (see map_points.py)
 try:
-    conn = sqlite3.connect(CONFIG['DB_PATH'])
+    conn = connect(CONFIG['DB_PATH'], readonly=True)
     conn.row_factory = sqlite3.Row
     cur = conn.cursor()
 except Exception as e:
@@ -22,12 +23,11 @@ map1 = folium.Map(location=[52.5163,13.3777], tiles='cartodbpositron', zoom_star
 marker_cluster = plugins.MarkerCluster()
 map1.add_child(marker_cluster)
 
-query = ("SELECT b.web_id, b.bezirk, b.plz, b.ort, b.strasse, b.anhang, b.erstbeobachtung, b.beschreibung, b.besonderes, "
-         "o.latitude AS osm_latitude, o.longitude AS osm_longitude, gg.latitude AS google_latitude, gg.longitude AS google_longitude "
-         "FROM gebaeudebrueter b "
-         "LEFT JOIN geolocation_osm o ON b.web_id = o.web_id "
-         "LEFT JOIN geolocation_google gg ON b.web_id = gg.web_id "
-         "WHERE (b.is_test IS NULL OR b.is_test=0) AND (b.noSpecies IS NULL OR b.noSpecies=0)")
+query = ("SELECT p.web_id, b.bezirk, b.plz, b.ort, b.strasse, b.anhang, b.erstbeobachtung, b.beschreibung, b.besonderes, "
+         "p.latitude, p.longitude "
+         "FROM map_points p "
+         "JOIN gebaeudebrueter b ON b.web_id = p.web_id "
+         "WHERE p.on_map = 1 ORDER BY p.web_id")
 
 cur.execute(query)
 rows = cur.fetchall()
@@ -35,23 +35,9 @@ url = CONFIG['NABU_BASE_URL']
 count = 0
 for r in rows:
     web_id = r['web_id']
-    # test rows are excluded via the SQL WHERE clause (is_test)
-    # prefer osm, fallback to google
-    lat = None
-    lon = None
-    if r['osm_latitude'] is not None and str(r['osm_latitude']) != 'None':
-        lat = r['osm_latitude']
-        lon = r['osm_longitude']
-    elif r['google_latitude'] is not None and str(r['google_latitude']) != 'None':
-        lat = r['google_latitude']
-        lon = r['google_longitude']
-    if lat is None or lon is None:
-        continue
-    try:
-        latf = float(lat)
-        lonf = float(lon)
-    except Exception:
-        continue
+    # test rows, rows without species and rows without coordinates are excluded via on_map
+    latf = r['latitude']
+    lonf = r['longitude']
 
     popup_html = (
         f"<b>Adresse</b><br/>{r['strasse']}, {r['plz']} {r['ort']}"
@@ -4,6 +4,7 @@ import folium
 from folium import plugins
 import json
 from urllib.parse import quote
+from db_utils import connect
 
 # Konfiguration zentral an einer Stelle
 CONFIG = {
@@ -748,7 +749,7 @@ def build_divicon_html(species, status_key, all_statuses, address_text):
 
 
 def main():
-  conn = sqlite3.connect(DB_PATH)
+  conn = connect(DB_PATH, readonly=True)
   conn.row_factory = sqlite3.Row
   cur = conn.cursor()
 
@@ -777,54 +778,24 @@ def main():
   marker_cluster = plugins.MarkerCluster()
   m.add_child(marker_cluster)
 
+  # map_points holds the coordinate choice (OSM, else Google) and the eligibility, see map_points.py
   query = (
-    "SELECT b.web_id, b.bezirk, b.plz, b.ort, b.strasse, b.strasse_original, b.anhang, b.erstbeobachtung, b.beschreibung, b.besonderes, "
-    "b.mauersegler, b.sperling, b.schwalbe, b.fledermaus, b.star, b.andere, "
-    "b.sanierung, b.ersatz, b.kontrolle, b.verloren, "
-    "o.latitude AS osm_latitude, o.longitude AS osm_longitude, gg.latitude AS google_latitude, gg.longitude AS google_longitude "
-    "FROM gebaeudebrueter b "
-    "LEFT JOIN geolocation_osm o ON b.web_id = o.web_id "
-    "LEFT JOIN geolocation_google gg ON b.web_id = gg.web_id "
-    "WHERE (b.is_test IS NULL OR b.is_test=0) AND (b.noSpecies IS NULL OR b.noSpecies=0)"
+    "SELECT p.web_id, b.bezirk, b.plz, b.ort, b.strasse, b.strasse_original, b.anhang, b.erstbeobachtung, b.beschreibung, b.besonderes, "
+    "p.mauersegler, p.sperling, p.schwalbe, p.fledermaus, p.star, p.andere, "
+    "p.sanierung, p.ersatz, p.kontrolle, p.verloren, p.latitude, p.longitude "
+    "FROM map_points p "
+    "JOIN gebaeudebrueter b ON b.web_id = p.web_id "
+    "WHERE p.on_map = 1 ORDER BY p.web_id"
   )
-  try:
-    cur.execute(query)
-  except sqlite3.OperationalError:
-    # fallback for older DB schema without strasse_original or is_test
-    # fallback without schema-dependent filters/columns
-    fallback_query = (
-      "SELECT b.web_id, b.bezirk, b.plz, b.ort, b.strasse, b.anhang, b.erstbeobachtung, b.beschreibung, b.besonderes, "
-      "b.mauersegler, b.sperling, b.schwalbe, b.fledermaus, b.star, b.andere, "
-      "b.sanierung, b.ersatz, b.kontrolle, b.verloren, "
-      "o.latitude AS osm_latitude, o.longitude AS osm_longitude, gg.latitude AS google_latitude, gg.longitude AS google_longitude "
-      "FROM gebaeudebrueter b "
-      "LEFT JOIN geolocation_osm o ON b.web_id = o.web_id "
-      "LEFT JOIN geolocation_google gg ON b.web_id = gg.web_id "
-      "WHERE 1=1"
-    )
-    cur.execute(fallback_query)
+  cur.execute(query)
 
   rows = cur.fetchall()
   url = CONFIG['NABU_BASE_URL']
 
   count = 0
   for r in rows:
-    lat = None
-    lon = None
-    # prefer Google coordinates when available, fall back to OSM
-    if r['google_latitude'] is not None and str(r['google_latitude']) != 'None':
-      lat = r['google_latitude']
-      lon = r['google_longitude']
-    elif r['osm_latitude'] is not None and str(r['osm_latitude']) != 'None':
-      lat = r['osm_latitude']
-      lon = r['osm_longitude']
-    if lat is None or lon is None:
-      continue
-    try:
-      latf = float(lat)
-      lonf = float(lon)
-    except Exception:
-      continue
+    latf = r['latitude']
+    lonf = r['longitude']
 
     species = species_list_from_row(r)
     primary_status, all_statuses = pick_primary_status(r)
@@ -832,13 +803,8 @@ def main():
     fund_text = ', '.join(species) if species else 'andere Art'
     status_names = [STATUS_INFO[k]['label'] for k in all_statuses]
     status_text = ', '.join(status_names) if status_names else '—'
-    # prefer original street entry for display when present (fallback if column missing)
-    addr_field = None
-    try:
-      if r['strasse_original'] and str(r['strasse_original']).strip():
-        addr_field = r['strasse_original']
-    except Exception:
-      addr_field = None
+    # prefer original street entry for display when present
+    addr_field = r['strasse_original'] if r['strasse_original'] and str(r['strasse_original']).strip() else None
     if not addr_field:
       addr_field = r['strasse']
     popup_html = (
@@ -3,12 +3,12 @@ import os
 import re
 import time
 from typing import Optional
-import sqlite3
 from datetime import datetime
 from geopy.extra.rate_limiter import RateLimiter
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderServiceError, GeocoderTimedOut, GeocoderUnavailable
 import googlemaps
+from http_client import get_client, geopy_adapter_factory, format_stats
 
 INPUT_CSV = os.environ.get('BAD_COORDS_CSV', 'reports/bad_coords.csv')
 OUTPUT_CSV = os.environ.get('BAD_COORDS_OUT', 'reports/geocode_bad_coords_results.csv')
@@ -36,18 +36,20 @@ min_delay = float(os.environ.get('GEOCODE_MIN_DELAY_SECONDS', '1.5'))
 error_wait = float(os.environ.get('GEOCODE_ERROR_WAIT_SECONDS', '5.0'))
 max_retries = int(os.environ.get('GEOCODE_MAX_RETRIES', '3'))
 
-locator = Nominatim(scheme='https', user_agent=UA)
+# Nominatim and Google share one pooled keep-alive session (http_client.py)
+locator = Nominatim(scheme='https', user_agent=UA, adapter_factory=geopy_adapter_factory())
 geocode = RateLimiter(locator.geocode, min_delay_seconds=min_delay, max_retries=max_retries, error_wait_seconds=error_wait)
 
 GMAPS: Optional[googlemaps.Client] = None
 if GOOGLE_KEY:
     try:
-        GMAPS = googlemaps.Client(key=GOOGLE_KEY)
+        GMAPS = googlemaps.Client(key=GOOGLE_KEY, requests_session=get_client().session)
     except Exception:
         GMAPS = None
 
 
 from address_utils import sanitize_street, geocode_with_fallbacks
+from db_utils import connect
 
 
 def _write_no_geocode_mark(web_id, reason, script_name='geocode_bad_coords'):
@@ -105,7 +107,7 @@ def geocode_address(address: str):
 
 def main():
     # open DB connection for address lookup
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect(DB_PATH)
     cur = conn.cursor()
 
     # read CSV
@@ -152,6 +154,7 @@ def main():
             w.writerow(row)
 
     print(f'Done. Processed {len(rows)} rows. Output: {OUTPUT_CSV}')
+    print(format_stats())
 
 
 if __name__ == '__main__':
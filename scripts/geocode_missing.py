@@ -3,11 +3,12 @@ import csv
 import time
 import re
 import sqlite3
-import requests
 from datetime import datetime
 from geopy.geocoders import Nominatim
 from urllib.parse import urlencode
 from address_utils import sanitize_street, geocode_with_fallbacks
+from http_client import get_client, geopy_adapter_factory, format_stats
+from db_utils import connect
 
 MISSING_CSV = os.environ.get('MISSING_CSV') or ('reports/missing_coords_cleaned.csv' if os.path.exists('reports/missing_coords_cleaned.csv') else 'reports/missing_coords.csv')
 OUT_CSV = 'reports/geocode_missing_results.csv'
@@ -27,7 +28,9 @@ if not GOOGLE_KEY:
 # Control provider order via env var OSM_FIRST (default true). Set OSM_FIRST=0 to use Google-first.
 OSM_FIRST = os.environ.get('OSM_FIRST', '1').lower() in ('1', 'true', 'yes')
 
-geolocator = Nominatim(user_agent='gebauedebrueter_geocoder')
+# Nominatim and Google share one pooled keep-alive session (http_client.py)
+http = get_client()
+geolocator = Nominatim(user_agent='gebauedebrueter_geocoder', adapter_factory=geopy_adapter_factory())
 
 
 def _write_no_geocode_mark(web_id, reason, script_name='geocode_missing'):
@@ -59,7 +62,7 @@ osm_success = 0
 none = 0
 
 # open DB so we can mark records that should be excluded from geocoding
-db = sqlite3.connect('brueter.sqlite')
+db = connect()
 db.row_factory = sqlite3.Row
 dbc = db.cursor()
 
@@ -137,7 +140,7 @@ for r in rows:
             params = {'address': addr, 'key': GOOGLE_KEY}
             url = 'https://maps.googleapis.com/maps/api/geocode/json?' + urlencode(params)
             try:
-                resp = requests.get(url, timeout=10)
+                resp = http.get(url, timeout=10)
                 j = resp.json()
                 st = j.get('status')
                 if st == 'OK' and j.get('results'):
@@ -161,7 +164,7 @@ for r in rows:
             params = {'address': addr, 'key': GOOGLE_KEY}
             url = 'https://maps.googleapis.com/maps/api/geocode/json?' + urlencode(params)
             try:
-                resp = requests.get(url, timeout=10)
+                resp = http.get(url, timeout=10)
                 j = resp.json()
                 st = j.get('status')
                 if st == 'OK' and j.get('results'):
@@ -215,4 +218,5 @@ print('google_success=', google_success)
 print('google_fail=', google_fail)
 print('osm_success=', osm_success)
 print('none=', none)
+print(format_stats())
 db.close()
@@ -0,0 +1,77 @@
+"""Geocoder responses as JSON in geolocation_osm / geolocation_google, with the common fields as columns.
+
+complete_response holds JSON: the Nominatim `raw` dict (geopy Location.raw),
+the googlemaps geocode result list, or the CSV row for results applied from
+reports/*_results.csv. On every write the fields below are extracted into
+their own (indexed) columns, so checks like the PLZ comparison in
+data_cleansing.py are plain SQL:
+
+  postal_code        Google postal_code component / Nominatim address.postcode
+                     (else the 5-digit part of the address text)
+  formatted_address  formatted_address / display_name / the CSV address
+  location_type      Google geometry.location_type (ROOFTOP, ...) / Nominatim addresstype
+  place_id           Google place_id / OSM object (N123, W456, R789)
+
+Rows written before (Python reprs from str(geocode_result), str(location),
+str(row)) were converted once by schema migration 9 (migrations.py).
+"""
+import json
+import re
+
+FIELDS = ('postal_code', 'formatted_address', 'location_type', 'place_id')
+TABLES = {'osm': 'geolocation_osm', 'google': 'geolocation_google'}
+
+_PLZ = re.compile(r'^\d{5}$')
+
+
+def osm_json(location):
+    """complete_response for a geopy Location (Nominatim)."""
+    return json.dumps(getattr(location, 'raw', None) or {'display_name': str(location)}, ensure_ascii=False)
+
+
+def google_json(geocode_result):
+    """complete_response for a googlemaps geocode() result list."""
+    return json.dumps(geocode_result, ensure_ascii=False)
+
+
+def csv_json(row):
+    """complete_response for a result row applied from a CSV report."""
+    return json.dumps(dict(row), ensure_ascii=False)
+
+
+def _postal_code_in(text):
+    parts = [part.strip() for part in str(text or '').split(',')]
+    return next((part for part in reversed(parts) if _PLZ.match(part)), None)
+
+
+def response_fields(response):
+    """(postal_code, formatted_address, location_type, place_id) of a JSON complete_response."""
+    try:
+        data = json.loads(response) if response else None
+    except ValueError:
+        data = None
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if not isinstance(data, dict):
+        return (None,) * len(FIELDS)
+    if 'address_components' in data or 'geometry' in data:
+        postal_code = next((c.get('long_name') for c in data.get('address_components', [])
+                            if 'postal_code' in c.get('types', ())), None)
+        return (postal_code, data.get('formatted_address'),
+                (data.get('geometry') or {}).get('location_type'), data.get('place_id'))
+    if 'display_name' in data:
+        osm_type, osm_id = data.get('osm_type'), data.get('osm_id')
+        place_id = '{}{}'.format(osm_type[0].upper(), osm_id) if osm_type and osm_id else data.get('place_id')
+        return ((data.get('address') or {}).get('postcode') or _postal_code_in(data['display_name']),
+                data['display_name'], data.get('addresstype') or data.get('type'),
+                None if place_id is None else str(place_id))
+    # CSV row or converted plain text
+    address = data.get('address') or data.get('text')
+    return _postal_code_in(address), address, None, None
+
+
+def store(cur, provider, web_id, longitude, latitude, location, response):
+    """INSERT OR REPLACE one geolocation row; `response` is JSON from osm_json/google_json/csv_json."""
+    cur.execute('INSERT OR REPLACE INTO {} (web_id, longitude, latitude, location, complete_response, {}) '
+                'VALUES (?,?,?,?,?,?,?,?,?)'.format(TABLES[provider], ', '.join(FIELDS)),
+                (web_id, longitude, latitude, location, response) + response_fields(response))
@@ -0,0 +1,123 @@
+"""On-disk HTTP cache for NABU detail pages, keyed by web_id.
+
+For every page we keep the ETag / Last-Modified validators, a sha256 of the
+raw body and the record checksum it parsed to. The next crawl sends a
+conditional GET; a 304 skips BeautifulSoup parsing and checksum work
+entirely. When the server sends no validators, an identical body hash is
+treated the same way, so an unchanged page costs one hash instead of a parse.
+
+Entries are only trusted while their checksum still matches the row in
+`gebaeudebrueter` and they were written by the current parser
+(PARSER_VERSION: a hash of nabu_parse.py, nabu_normalize.py and the bs4
+version); after a DB restore or a parser change the page is fetched and
+parsed normally (use --no-cache to force that for every page).
+"""
+import hashlib
+import os
+import sqlite3
+from collections import namedtuple
+
+import bs4
+
+import nabu_normalize
+import nabu_parse
+from nabu_fetch import URL, TIMEOUT, NotModifiedError, fetch_detail_conditional
+from nabu_parse import get_data
+
+CACHE_PATH = os.environ.get('DETAIL_CACHE', os.path.join('cache', 'detail_cache.sqlite'))
+
+
+def parser_version():
+    """Hash of the code a cached checksum was parsed with; any edit of it invalidates the cache."""
+    digest = hashlib.sha256(bs4.__version__.encode('utf-8'))
+    for module in (nabu_parse, nabu_normalize):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+PARSER_VERSION = parser_version()
+
+CacheEntry = namedtuple('CacheEntry', 'web_id etag last_modified body_sha256 checksum')
+
+
+class DetailCache:
+    def __init__(self, path=CACHE_PATH, parser=PARSER_VERSION):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.parser = parser
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS detail_cache ('
+                          'web_id INTEGER PRIMARY KEY, etag TEXT, last_modified TEXT, '
+                          'body_sha256 TEXT, checksum TEXT, fetched_at TEXT, parser_version TEXT)')
+        if 'parser_version' not in {row[1] for row in self.conn.execute('PRAGMA table_info(detail_cache)')}:
+            # entries of an older cache have no version and are never trusted
+            self.conn.execute('ALTER TABLE detail_cache ADD COLUMN parser_version TEXT')
+
+    def load(self, db_checksums=None):
+        """Return {web_id: CacheEntry} of the current parser; with db_checksums only entries still matching the DB."""
+        entries = {}
+        for row in self.conn.execute('SELECT web_id, etag, last_modified, body_sha256, checksum FROM detail_cache '
+                                     'WHERE parser_version = ?', (self.parser,)):
+            entry = CacheEntry(*row)
+            if db_checksums is not None and db_checksums.get(entry.web_id) != entry.checksum:
+                continue
+            entries[entry.web_id] = entry
+        return entries
+
+    def put(self, entry):
+        self.conn.execute('INSERT OR REPLACE INTO detail_cache '
+                          '(web_id, etag, last_modified, body_sha256, checksum, fetched_at, parser_version) '
+                          'VALUES (?,?,?,?,?,DATETIME(\'now\'),?)', tuple(entry) + (self.parser,))
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def conditional_headers(entry):
+    headers = {}
+    if entry is None:
+        return headers
+    if entry.etag:
+        headers['If-None-Match'] = entry.etag
+    if entry.last_modified:
+        headers['If-Modified-Since'] = entry.last_modified
+    return headers
+
+
+class CachedDetailJob:
+    """crawl_engine job: conditional GET, then parse only when the page changed.
+
+    Fetched bodies also go to the page archive when one is given.
+    Returns (record, entry). record is None when the page is unchanged (304 or
+    same body hash); entry is the cache entry to store for the page.
+    """
+
+    def __init__(self, entries, archive=None):
+        self.entries = entries
+        self.archive = archive
+
+    def __call__(self, web_id, url=URL, timeout=TIMEOUT):
+        cached = self.entries.get(web_id)
+        status, headers, body = fetch_detail_conditional(web_id, conditional_headers(cached), url, timeout)
+        if status == 304:
+            if cached is not None:
+                return None, cached
+            # a 304 nothing asked for (e.g. a shared cache answering on its own): there is no body,
+            # so fetch the page once more past any cache, and give up on the page if that is a 304 too
+            status, headers, body = fetch_detail_conditional(web_id, {'Cache-Control': 'no-cache'}, url, timeout)
+            if status == 304:
+                raise NotModifiedError('304 Not Modified for ID = {} without a cached copy'.format(web_id))
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if self.archive is not None:
+            digest = self.archive.store(web_id, body)
+        else:
+            digest = hashlib.sha256(body).hexdigest()
+        if cached is not None and cached.body_sha256 == digest:
+            return None, cached._replace(etag=etag, last_modified=last_modified)
+        record = get_data(web_id, body)
+        return record, CacheEntry(web_id, etag, last_modified, digest, record[-1])
@@ -0,0 +1,90 @@
+"""Shared HTTP client for NABU and geocoder traffic.
+
+One requests.Session per process with a keep-alive connection pool, gzip/deflate
+negotiation and (connect, read) timeouts. The scrapers (nabu_fetch.py),
+geocode_missing.py and geocode_bad_coords.py go through it; geopy and the
+googlemaps client are handed the same session (geopy_adapter_factory,
+get_client().session).
+
+stats() reports requests sent and new TCP/TLS connections opened, so the
+connection reuse is visible at the end of a run.
+
+Env: HTTP_POOL_SIZE (connections per host, default max(8, SCRAPER_MAX_IN_FLIGHT)),
+     HTTP_CONNECT_TIMEOUT (seconds, default 5), HTTP_READ_TIMEOUT (seconds, default 30)
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# at least one pooled connection per crawl worker (nabu_fetch.DEFAULT_MAX_IN_FLIGHT)
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', max(8, int(os.environ.get('SCRAPER_MAX_IN_FLIGHT', '4')))))
+CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '30'))
+
+
+class HttpClient:
+    def __init__(self, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.adapter = HTTPAdapter(pool_connections=10, pool_maxsize=max(1, pool_size))
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+    def timeout(self, read_timeout=None):
+        read = self.read_timeout if read_timeout is None else read_timeout
+        return (min(self.connect_timeout, read), read)
+
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        """session.get with the client's timeouts; `timeout` overrides the read timeout."""
+        return self.session.get(url, headers=headers, timeout=self.timeout(timeout), **kwargs)
+
+    def stats(self):
+        """{'requests': n, 'connections': n opened, 'reused': n} over all hosts of this client."""
+        pools = self.adapter.poolmanager.pools
+        requests_sent = connections = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_sent += pool.num_requests
+            connections += pool.num_connections
+        return {'requests': requests_sent, 'connections': connections,
+                'reused': max(0, requests_sent - connections)}
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide HttpClient (created on first use)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def format_stats(client=None):
+    s = (client or get_client()).stats()
+    return 'HTTP: {requests} requests over {connections} connections ({reused} reused)'.format(**s)
+
+
+def geopy_adapter_factory(client=None):
+    """adapter_factory for geopy geocoders so they share the pooled session."""
+    from geopy.adapters import RequestsAdapter
+
+    class SharedSessionAdapter(RequestsAdapter):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.session.close()
+            self.session = (client or get_client()).session
+
+    return SharedSessionAdapter
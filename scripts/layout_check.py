@@ -0,0 +1,122 @@
+"""Pre-flight check of the NABU detail page layout, run before a crawl writes anything.
+
+get_data reads fields by position (table[4] td[1..22], table[5] textareas).
+If the site changes its layout, a full crawl would run for hours and store
+garbage or die halfway with an IndexError. preflight() fetches a few random
+detail pages first and checks each against nabu_parse.DETAIL_LAYOUT:
+
+  - the page has table[4] and table[5],
+  - every listed td holds what it should (text input with a value, checkbox, textarea),
+  - get_data parses it,
+  - plz looks like a Berlin postcode on most pages (FIELD_FORMATS).
+
+Any mismatch raises LayoutError; preflight_or_exit() prints the problems and
+exits before the DB, the journal or a backup is touched.
+
+Env: SCRAPER_PREFLIGHT_SAMPLE (pages to check, default 5; 0 skips the check)
+`--skip-layout-check` on the scraper command line skips it as well.
+"""
+import os
+import random
+import re
+import sys
+
+from nabu_fetch import URL, TIMEOUT, classify_error, fetch_detail, fetch_listing
+from nabu_parse import DETAIL_LAYOUT, TEXT_TABLE, get_data, listing_ids, tokenize_detail
+
+PREFLIGHT_SAMPLE = int(os.environ.get('SCRAPER_PREFLIGHT_SAMPLE', 5))
+# record position -> pattern the value should match on most sampled pages
+FIELD_FORMATS = {2: ('plz', re.compile(r'1[0-4]\d{3}$'))}
+
+
+class LayoutError(Exception):
+    pass
+
+
+def check_page(detailContent):
+    """Return the layout problems of one detail page (empty list when it matches)."""
+    tokenizer = tokenize_detail(detailContent)
+    if tokenizer is None:
+        return ['page cannot be tokenized']
+    if tokenizer.tables <= TEXT_TABLE:
+        return ['expected at least {} tables, found {}'.format(TEXT_TABLE + 1, tokenizer.tables)]
+    problems = []
+    for table, cells in DETAIL_LAYOUT.items():
+        tds = tokenizer.tds[table]
+        for i, (kind, name) in sorted(cells.items()):
+            where = 'table[{}] td[{}] ({})'.format(table, i, name)
+            if i >= len(tds):
+                problems.append('{}: missing, table has {} tds'.format(where, len(tds)))
+                continue
+            first_input, _, textarea = tds[i]
+            if kind == 'textarea':
+                if textarea is None:
+                    problems.append(where + ': no textarea')
+            elif first_input is None:
+                problems.append(where + ': no input')
+            elif kind == 'checkbox' and first_input.get('type', '').lower() != 'checkbox':
+                problems.append('{}: expected a checkbox, found type={!r}'.format(where, first_input.get('type')))
+            elif kind == 'input' and 'value' not in first_input:
+                problems.append(where + ': input without value')
+    return problems
+
+
+def sample_ids(conn, size, candidate_ids=None, url=URL, rnd=random):
+    """Random ids to check: from candidate_ids, else the DB, else the site listing."""
+    pool = list(candidate_ids) if candidate_ids is not None else []
+    if not pool and conn is not None and conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='gebaeudebrueter'").fetchone():
+        pool = [web_id for (web_id,) in conn.execute('SELECT web_id FROM gebaeudebrueter')]
+    if len(pool) < size:
+        pool = listing_ids(fetch_listing(url))
+    return rnd.sample(pool, min(size, len(pool)))
+
+
+def preflight(conn, url=URL, sample_size=PREFLIGHT_SAMPLE, candidate_ids=None, timeout=TIMEOUT):
+    """Check `sample_size` random detail pages; raise LayoutError on any layout mismatch."""
+    if sample_size <= 0:
+        return 0
+    problems = []
+    checked = 0
+    format_misses = {pos: 0 for pos in FIELD_FORMATS}
+    for web_id in sample_ids(conn, sample_size, candidate_ids, url):
+        try:
+            body = fetch_detail(web_id, url, timeout)
+        except Exception as e:
+            if classify_error(e) == 'removed':
+                continue
+            raise LayoutError('Layout check: cannot fetch ID = {}: {}'.format(web_id, e))
+        page_problems = check_page(body)
+        if not page_problems:
+            try:
+                record = get_data(web_id, body)
+            except Exception as e:
+                page_problems = ['get_data failed: {!r}'.format(e)]
+            else:
+                for pos, (_, pattern) in FIELD_FORMATS.items():
+                    if not pattern.match(str(record[pos])):
+                        format_misses[pos] += 1
+        problems += ['ID = {}: {}'.format(web_id, p) for p in page_problems]
+        checked += 1
+    if checked == 0:
+        raise LayoutError('Layout check: none of the sampled pages could be checked')
+    for pos, misses in format_misses.items():
+        if misses * 2 > checked:
+            problems.append('{} of {} pages have an unexpected {}'.format(misses, checked, FIELD_FORMATS[pos][0]))
+    if problems:
+        raise LayoutError('Layout check failed, the detail page layout seems to have changed:\n  '
+                          + '\n  '.join(problems))
+    print('Layout check: {} pages match'.format(checked))
+    return checked
+
+
+def preflight_or_exit(conn, url=URL, candidate_ids=None):
+    """preflight() for the scraper scripts: print the problems and exit(1) on a mismatch."""
+    if '--skip-layout-check' in sys.argv[1:]:
+        return
+    try:
+        preflight(conn, url, candidate_ids=candidate_ids)
+    except LayoutError as e:
+        print(e)
+        print('Nothing was written. Fix get_data / DETAIL_LAYOUT or rerun with --skip-layout-check.')
+        sys.exit(1)
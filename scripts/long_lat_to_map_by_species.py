@@ -3,9 +3,10 @@ from folium import plugins
 import sqlite3
 from datetime import datetime
 from datetime import date
+from db_utils import connect
 
 try:
-    sqliteConnection = sqlite3.connect('brueter.sqlite')
+    sqliteConnection = connect(readonly=True)
     cursor = sqliteConnection.cursor()
 except sqlite3.Error as error:
     print("Error while connecting to sqlite", error)
@@ -41,21 +42,20 @@ popups = []
 colors = []
 url = 'http://www.gebaeudebrueter-in-berlin.de/index.php'
 
-query = ("SELECT gebaeudebrueter.web_id, bezirk, plz, ort, strasse, anhang, erstbeobachtung, beschreibung, besonderes,"
-         "mauersegler, kontrolle, sperling, ersatz, schwalbe, wichtig,"
-         "star, fledermaus, verloren, andere, "
-         "geolocation_osm.longitude AS osm_longitude, geolocation_osm.latitude AS osm_latitude, "
-         "geolocation_google.longitude AS google_longitude, geolocation_google.latitude AS google_latitude "
-         "FROM gebaeudebrueter "
-         "LEFT JOIN geolocation_osm ON gebaeudebrueter.web_id = geolocation_osm.web_id "
-         "LEFT JOIN geolocation_google ON gebaeudebrueter.web_id = geolocation_google.web_id "
-         "WHERE (gebaeudebrueter.is_test IS NULL OR gebaeudebrueter.is_test=0) AND (gebaeudebrueter.noSpecies IS NULL OR gebaeudebrueter.noSpecies=0)")
+# coordinates (OSM, else Google) and eligibility come from map_points, see map_points.py
+query = ("SELECT map_points.web_id, bezirk, plz, ort, strasse, anhang, erstbeobachtung, beschreibung, besonderes,"
+         "map_points.mauersegler, map_points.kontrolle, map_points.sperling, map_points.ersatz, map_points.schwalbe, "
+         "map_points.wichtig, map_points.star, map_points.fledermaus, map_points.verloren, map_points.andere, "
+         "map_points.longitude, map_points.latitude "
+         "FROM map_points "
+         "JOIN gebaeudebrueter ON gebaeudebrueter.web_id = map_points.web_id "
+         "WHERE map_points.on_map = 1 ORDER BY map_points.web_id")
 cursor.execute(query)
 data = cursor.fetchall()
 for dataset in data:
     (web_id, bezirk, plz, ort, strasse, anhang, erstbeobachtung, beschreibung, besonderes, mauersegler,
      kontrolle, sperling, ersatz, schwalbe, wichtig, star, fledermaus, verloren, andere,
-     osm_longitude, osm_latitude, google_longitude, google_latitude) = dataset
+     longitude, latitude) = dataset
 
     # skip test rows flagged in DB
     # web_id 1784 should be marked via `is_test` by the migration script
@@ -107,19 +107,7 @@ for dataset in data:
         tooltip_text = 'Mehrere Arten'
         color = 'cadetblue'
         grp = multi_grp
-    # prefer OSM coords, fallback to Google coords; treat string 'None' as missing
-    latitude = None
-    longitude = None
-    if osm_latitude and str(osm_latitude) != 'None' and osm_longitude and str(osm_longitude) != 'None':
-        latitude = osm_latitude
-        longitude = osm_longitude
-    elif google_latitude and str(google_latitude) != 'None' and google_longitude and str(google_longitude) != 'None':
-        latitude = google_latitude
-        longitude = google_longitude
-
     icon = folium.Icon(color=color)
-    if latitude is None or longitude is None:
-        continue
 
     if ersatz:
         ersatz_text = '<br/><br/><b>Hier wurden Ersatzmaßnahmen errichtet</b>'
@@ -1,26 +1,20 @@
-import sqlite3
 from pathlib import Path
 
+from db_utils import connect
+
 DB = Path('brueter.sqlite')
 DOCS = Path('docs')
 
 def db_counts(db_path):
-    con = sqlite3.connect(db_path)
+    con = connect(str(db_path), readonly=True)
     cur = con.cursor()
-    cur.execute('SELECT COUNT(*) FROM gebaeudebrueter')
-    total = cur.fetchone()[0]
-    cur.execute('SELECT COUNT(DISTINCT g.web_id) FROM gebaeudebrueter g JOIN geolocation_osm o ON g.web_id=o.web_id')
-    osm = cur.fetchone()[0]
-    cur.execute('SELECT COUNT(DISTINCT g.web_id) FROM gebaeudebrueter g JOIN geolocation_google gg ON g.web_id=gg.web_id')
-    google = cur.fetchone()[0]
-    # rows with any geolocation
-    cur.execute('SELECT COUNT(DISTINCT g.web_id) FROM gebaeudebrueter g LEFT JOIN geolocation_osm o ON g.web_id=o.web_id LEFT JOIN geolocation_google gg ON g.web_id=gg.web_id WHERE o.web_id IS NOT NULL OR gg.web_id IS NOT NULL')
-    anygeo = cur.fetchone()[0]
-    # check if web_id 1784 exists
-    cur.execute('SELECT COUNT(*) FROM gebaeudebrueter WHERE web_id=1784')
-    has_1784 = cur.fetchone()[0]
+    # one row per gebaeudebrueter record with the coordinate the maps use (see map_points.py)
+    cur.execute("SELECT COUNT(*), COALESCE(SUM(source='osm'), 0), COALESCE(SUM(source='google'), 0), "
+                "COALESCE(SUM(source IS NOT NULL), 0), COALESCE(SUM(on_map), 0), COALESCE(SUM(web_id=1784), 0) "
+                "FROM map_points")
+    total, osm, google, anygeo, on_map, has_1784 = cur.fetchone()
     con.close()
-    return dict(total=total, osm=osm, google=google, anygeo=anygeo, has_1784=has_1784)
+    return dict(total=total, osm=osm, google=google, anygeo=anygeo, on_map=on_map, has_1784=has_1784)
 
 def count_markers_in_file(path: Path):
     if not path.exists():
@@ -36,9 +30,10 @@ def main():
     counts = db_counts(db)
     print('DB totals:')
     print(f"- gebaeudebrueter rows: {counts['total']}")
-    print(f"- geolocation_osm rows (distinct web_id): {counts['osm']}")
-    print(f"- geolocation_google rows (distinct web_id): {counts['google']}")
-    print(f"- rows with any geolocation: {counts['anygeo']}")
+    print(f"- rows with OSM coordinates: {counts['osm']}")
+    print(f"- rows with Google coordinates only: {counts['google']}")
+    print(f"- rows with any coordinates: {counts['anygeo']}")
+    print(f"- rows on the maps (not test, with species): {counts['on_map']}")
     print(f"- web_id=1784 present in DB: {counts['has_1784']}")
 
     # count markers in docs HTML
@@ -51,9 +46,9 @@ def main():
     print(f"- {meldungen_html}: {m_markers}")
 
     # compare expected vs actual
-    expected = counts['anygeo']
+    expected = counts['on_map']
     print('\nComparison:')
-    print(f"- rows with geolocation (expected markers): {expected}")
+    print(f"- rows on the maps (expected markers): {expected}")
     print(f"- markers in species map: {s_markers}")
     print(f"- markers in meldungen map: {m_markers}")
     if s_markers != expected:
@@ -0,0 +1,60 @@
+"""map_points: one row per gebaeudebrueter record with the coordinate the maps show.
+
+The table is derived from gebaeudebrueter, geolocation_osm and
+geolocation_google (view map_points_source) and kept current by triggers on
+all three, so map generators and count scripts read one narrow table instead
+of each repeating the three-way join and its own coordinate choice:
+
+  latitude, longitude  REAL; OSM when both its values are numbers, else Google, else NULL
+  source               'osm', 'google' or NULL
+  mauersegler ... andere, sanierung ... wichtig   species / status bits (0/1)
+  is_test, no_species  the gebaeudebrueter flags (0/1)
+  on_map               1 if the record has coordinates and is neither a test nor without species
+
+Created and filled by schema migration 8 (migrations.py), which also defines
+the view (OSM when both its values are numbers, stored 'None' strings do not
+count) and the triggers: DELETE + INSERT of the affected web_ids after every
+change of a watched column, so an outer OR IGNORE cannot skip them.
+
+Usage: python scripts/map_points.py [--db=brueter.sqlite] [--check]
+  prints the points per source; --check compares the table with a fresh derivation
+"""
+import os
+import sys
+
+SPECIES = ('mauersegler', 'sperling', 'schwalbe', 'fledermaus', 'star', 'andere')
+STATUS = ('sanierung', 'ersatz', 'kontrolle', 'verloren', 'wichtig')
+COLUMNS = ('web_id', 'latitude', 'longitude', 'source') + SPECIES + STATUS + ('is_test', 'no_species', 'on_map')
+
+
+def stale_points(conn):
+    """web_ids whose map_points row differs from a fresh derivation (should be empty)."""
+    columns = ', '.join(COLUMNS)
+    query = ('SELECT web_id FROM (SELECT {0} FROM map_points_source EXCEPT SELECT {0} FROM map_points) '
+             'UNION SELECT web_id FROM (SELECT {0} FROM map_points EXCEPT SELECT {0} FROM map_points_source)')
+    return sorted({row[0] for row in conn.execute(query.format(columns))})
+
+
+def main():
+    from db_utils import connect
+    db = os.environ.get('BRUETER_DB', 'brueter.sqlite')
+    for arg in sys.argv[1:]:
+        if arg.startswith('--db='):
+            db = arg.split('=', 1)[1]
+    conn = connect(db, readonly=True)
+    try:
+        for source, points, on_map in conn.execute('SELECT source, COUNT(*), SUM(on_map) FROM map_points '
+                                                   'GROUP BY source ORDER BY source'):
+            print('{:>6}: {} records, {} on the maps'.format(source or 'none', points, on_map))
+        if '--check' in sys.argv[1:]:
+            stale = stale_points(conn)
+            print('map_points is current' if not stale else
+                  '{} stale rows, e.g. {}'.format(len(stale), ', '.join(map(str, stale[:10]))))
+            if stale:
+                sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
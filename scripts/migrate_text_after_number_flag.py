@@ -1,39 +1,25 @@
 """
-Add `flag_has_text_after_number` and `text_after_number` columns and populate them.
-Attempt to drop obsolete column `kept_text_after_number` (if SQLite supports it).
+Populate the `flag_has_text_after_number` and `text_after_number` columns
+(added by schema migration 4, see migrations.py).
+`kept_text_after_number` is kept: generateLocationForPageMap.py still writes it.
 
 Run: python scripts/migrate_text_after_number_flag.py --db=brueter.sqlite
 """
-import sqlite3
 import sys
 import os
 import re
 
+from db_utils import connect
+
 db_path = 'brueter.sqlite'
 for arg in sys.argv[1:]:
     if arg.startswith('--db='):
         db_path = arg.split('=',1)[1]
 db_path = os.environ.get('BRUETER_DB', db_path)
 
-conn = sqlite3.connect(db_path)
+conn = connect(db_path)
 cur = conn.cursor()
 
-# Add columns if missing
-cols = [c[1] for c in cur.execute("PRAGMA table_info(gebaeudebrueter)").fetchall()]
-if 'flag_has_text_after_number' not in cols:
-    cur.execute("ALTER TABLE gebaeudebrueter ADD COLUMN flag_has_text_after_number INTEGER DEFAULT 0")
-    print('Added column flag_has_text_after_number')
-else:
-    print('Column flag_has_text_after_number already exists')
-
-if 'text_after_number' not in cols:
-    cur.execute("ALTER TABLE gebaeudebrueter ADD COLUMN text_after_number TEXT")
-    print('Added column text_after_number')
-else:
-    print('Column text_after_number already exists')
-
-conn.commit()
-
 # Prepare patterns similar to address_utils
 def _normalize_ws(s: str) -> str:
     return re.sub(r"\s+", " ", (s or '')).strip()
@@ -94,22 +80,4 @@ conn.commit()
 
 print(f'Checked {checked} rows, updated {updated} rows with text after number.')
 
-# Attempt to drop obsolete column kept_text_after_number
-cols = [c[1] for c in cur.execute("PRAGMA table_info(gebaeudebrueter)").fetchall()]
-if 'kept_text_after_number' in cols:
-    try:
-        cur.execute('ALTER TABLE gebaeudebrueter DROP COLUMN kept_text_after_number')
-        conn.commit()
-        print('Dropped column kept_text_after_number')
-    except sqlite3.OperationalError as e:
-        print('Could not drop column kept_text_after_number (SQLite may not support DROP COLUMN). Setting values to NULL instead.')
-        try:
-            cur.execute('UPDATE gebaeudebrueter SET kept_text_after_number = NULL')
-            conn.commit()
-            print('Cleared values in kept_text_after_number')
-        except Exception as e2:
-            print('Failed to clear kept_text_after_number:', e2)
-else:
-    print('No column kept_text_after_number present')
-
 conn.close()
@@ -0,0 +1,350 @@
+"""Versioned schema migrations for brueter.sqlite, tracked in PRAGMA user_version.
+
+migrate() applies every migration newer than the DB's user_version, each in
+its own transaction that also bumps user_version, so a DB is brought to the
+current schema once and later runs only read one pragma. db_utils.connect()
+calls it on every writable open (read-only opens of an outdated DB fail with
+db_utils.SchemaError), so scripts can rely on all columns below existing.
+
+Before pending steps in ROW_CHANGES (7 moves duplicate rows, 9 rewrites the
+geocoder responses) migrate() takes a db_backup snapshot labelled
+pre_migration, in backups/ next to the DB file (or BRUETER_BACKUP_DIR).
+
+Every step carries its own DDL and backfill code, frozen as it was when the
+step was added; it must not call helpers of the live modules (nabu_store,
+map_points, geocode_store, ...), which keep changing. A later schema change is
+a new step; an old step is only changed to fix DBs it does not migrate
+correctly.
+
+Steps are written to be safe on DBs that got some of the columns from the
+old helper scripts (add_db_flags.py, add_street_flags_columns.py,
+migrate_text_after_number_flag.py) before user_version was used.
+
+Usage: python scripts/migrations.py [--db=brueter.sqlite]   (prints the version)
+"""
+import ast
+import hashlib
+import json
+import os
+import re
+import sys
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute('PRAGMA table_info({})'.format(table))}
+
+
+def _add_columns(conn, table, columns):
+    present = _columns(conn, table)
+    for name, definition in columns:
+        if name not in present:
+            conn.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(table, name, definition))
+
+
+def _base_schema(conn):
+    """gebaeudebrueter, geolocation_google, geolocation_osm (initializeDB.sql), each unless it exists.
+
+    Old DBs can have gebaeudebrueter alone (noSpecies.sqlite from move_unknowns.py);
+    steps 8 and 9 run it again for DBs that passed step 1 before it created missing tables.
+    """
+    conn.execute('CREATE TABLE IF NOT EXISTS gebaeudebrueter (id INTEGER PRIMARY KEY, web_id INTEGER NOT NULL, '
+                 'bezirk TEXT, plz INTEGER NOT NULL, ort TEXT NOT NULL, strasse TEXT NOT NULL, anhang TEXT, '
+                 'erstbeobachtung TEXT, beschreibung TEXT, besonderes TEXT, checksum TEXT, update_date TEXT, new INTEGER DEFAULT 1, '
+                 'mauersegler INTEGER DEFAULT 0, kontrolle INTEGER DEFAULT 0, sperling INTEGER DEFAULT 0, '
+                 'ersatz INTEGER DEFAULT 0, schwalbe INTEGER DEFAULT 0, wichtig INTEGER DEFAULT 0, '
+                 'star INTEGER DEFAULT 0, sanierung INTEGER DEFAULT 0, fledermaus INTEGER DEFAULT 0, '
+                 'verloren INTEGER DEFAULT 0, andere INTEGER DEFAULT 0)')
+    for table in ('geolocation_google', 'geolocation_osm'):
+        conn.execute('CREATE TABLE IF NOT EXISTS {} (id INTEGER PRIMARY KEY, web_id INTEGER NOT NULL UNIQUE, '
+                     'longitude REAL NOT NULL, latitude REAL NOT NULL, location TEXT NOT NULL, '
+                     'complete_response TEXT NOT NULL)'.format(table))
+
+
+def _db_flags(conn):
+    """noSpecies / is_test (was add_db_flags.py)."""
+    added = 'noSpecies' not in _columns(conn, 'gebaeudebrueter')
+    _add_columns(conn, 'gebaeudebrueter', [('noSpecies', 'INTEGER DEFAULT 0'), ('is_test', 'INTEGER DEFAULT 0')])
+    if added:
+        conn.execute('UPDATE gebaeudebrueter SET noSpecies=1 WHERE (mauersegler IS NULL OR mauersegler=0) '
+                     'AND (sperling IS NULL OR sperling=0) AND (schwalbe IS NULL OR schwalbe=0) '
+                     'AND (star IS NULL OR star=0) AND (fledermaus IS NULL OR fledermaus=0) '
+                     'AND (andere IS NULL OR andere=0)')
+        conn.execute('UPDATE gebaeudebrueter SET is_test=1 WHERE web_id=1784')
+
+
+def _street_flags(conn):
+    """strasse_original and the sanitize_street flags (was add_street_flags_columns.py)."""
+    _add_columns(conn, 'gebaeudebrueter', [
+        ('strasse_original', 'TEXT'),
+        ('has_comma', 'INTEGER DEFAULT 0'),
+        ('has_slash', 'INTEGER DEFAULT 0'),
+        ('has_range', 'INTEGER DEFAULT 0'),
+        ('multiple_numbers', 'INTEGER DEFAULT 0'),
+        ('multiple_streets', 'INTEGER DEFAULT 0'),
+        # generateLocationForPageMap.py still writes it, so it is (re)added if an older run dropped it
+        ('kept_text_after_number', 'INTEGER DEFAULT 0'),
+    ])
+
+
+def _text_after_number(conn):
+    """Columns filled by migrate_text_after_number_flag.py."""
+    _add_columns(conn, 'gebaeudebrueter', [('flag_has_text_after_number', 'INTEGER DEFAULT 0'),
+                                           ('text_after_number', 'TEXT')])
+
+
+def _fingerprints(conn):
+    """fp_* columns of nabu_store.py; existing rows keep NULL until RecordWriter seeds them from a parse."""
+    _add_columns(conn, 'gebaeudebrueter', [(name, 'TEXT') for name in ('fp_address', 'fp_species', 'fp_status',
+                                                                        'fp_text')])
+
+
+def _crawl_journal(conn):
+    """crawl_runs / crawl_journal of crawl_journal.py."""
+    conn.execute('CREATE TABLE IF NOT EXISTS crawl_runs ('
+                 'run_id INTEGER PRIMARY KEY, script TEXT NOT NULL, started_at TEXT, finished_at TEXT, note TEXT)')
+    conn.execute('CREATE TABLE IF NOT EXISTS crawl_journal ('
+                 'run_id INTEGER NOT NULL, web_id INTEGER NOT NULL, outcome TEXT NOT NULL, error TEXT, at TEXT, '
+                 'PRIMARY KEY (run_id, web_id))')
+
+
+# the map generators' filter, spelled exactly like their WHERE so SQLite can use the partial index
+MAP_ELIGIBLE = '(is_test IS NULL OR is_test=0) AND (noSpecies IS NULL OR noSpecies=0)'
+
+
+def _indexes(conn):
+    """Unique web_id (duplicates moved to gebaeudebrueter_duplicates first), pending and map-eligible rows."""
+    # update_date is ISO (DATETIME('now')) or dd.mm.yyyy (convert_date_format.py); compared as julianday(),
+    # unparsable / NULL dates last
+    day = ("julianday(CASE WHEN update_date GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9]*' "
+           "THEN substr(update_date, 7, 4) || '-' || substr(update_date, 4, 2) || '-' || substr(update_date, 1, 2) "
+           "|| substr(update_date, 11) ELSE update_date END)")
+    duplicates = ('SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY web_id '
+                  'ORDER BY {0} IS NULL, {0} DESC, id DESC) AS n FROM gebaeudebrueter) WHERE n > 1'.format(day))
+    if conn.execute('SELECT EXISTS (' + duplicates + ')').fetchone()[0]:
+        # keep the most recently updated row per web_id; the others stay inspectable
+        conn.execute('CREATE TABLE IF NOT EXISTS gebaeudebrueter_duplicates AS SELECT * FROM gebaeudebrueter WHERE 0')
+        conn.execute('INSERT INTO gebaeudebrueter_duplicates SELECT * FROM gebaeudebrueter WHERE id IN (' + duplicates + ')')
+        count = conn.execute('DELETE FROM gebaeudebrueter WHERE id IN (' + duplicates + ')').rowcount
+        print('Moved {} duplicate web_id rows to gebaeudebrueter_duplicates'.format(count))
+    # written by the geocoders but never created, so their UPDATEs failed silently
+    _add_columns(conn, 'gebaeudebrueter', [('no_geocode', 'INTEGER DEFAULT 0')])
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_gebaeudebrueter_web_id ON gebaeudebrueter(web_id)')
+    # rows generateLocationForPageMap.py still has to process (new=1 geocode, new=2 flags only)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_gebaeudebrueter_pending ON gebaeudebrueter(new, web_id) '
+                 'WHERE new IN (1, 2)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_gebaeudebrueter_map ON gebaeudebrueter(web_id) WHERE ' + MAP_ELIGIBLE)
+    conn.execute('ANALYZE gebaeudebrueter')
+
+
+_MP_BITS = ('mauersegler', 'sperling', 'schwalbe', 'fledermaus', 'star', 'andere',
+            'sanierung', 'ersatz', 'kontrolle', 'verloren', 'wichtig')
+_MP_COLUMNS = ('web_id', 'latitude', 'longitude', 'source') + _MP_BITS + ('is_test', 'no_species', 'on_map')
+_MP_WATCHED = {
+    'gebaeudebrueter': ('web_id', 'is_test', 'noSpecies') + _MP_BITS,
+    'geolocation_osm': ('web_id', 'latitude', 'longitude'),
+    'geolocation_google': ('web_id', 'latitude', 'longitude'),
+}
+
+
+def _map_points(conn):
+    """map_points table, its source view and the triggers keeping it current (map_points.py)."""
+    _base_schema(conn)
+    valid = "(typeof({0}.latitude) IN ('integer', 'real') AND typeof({0}.longitude) IN ('integer', 'real'))"
+    osm, google = valid.format('o'), valid.format('gg')
+    columns = ', '.join(_MP_COLUMNS)
+    conn.execute(
+        'CREATE VIEW IF NOT EXISTS map_points_source AS SELECT b.web_id, '
+        'CASE WHEN {osm} THEN o.latitude WHEN {google} THEN gg.latitude END AS latitude, '
+        'CASE WHEN {osm} THEN o.longitude WHEN {google} THEN gg.longitude END AS longitude, '
+        "CASE WHEN {osm} THEN 'osm' WHEN {google} THEN 'google' END AS source, "
+        '{bits}, COALESCE(b.is_test, 0) AS is_test, COALESCE(b.noSpecies, 0) AS no_species, '
+        '(({osm} OR {google}) AND COALESCE(b.is_test, 0) = 0 AND COALESCE(b.noSpecies, 0) = 0) AS on_map '
+        'FROM gebaeudebrueter b '
+        'LEFT JOIN geolocation_osm o ON o.web_id = b.web_id '
+        'LEFT JOIN geolocation_google gg ON gg.web_id = b.web_id'.format(
+            osm=osm, google=google, bits=', '.join('COALESCE(b.{0}, 0) AS {0}'.format(c) for c in _MP_BITS)))
+    conn.execute('CREATE TABLE IF NOT EXISTS map_points (web_id INTEGER PRIMARY KEY, latitude REAL, longitude REAL, '
+                 'source TEXT, {}, is_test INTEGER, no_species INTEGER, on_map INTEGER)'.format(
+                     ', '.join(c + ' INTEGER' for c in _MP_BITS)))
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_map_points_on_map ON map_points(web_id) WHERE on_map = 1')
+    for table, watched in _MP_WATCHED.items():
+        for event, ids in (('INSERT', 'NEW.web_id'), ('DELETE', 'OLD.web_id'),
+                           ('UPDATE OF ' + ', '.join(watched), 'OLD.web_id, NEW.web_id')):
+            conn.execute(
+                'CREATE TRIGGER IF NOT EXISTS map_points_{}_{} AFTER {} ON {} BEGIN '
+                'DELETE FROM map_points WHERE web_id IN ({ids}); '
+                'INSERT INTO map_points ({columns}) SELECT {columns} FROM map_points_source WHERE web_id IN ({ids}); '
+                'END'.format(table, event.split()[0].lower(), event, table, ids=ids, columns=columns))
+    conn.execute('DELETE FROM map_points')
+    conn.execute('INSERT INTO map_points ({0}) SELECT {0} FROM map_points_source'.format(columns))
+
+
+_GEO_FIELDS = ('postal_code', 'formatted_address', 'location_type', 'place_id')
+_PLZ = re.compile(r'^\d{5}$')
+
+
+def _postal_code_in(text):
+    parts = [part.strip() for part in str(text or '').split(',')]
+    return next((part for part in reversed(parts) if _PLZ.match(part)), None)
+
+
+def _response_json(provider, text):
+    """JSON for a complete_response stored as a Python repr or plain text."""
+    try:
+        if isinstance(json.loads(text), (dict, list)):
+            return text
+    except (TypeError, ValueError):
+        pass
+    try:
+        value = ast.literal_eval(text)
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False, default=str)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        pass
+    return json.dumps({'display_name' if provider == 'osm' else 'text': text}, ensure_ascii=False)
+
+
+def _response_fields(response):
+    """(postal_code, formatted_address, location_type, place_id) of a JSON response."""
+    data = json.loads(response)
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if not isinstance(data, dict):
+        return (None,) * len(_GEO_FIELDS)
+    if 'address_components' in data or 'geometry' in data:
+        postal_code = next((c.get('long_name') for c in data.get('address_components', [])
+                            if 'postal_code' in c.get('types', ())), None)
+        return (postal_code, data.get('formatted_address'),
+                (data.get('geometry') or {}).get('location_type'), data.get('place_id'))
+    if 'display_name' in data:
+        osm_type, osm_id = data.get('osm_type'), data.get('osm_id')
+        place_id = '{}{}'.format(osm_type[0].upper(), osm_id) if osm_type and osm_id else data.get('place_id')
+        return ((data.get('address') or {}).get('postcode') or _postal_code_in(data['display_name']),
+                data['display_name'], data.get('addresstype') or data.get('type'),
+                None if place_id is None else str(place_id))
+    address = data.get('address') or data.get('text')
+    return _postal_code_in(address), address, None, None
+
+
+def _geocoder_responses(conn):
+    """JSON complete_response plus postal_code/formatted_address/location_type/place_id (geocode_store.py)."""
+    _base_schema(conn)
+    for provider, table in (('osm', 'geolocation_osm'), ('google', 'geolocation_google')):
+        _add_columns(conn, table, [(name, 'TEXT') for name in _GEO_FIELDS])
+        rows = conn.execute('SELECT id, complete_response FROM ' + table).fetchall()
+        updates = []
+        for row_id, text in rows:
+            response = _response_json(provider, text)
+            updates.append((response,) + _response_fields(response) + (row_id,))
+        conn.executemany('UPDATE {} SET complete_response=?, {} WHERE id=?'.format(
+            table, ', '.join(name + '=?' for name in _GEO_FIELDS)), updates)
+        for name in ('postal_code', 'place_id'):
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_{0}_{1} ON {0}({1})'.format(table, name))
+        if rows:
+            print('Converted {} {} responses to JSON'.format(len(rows), table))
+
+
+def _unseed_fingerprints(conn):
+    """Reset fp_* that an earlier step 5 filled from the stored columns.
+
+    That backfill hashed strasse/beschreibung as generateLocationForPageMap.py
+    had rewritten them, not what the scrapers hash, so the next crawl flagged
+    every row. NULL lets RecordWriter seed them from the next parse instead.
+    """
+    # fp_address hashed plz, ort, strasse (nabu_parse.FINGERPRINT_GROUPS at version 5)
+    rows = conn.execute('SELECT rowid, fp_address, plz, ort, strasse FROM gebaeudebrueter '
+                        'WHERE fp_address IS NOT NULL').fetchall()
+    stale = [(row[0],) for row in rows
+             if row[1] == hashlib.sha3_224('\x1f'.join(map(str, row[2:])).encode('utf-8')).hexdigest()]
+    conn.executemany('UPDATE gebaeudebrueter SET fp_address=NULL, fp_species=NULL, fp_status=NULL, fp_text=NULL '
+                     'WHERE rowid=?', stale)
+    if stale:
+        print('Cleared back-filled field fingerprints of {} rows'.format(len(stale)))
+
+
+# (version, description, step); append only, never renumber
+MIGRATIONS = [
+    (1, 'base schema', _base_schema),
+    (2, 'noSpecies / is_test flags', _db_flags),
+    (3, 'street flag columns', _street_flags),
+    (4, 'text after house number columns', _text_after_number),
+    (5, 'field fingerprint columns', _fingerprints),
+    (6, 'crawl journal tables', _crawl_journal),
+    (7, 'web_id and filter indexes', _indexes),
+    (8, 'map_points table and triggers', _map_points),
+    (9, 'structured geocoder responses', _geocoder_responses),
+    (10, 'reset back-filled field fingerprints', _unseed_fingerprints),
+]
+CURRENT_VERSION = MIGRATIONS[-1][0]
+# steps that delete or rewrite existing rows; migrate() snapshots the DB before them
+ROW_CHANGES = {7, 9}
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _backup(conn, pending):
+    """Snapshot a file DB holding rows before migrations that move or rewrite rows run on it."""
+    if not ROW_CHANGES & set(pending):
+        return
+    path = next((row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main'), '')
+    tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    if not path or not any(conn.execute('SELECT EXISTS (SELECT 1 FROM "{}")'.format(name)).fetchone()[0]
+                           for name in tables):
+        return
+    from db_backup import snapshot
+    conn.commit()
+    # next to the DB (like backups/ next to brueter.sqlite), not in whatever directory the script runs from
+    backup_dir = os.environ.get('BRUETER_BACKUP_DIR') or os.path.join(os.path.dirname(path), 'backups')
+    entry = snapshot(conn, 'pre_migration', backup_dir)
+    print('Backup before schema migrations {}: {}'.format(', '.join(map(str, pending)), entry['path']))
+
+
+def migrate(conn, verbose=True, target=CURRENT_VERSION, backup=True):
+    """Apply all pending migrations up to `target`; returns the list of versions applied.
+
+    backup=False skips the pre_migration snapshot (for throwaway copies).
+    """
+    version = schema_version(conn)
+    if backup:
+        _backup(conn, [number for number, _, _ in MIGRATIONS if version < number <= target])
+    applied = []
+    for number, description, step in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        conn.commit()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # another process may have migrated while we waited for the lock
+            if schema_version(conn) >= number:
+                conn.rollback()
+                continue
+            step(conn)
+            conn.execute('PRAGMA user_version={}'.format(number))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(number)
+        if verbose:
+            print('Schema migration {}: {}'.format(number, description))
+    return applied
+
+
+def main():
+    db = os.environ.get('BRUETER_DB', 'brueter.sqlite')
+    for arg in sys.argv[1:]:
+        if arg.startswith('--db='):
+            db = arg.split('=', 1)[1]
+    from db_utils import connect
+    conn = connect(db, upgrade=False)
+    try:
+        migrate(conn)
+        print('{}: schema version {} (current {})'.format(db, schema_version(conn), CURRENT_VERSION))
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,22 @@
 import sqlite3
-import shutil
 import os
 
+from db_utils import connect
+from db_backup import snapshot
+
 SRC_DB = 'brueter.sqlite'
 DEST_DB = 'noSpecies.sqlite'
-BACKUP = 'brueter.sqlite.bak'
 
 def main():
     if not os.path.exists(SRC_DB):
         print('Source DB not found:', SRC_DB)
         return
-    # backup
-    shutil.copy2(SRC_DB, BACKUP)
-    print('Backup created:', BACKUP)
+    # backup (restore with: python scripts/db_backup.py --restore=move_unknowns)
+    conn = connect(SRC_DB, readonly=True, upgrade=False)
+    try:
+        print('Backup created:', snapshot(conn, 'move_unknowns')['path'])
+    finally:
+        conn.close()
 
     src = sqlite3.connect(SRC_DB)
     src.row_factory = sqlite3.Row
@@ -1,193 +1,183 @@
-from bs4 import BeautifulSoup
-from urllib.request import urlopen
-import re
+import os
 import sqlite3
-import hashlib
-import dateutil.parser as parser
-import unicodedata
-
-
-def sanitize_date(date_text):
-    unkown = 'unbekannt'
-    if date_text == '':
-        return unkown
-    if date_text == 'unbekannt':
-        return unkown
-    if date_text == '?':
-        return unkown
-    if date_text == 'o.D.':
-        return unkown
-    if date_text == 'Salinger':
-        return unkown
-    if date_text == 'o.D. ':
-        return unkown
-    if date_text == 'Nicht angegeben':
-        return unkown
-
-
-    if date_text == 'Mai 2019':
-        date_text = '01.05.2019'
-    if date_text == 'Juni 2014, Mai 2016':
-        date_text = '01.06.2014'
-    if date_text == 'Juni 2019':
-        date_text = '01.06.2019'
-    if date_text == 'Mai 2018':
-        date_text = '01.05.2018'
-    if date_text == 'Mai 2016':
-        date_text = '01.05.2016'
-    if date_text == 'Sommer 2019':
-        date_text = '21.06.2019'
-    if date_text == 'Herbst 2019':
-        date_text = '23.09.2019'
-    if date_text == '18.06-15':
-        date_text = '18.06.2015'
-    if date_text == 'Juli 2019':
-        date_text = '01.07.2019'
-    if date_text == '004.05.2009':
-        date_text = '04.05.2009'
-    if date_text == '04.2018':
-        date_text = '01.04.2018'
-    if date_text == '28.06,16':
-        date_text = '28.06.2016'
-    if date_text == 'Mai 2015':
-        date_text = '01.05.2015'
-    if date_text == 'Juli 2020':
-        date_text = '01.07.2020'
-    if date_text == 'Juni 2020':
-        date_text = '01.06.2020'
-    if date_text == 'Mai 2020':
-        date_text = '01.05.2020'
-    if date_text == '30.06./02.07.18':
-        date_text = '02.07.2018'
-
-    try:
-        date = parser.parse(date_text,dayfirst=True)
-    except:
-        print('Cannot convert: ' + date_text)
-        return unkown
-
-    return date
-
-
-def get_data(web_id):
-    stripped = lambda s: ''.join(ch for ch in s if unicodedata.category(ch)[0] != "C")
-    detailContent = urlopen(url + '?ID=' + str(web_id)).read()
-    soup2 = BeautifulSoup(detailContent, features="html.parser")
-    table = soup2.findAll('table')
-    table2 = table[4]
-    td = table2.findChildren('td')
-    bezirk = td[1].findChildren('input')[0]['value']
-    mauersegler = 1 if td[2].findChildren('input', checked=True) else 0
-    kontrolle = 1 if td[3].findChildren('input', checked=True) else 0
-    plz = td[5].findChildren('input')[0]['value']
-    plz = stripped(plz)
-    sperling = 1 if td[6].findChildren('input', checked=True) else 0
-    ersatz = 1 if td[7].findChildren('input', checked=True) else 0
-    ort = td[9].findChildren('input')[0]['value']
-    ort = stripped(ort)
-    schwalbe = 1 if td[10].findChildren('input', checked=True) else 0
-    wichtig = 1 if td[11].findChildren('input', checked=True) else 0
-    strasse = td[13].findChildren('input')[0]['value']
-    strasse = stripped(str(strasse))
-    star = 1 if td[14].findChildren('input', checked=True) else 0
-    sanierung = 1 if td[15].findChildren('input', checked=True) else 0
-    anhang = td[17].findChildren('input')[0]['value']
-    anhang = stripped(anhang)
-    fledermaus = 1 if td[18].findChildren('input', checked=True) else 0
-    verloren = 1 if td[19].findChildren('input', checked=True) else 0
-    erstbeobachtung = td[21].findChildren('input')[0]['value']
-    erstbeobachtung = sanitize_date(erstbeobachtung)
-    andere = 1 if td[22].findChildren('input', checked=True) else 0
-    table2 = table[5]
-    td = table2.findChildren('td')
-    beschreibung = td[1].findChildren('textarea')[0].text
-    besonderes = td[3].findChildren('textarea')[0].text
-    data = (web_id, bezirk, plz, ort, strasse, anhang, erstbeobachtung, beschreibung, besonderes, mauersegler,
-            kontrolle, sperling, ersatz, schwalbe, wichtig, star, sanierung, fledermaus, verloren, andere)
-    payload = ''.join(map(str, data))
-    checksum = hashlib.sha3_224(payload.encode('utf-8')).hexdigest()
-    return data + (checksum,)
-
-
-def order_id(ahref):
-    ids = []
-    for link in ahref:
-        if 'ID' in link['href']:
-            m = re.search('[0-9]+', link['href'])
-            web_id = m.group(0)
-            ids.append(int(web_id))
-    ids.sort()
-    return ids
+import sys
+from collections import Counter
+from nabu_fetch import URL, fetch_listing, stream_listing
+from nabu_parse import listing_ids, iter_listing_ids
+from nabu_store import RecordWriter, write_id_report
+from page_archive import PageArchive, ArchivingJob, replay_records
+from parse_stage import PARSE_PROCESSES
+from changeset import ChangesetWriter
+from crawl_engine import IdStream, run_crawl
+from crawl_journal import CrawlJournal
+from revisit_scheduler import schedule_revisits
+from layout_check import preflight_or_exit
+from http_client import format_stats
+from db_utils import connect
+from migrations import migrate
 
 ######################
 #####  RUN MODE ######
 ######################
 
-only_get_new_ids = False
+incremental = '--incremental' in sys.argv[1:]
 # False: gets all data
-# True: only updates new data starting from the last known largest web id
-
-try:
-    sqliteConnection = sqlite3.connect('brueter.sqlite')
-    cursor = sqliteConnection.cursor()
-except sqlite3.Error as error:
-    print("Error while connecting to sqlite", error)
-
-url = "http://www.gebaeudebrueter-in-berlin.de/index.php"
-
-content = urlopen(url + "?find=%25").read()
-soup = BeautifulSoup(content, features="html.parser")
-
-ahref = soup.findAll('a', {'href': True})
-ordered_ids = order_id(ahref)
-
-total = len(ordered_ids)
-
-index = 0
-
-if only_get_new_ids:
-    query = 'select max(web_id) from gebaeudebrueter '
-    cursor.execute(query)
-    data = cursor.fetchone()
-    max_id = data[0]
-
-for web_id in ordered_ids:
-    print("ID = {}, index = {}, total = {}".format(web_id, index, total))
-    if only_get_new_ids:
-        if web_id <= max_id:
-            print('skipped')
-            continue
-
-    values = get_data(web_id)
-
-    checksum = values[-1]
-
-    cursor.execute('SELECT checksum from gebaeudebrueter where web_id=?', (web_id,))
-    data = cursor.fetchall()
-    if len(data) == 0:
-        value = values
-        query = ('INSERT INTO gebaeudebrueter'
-                     '(web_id, bezirk, plz, ort, strasse, anhang, erstbeobachtung, beschreibung, besonderes,'
-                     'update_date, mauersegler, kontrolle, sperling, ersatz, schwalbe, wichtig,'
-                     'star, sanierung, fledermaus, verloren, andere, checksum)'
-                     'VALUES (?,?,?,?,?,?,?,?,?,DATETIME(\'now\'),?,?,?,?,?,?,?,?,?,?,?,?)')
-        cursor.execute(query,value)
-        sqliteConnection.commit()
-        print('added')
+# True (--incremental): only ids missing from the DB plus the known ids most likely to have changed;
+#       ids that vanished from the listing are written to reports/disappeared_webids.csv
+revisit_sample = int(os.environ.get('SCRAPER_REVISIT_SAMPLE', 25))
+# page budget for known ids per incremental run (--sample=N), picked by revisit_scheduler.py
+# Crawl throughput (requests/s, max in flight) is set in nabu_fetch.py / env SCRAPER_RPS, SCRAPER_MAX_IN_FLIGHT
+# before crawling a few random pages are checked against the expected layout (layout_check.py);
+#   a mismatch aborts before anything is written, --skip-layout-check skips the check
+# --range=LO-HI: full crawl of the listed ids with LO <= web_id < HI only (HI may be empty: no upper bound);
+#   one shard of scripts/sharded_crawl.py
+# --ids=FILE: full crawl of the web_ids in FILE (one per line) instead of the listing; sharded_crawl.py
+#   writes one per shard, so the shards do not each download the listing again
+# --changeset=PATH: dry run; brueter.sqlite is only read, inserts/updates go to a JSONL changeset
+#   that scripts/apply_changeset.py loads later in one transaction (see changeset.py)
+# --replay: no network; re-parse the pages stored in the raw-HTML archive (see page_archive.py)
+#   on --processes=N worker processes (env SCRAPER_PARSE_PROCESSES, default one per core)
+
+id_range = None
+id_file = None
+for _arg in sys.argv[1:]:
+    if _arg.startswith('--range='):
+        _lo, _hi = _arg.split('=', 1)[1].split('-')
+        id_range = (int(_lo or 0), int(_hi) if _hi else None)
+    elif _arg.startswith('--ids='):
+        id_file = _arg.split('=', 1)[1]
+
+
+def read_ids(path):
+    with open(path, encoding='utf-8') as f:
+        return [int(line) for line in f if line.strip()]
+
+
+def incremental_ids(sqliteConnection, ordered_ids, sample_size, report_dir='reports'):
+    """Diff the listing against the DB: new ids + scheduled revisits; report vanished ids."""
+    known = {row[0] for row in sqliteConnection.execute('SELECT web_id FROM gebaeudebrueter')}
+    listed = set(ordered_ids)
+    new_ids = [web_id for web_id in ordered_ids if web_id not in known]
+    sample = schedule_revisits(sqliteConnection, sorted(listed & known), sample_size)
+    disappeared = sorted(known - listed)
+    os.makedirs(report_dir, exist_ok=True)
+    write_id_report(os.path.join(report_dir, 'disappeared_webids.csv'), disappeared)
+    print('listing: {} ids, new: {}, revisit sample: {}, disappeared from site: {}'.format(
+        len(ordered_ids), len(new_ids), len(sample), len(disappeared)))
+    return sorted(set(new_ids).union(sample))
+
+
+def crawl(sqliteConnection, writer):
+    url = URL
+
+    if incremental:
+        # the diff needs the whole listing first
+        ordered_ids = listing_ids(fetch_listing(url))
+        sample_size = revisit_sample
+        for arg in sys.argv[1:]:
+            if arg.startswith('--sample='):
+                sample_size = int(arg.split('=', 1)[1])
+        fetch_ids = incremental_ids(sqliteConnection, ordered_ids, sample_size)
+        total = len(fetch_ids)
+    else:
+        # ids are parsed while the listing downloads and fetched as soon as they arrive
+        listed = read_ids(id_file) if id_file else iter_listing_ids(stream_listing(url))
+        if id_range is not None:
+            lo, hi = id_range
+            listed = (web_id for web_id in listed if web_id >= lo and (hi is None or web_id < hi))
+        fetch_ids = IdStream(listed)
+        total = None
+
+    index = 0
+    errors = Counter()
+
+    def store(web_id, values, error):
+        nonlocal index
+        print("ID = {}, index = {}, total = {}".format(
+            web_id, index, total if total is not None else '{}+'.format(len(fetch_ids.ids))))
+        index += 1
+        if error is not None:
+            # retries already happened in the crawl engine; log it and keep going
+            print('Error for ID = {}: {}'.format(web_id, error))
+            errors[error.kind] += 1
+            if writer.journal is not None:
+                writer.journal.record(web_id, 'error', str(error))
+            return
+        writer.write(values)
+
+    archive = PageArchive()
+    try:
+        run_crawl(fetch_ids, store, writer=writer, url=url, job=ArchivingJob(archive))
+        if writer.journal is not None:
+            writer.journal.finish()
+    finally:
+        archive.close()
+        if writer.journal is not None:
+            writer.journal.commit()
+        print('Crawl: {}, errors {}'.format(writer.summary(), dict(errors) or 0))
+        print(format_stats())
+
+
+def replay(writer):
+    processes = PARSE_PROCESSES
+    for arg in sys.argv[1:]:
+        if arg.startswith('--processes='):
+            processes = int(arg.split('=', 1)[1])
+    errors = []
+    try:
+        # parsing is spread over `processes` worker processes; this process is the only writer
+        for web_id, values, error in replay_records(processes=processes):
+            if error is not None:
+                print('Cannot parse archived page for ID = {}: {}'.format(web_id, error))
+                errors.append(web_id)
+                continue
+            writer.write(values)
+    finally:
+        writer.flush()
+    print('Replay: {}, errors {}'.format(writer.summary(), len(errors)))
+
+
+def dry_run(changeset_path, db='brueter.sqlite'):
+    """Crawl into a changeset; the DB (if there is one) is opened read-only."""
+    if os.path.exists(db):
+        sqliteConnection = connect(db, readonly=True, upgrade=False)
     else:
-        cursor.execute('SELECT checksum from gebaeudebrueter where web_id=? and checksum=?', (web_id,checksum))
-        data = cursor.fetchall()
-        if len(data) == 0:
-            value = values[1:] + (1, values[0])
-            query = ('UPDATE gebaeudebrueter SET '
-                     'bezirk=?, plz=?, ort=?, strasse=?, anhang=?, erstbeobachtung=?, beschreibung=?, besonderes=?,'
-                     'update_date=DATETIME(\'NOW\'), mauersegler=?, kontrolle=?, sperling=?, ersatz=?, schwalbe=?, wichtig=?,'
-                     'star=?, sanierung=?, fledermaus=?, verloren=?, andere=?, checksum=?, new=? WHERE web_id=?')
-            cursor.execute(query,value)
-            sqliteConnection.commit()
-            print('updated')
-
-    index += 1
-
-if (sqliteConnection):
-    sqliteConnection.close()
+        # no DB here: an empty one in memory, so every record becomes an insert
+        sqliteConnection = connect(':memory:')
+    writer = ChangesetWriter(changeset_path, sqliteConnection)
+    try:
+        preflight_or_exit(sqliteConnection)
+        crawl(sqliteConnection, writer)
+    finally:
+        writer.close()
+        sqliteConnection.close()
+
+
+def main():
+    for arg in sys.argv[1:]:
+        if arg.startswith('--changeset='):
+            dry_run(arg.split('=', 1)[1])
+            return
+    try:
+        # migrations run only after the layout check, so an aborted crawl writes nothing
+        sqliteConnection = connect(upgrade=False)
+    except sqlite3.Error as error:
+        print("Error while connecting to sqlite", error)
+        return
+    try:
+        if '--replay' in sys.argv[1:]:
+            migrate(sqliteConnection)
+            replay(RecordWriter(sqliteConnection))
+        else:
+            preflight_or_exit(sqliteConnection)
+            migrate(sqliteConnection)
+            # outcomes go to the crawl journal: the change history revisit_scheduler.py works from
+            journal = CrawlJournal(sqliteConnection, 'nabuPageScraper',
+                                   note='incremental' if incremental else 'full')
+            crawl(sqliteConnection, RecordWriter(sqliteConnection, journal=journal))
+    finally:
+        sqliteConnection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""HTTP access to the NABU site and the crawl budget shared by all scrapers.
+
+Requests go through the pooled keep-alive session of http_client.py.
+
+Settings can be overridden via env vars:
+  NABU_URL                 base url of the site (e.g. a local stand-in server)
+  SCRAPER_RPS              max requests started per second (default 5)
+  SCRAPER_MAX_IN_FLIGHT    max concurrent requests (default 4)
+  SCRAPER_TIMEOUT_SECONDS  read timeout per request (default 30)
+  SCRAPER_RETRIES          end-of-run retry rounds for transient failures (default 3)
+  SCRAPER_BACKOFF_SECONDS  base delay before the first retry round, doubled per round (default 5)
+  SCRAPER_BREAKER_THRESHOLD  consecutive transient failures that pause the crawl (default 10)
+  SCRAPER_BREAKER_COOLDOWN   first pause in seconds, doubled while the site stays down (default 30)
+"""
+import os
+
+import requests
+
+from http_client import get_client
+
+URL = os.environ.get('NABU_URL', 'http://www.gebaeudebrueter-in-berlin.de/index.php')
+DEFAULT_RPS = float(os.environ.get('SCRAPER_RPS', '5'))
+DEFAULT_MAX_IN_FLIGHT = int(os.environ.get('SCRAPER_MAX_IN_FLIGHT', '4'))
+TIMEOUT = float(os.environ.get('SCRAPER_TIMEOUT_SECONDS', '30'))
+RETRIES = int(os.environ.get('SCRAPER_RETRIES', '3'))
+BACKOFF = float(os.environ.get('SCRAPER_BACKOFF_SECONDS', '5'))
+BREAKER_THRESHOLD = int(os.environ.get('SCRAPER_BREAKER_THRESHOLD', '10'))
+BREAKER_COOLDOWN = float(os.environ.get('SCRAPER_BREAKER_COOLDOWN', '30'))
+
+# failure kinds worth retrying later; 'removed' (404/410), 'http' (other 4xx) and 'parse' are final
+TRANSIENT = frozenset(('timeout', 'server', 'network'))
+
+
+class NotModifiedError(Exception):
+    """A 304 answer to a request that had no validators to match."""
+
+
+def classify_error(e):
+    """Return the failure kind of an exception raised while fetching/parsing a page."""
+    if isinstance(e, NotModifiedError):
+        return 'http'
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        status = e.response.status_code
+        if status in (404, 410):
+            return 'removed'
+        if status >= 500 or status == 429:
+            return 'server'
+        return 'http'
+    if isinstance(e, (requests.Timeout, TimeoutError)):
+        return 'timeout'
+    if isinstance(e, (requests.RequestException, OSError)):
+        return 'network'
+    return 'parse'
+
+
+def _get(url, timeout, headers=None, **kwargs):
+    resp = get_client().get(url, headers=headers, timeout=timeout, **kwargs)
+    if resp.status_code != 304:
+        resp.raise_for_status()
+    return resp
+
+
+def fetch_listing(url=URL, timeout=TIMEOUT):
+    return _get(url + '?find=%25', timeout).content
+
+
+def stream_listing(url=URL, timeout=TIMEOUT, chunk_size=16384):
+    """Yield the `?find=%25` listing in (decompressed) chunks as it downloads."""
+    with _get(url + '?find=%25', timeout, stream=True) as resp:
+        for chunk in resp.iter_content(chunk_size):
+            yield chunk
+
+
+def fetch_detail(web_id, url=URL, timeout=TIMEOUT):
+    return _get(url + '?ID=' + str(web_id), timeout).content
+
+
+def fetch_detail_conditional(web_id, headers=None, url=URL, timeout=TIMEOUT):
+    """Conditional GET of a detail page; returns (status, response_headers, body).
+
+    `headers` carries If-None-Match / If-Modified-Since; body is None on 304.
+    """
+    resp = _get(url + '?ID=' + str(web_id), timeout, headers=headers or {})
+    if resp.status_code == 304:
+        return 304, resp.headers, None
+    return resp.status_code, resp.headers, resp.content
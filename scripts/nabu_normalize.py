@@ -0,0 +1,93 @@
+"""Normalization of NABU field values, shared by the parsers (nabu_parse.py).
+
+sanitize_date turns the free-text "Erstbeobachtung" into a datetime or
+'unbekannt': known oddities are fixed through DATE_FIXUPS, the common
+dd.mm.yyyy shape is read by a regex, and everything else goes through
+dateutil (dayfirst). Results are memoized, since the same few hundred
+values repeat across all records.
+
+stripped removes Unicode control/format/unassigned characters (category C)
+with str.translate; printable strings, the usual case, are returned as is.
+
+bench_normalize.py compares both against the original implementations.
+"""
+import re
+import unicodedata
+from datetime import datetime
+from functools import lru_cache
+
+import dateutil.parser as parser
+
+UNKNOWN = 'unbekannt'
+
+# raw value -> value to parse instead; None means the date is unknown
+DATE_FIXUPS = {
+    '': None,
+    'unbekannt': None,
+    '?': None,
+    'o.D.': None,
+    'Salinger': None,
+    'o.D. ': None,
+    'Nicht angegeben': None,
+    'Mai 2019': '01.05.2019',
+    'Juni 2014, Mai 2016': '01.06.2014',
+    'Juni 2019': '01.06.2019',
+    'Mai 2018': '01.05.2018',
+    'Mai 2016': '01.05.2016',
+    'Sommer 2019': '21.06.2019',
+    'Herbst 2019': '23.09.2019',
+    '18.06-15': '18.06.2015',
+    'Juli 2019': '01.07.2019',
+    '004.05.2009': '04.05.2009',
+    '04.2018': '01.04.2018',
+    '28.06,16': '28.06.2016',
+    'Mai 2015': '01.05.2015',
+    'Juli 2020': '01.07.2020',
+    'Juni 2020': '01.06.2020',
+    'Mai 2020': '01.05.2020',
+    '30.06./02.07.18': '02.07.2018',
+}
+
+_DMY = re.compile(r'(\d{1,2})\.(\d{1,2})\.(\d{4})$')
+
+
+@lru_cache(maxsize=4096)
+def sanitize_date(date_text):
+    """Return the first-observation date as datetime, or 'unbekannt'."""
+    if date_text in DATE_FIXUPS:
+        date_text = DATE_FIXUPS[date_text]
+        if date_text is None:
+            return UNKNOWN
+    m = _DMY.match(date_text)
+    if m:
+        try:
+            return datetime(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+        except ValueError:
+            pass  # e.g. 05.13.2019: dateutil swaps day and month
+    try:
+        return parser.parse(date_text, dayfirst=True)
+    except Exception:
+        print('Cannot convert: ' + date_text)
+        return UNKNOWN
+
+
+class _ControlTable(dict):
+    """str.translate table deleting category C characters; filled on first lookup of a code point."""
+
+    def __missing__(self, cp):
+        value = None if unicodedata.category(chr(cp))[0] == 'C' else cp
+        self[cp] = value
+        return value
+
+
+_CONTROL_TABLE = _ControlTable()
+for _cp in range(0x3000):
+    _CONTROL_TABLE[_cp]
+del _cp
+
+
+def stripped(s):
+    """Remove control, format, surrogate, private-use and unassigned characters."""
+    if s.isprintable():
+        return s
+    return s.translate(_CONTROL_TABLE)
@@ -0,0 +1,298 @@
+"""Parsing of NABU pages shared by the scrapers.
+
+`get_data` turns a detail page (`index.php?ID=<web_id>`) into the record tuple
+stored in `gebaeudebrueter`; the last element is the sha3_224 checksum over
+all fields.
+
+The detail page is read by a targeted tokenizer (`_DetailTokenizer`) that only
+tracks table[4]/table[5], their <td>s and the inputs/textareas inside them,
+mirroring how BeautifulSoup's html.parser builder nests tags. Pages it cannot
+handle with certainty fall back to the BeautifulSoup walk in `get_data_soup`,
+which stays the reference implementation (see check_parser_parity.py).
+"""
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EntitySubstitution, UnicodeDammit
+import re
+import hashlib
+from nabu_normalize import sanitize_date, stripped
+
+
+def get_data_soup(web_id, detailContent):
+    """Reference parser: full BeautifulSoup tree, fields read by table/td position."""
+    soup2 = BeautifulSoup(detailContent, features="html.parser")
+    table = soup2.findAll('table')
+    table2 = table[4]
+    td = table2.findChildren('td')
+    bezirk = td[1].findChildren('input')[0]['value']
+    mauersegler = 1 if td[2].findChildren('input', checked=True) else 0
+    kontrolle = 1 if td[3].findChildren('input', checked=True) else 0
+    plz = td[5].findChildren('input')[0]['value']
+    plz = stripped(plz)
+    sperling = 1 if td[6].findChildren('input', checked=True) else 0
+    ersatz = 1 if td[7].findChildren('input', checked=True) else 0
+    ort = td[9].findChildren('input')[0]['value']
+    ort = stripped(ort)
+    schwalbe = 1 if td[10].findChildren('input', checked=True) else 0
+    wichtig = 1 if td[11].findChildren('input', checked=True) else 0
+    strasse = td[13].findChildren('input')[0]['value']
+    strasse = stripped(str(strasse))
+    star = 1 if td[14].findChildren('input', checked=True) else 0
+    sanierung = 1 if td[15].findChildren('input', checked=True) else 0
+    anhang = td[17].findChildren('input')[0]['value']
+    anhang = stripped(anhang)
+    fledermaus = 1 if td[18].findChildren('input', checked=True) else 0
+    verloren = 1 if td[19].findChildren('input', checked=True) else 0
+    erstbeobachtung = td[21].findChildren('input')[0]['value']
+    erstbeobachtung = sanitize_date(erstbeobachtung)
+    andere = 1 if td[22].findChildren('input', checked=True) else 0
+    table2 = table[5]
+    td = table2.findChildren('td')
+    beschreibung = td[1].findChildren('textarea')[0].text
+    besonderes = td[3].findChildren('textarea')[0].text
+    data = (web_id, bezirk, plz, ort, strasse, anhang, erstbeobachtung, beschreibung, besonderes, mauersegler,
+            kontrolle, sperling, ersatz, schwalbe, wichtig, star, sanierung, fledermaus, verloren, andere)
+    payload = ''.join(map(str, data))
+    checksum = hashlib.sha3_224(payload.encode('utf-8')).hexdigest()
+    return data + (checksum,)
+
+
+# table / td positions read from the detail page (same as get_data_soup)
+FIELD_TABLE = 4
+TEXT_TABLE = 5
+INPUT_TDS = {'bezirk': 1, 'plz': 5, 'ort': 9, 'strasse': 13, 'anhang': 17, 'erstbeobachtung': 21}
+CHECKBOX_TDS = (('mauersegler', 2), ('kontrolle', 3), ('sperling', 6), ('ersatz', 7), ('schwalbe', 10),
+                ('wichtig', 11), ('star', 14), ('sanierung', 15), ('fledermaus', 18), ('verloren', 19),
+                ('andere', 22))
+TEXTAREA_TDS = {'beschreibung': 1, 'besonderes': 3}
+# the layout these positions rely on: table -> {td: (what it must contain, field)}; see layout_check.py
+DETAIL_LAYOUT = {
+    FIELD_TABLE: dict([(i, ('input', name)) for name, i in INPUT_TDS.items()]
+                      + [(i, ('checkbox', name)) for name, i in CHECKBOX_TDS]),
+    TEXT_TABLE: {i: ('textarea', name) for name, i in TEXTAREA_TDS.items()},
+}
+
+_VOID_TAGS = frozenset(HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS)
+_ENTITIES = EntitySubstitution.HTML_ENTITY_TO_CHARACTER
+# bs4 stores the text inside these (script, style, template, rt, rp) as special strings that .text skips
+_HIDDEN_TEXT_TAGS = frozenset(HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS)
+
+
+class _DetailTokenizer(HTMLParser):
+    """Collect the <td>s of table[4]/table[5] without building a tree.
+
+    Tag nesting follows bs4's html.parser builder: void tags close at once,
+    an end tag pops up to the most recent open tag of that name and is
+    ignored when none is open. Each tracked td is [first input attrs,
+    any input checked, first textarea text parts]; text inside an open
+    _HIDDEN_TEXT_TAGS element is left out, as bs4's .text does. `fallback`
+    is set for markup whose text bs4 would treat specially (char refs,
+    comments, ... inside a tracked textarea).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = []
+        self.open_counts = {}
+        self.already_closed = []
+        self.tables = 0
+        self.tds = {FIELD_TABLE: [], TEXT_TABLE: []}
+        self.open_tables = []
+        self.open_tds = []
+        self.open_textareas = []
+        self.open_hidden = []
+        self.fallback = False
+
+    def _start(self, tag, attrs):
+        frame = None
+        if tag == 'table':
+            index = self.tables
+            self.tables += 1
+            if index in self.tds:
+                self.open_tables.append(index)
+                frame = self.open_tables
+        elif tag in _HIDDEN_TEXT_TAGS:
+            self.open_hidden.append(tag)
+            frame = self.open_hidden
+        elif self.open_tds or (tag == 'td' and self.open_tables):
+            if tag == 'td':
+                rec = [None, False, None]
+                for index in set(self.open_tables):
+                    self.tds[index].append(rec)
+                self.open_tds.append(rec)
+                frame = self.open_tds
+            elif tag == 'input':
+                attrs = dict((k, '' if v is None else v) for k, v in attrs)
+                for rec in self.open_tds:
+                    if rec[0] is None:
+                        rec[0] = attrs
+                    if 'checked' in attrs:
+                        rec[1] = True
+            elif tag == 'textarea':
+                parts = []
+                for rec in self.open_tds:
+                    if rec[2] is None:
+                        rec[2] = parts
+                self.open_textareas.append(parts)
+                frame = self.open_textareas
+        self.stack.append((tag, frame))
+        self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+
+    def _end(self, tag):
+        if not self.open_counts.get(tag):
+            return
+        while self.stack:
+            name, frame = self.stack.pop()
+            self.open_counts[name] -= 1
+            if frame is not None:
+                frame.pop()
+            if name == tag:
+                break
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+        if tag in _VOID_TAGS:
+            self._end(tag)
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs)
+        self._end(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.already_closed:
+            self.already_closed.remove(tag)
+        else:
+            self._end(tag)
+
+    def handle_data(self, data):
+        if self.open_hidden:
+            return
+        for parts in self.open_textareas:
+            parts.append(data)
+
+    def handle_entityref(self, name):
+        if self.open_textareas:
+            char = _ENTITIES.get(name)
+            self.handle_data(char if char is not None else '&' + name)
+
+    def _special(self, *args):
+        if self.open_textareas:
+            self.fallback = True
+
+    handle_charref = handle_comment = handle_decl = handle_pi = unknown_decl = _special
+
+
+def tokenize_detail(detailContent):
+    """Run _DetailTokenizer over a detail page; None if the markup cannot be decoded or tokenized."""
+    if isinstance(detailContent, bytes):
+        markup = UnicodeDammit(detailContent, is_html=True).unicode_markup
+        if markup is None:
+            return None
+    else:
+        markup = detailContent
+    tokenizer = _DetailTokenizer()
+    try:
+        tokenizer.feed(markup)
+        tokenizer.close()
+    except AssertionError:
+        return None
+    return tokenizer
+
+
+def _extract_fast(detailContent):
+    """Return the raw field values of a detail page, or None when get_data_soup must decide."""
+    tokenizer = tokenize_detail(detailContent)
+    if tokenizer is None or tokenizer.fallback:
+        return None
+    try:
+        td = tokenizer.tds[FIELD_TABLE]
+        fields = {name: td[i][0]['value'] for name, i in INPUT_TDS.items()}
+        for name, i in CHECKBOX_TDS:
+            fields[name] = 1 if td[i][1] else 0
+        td = tokenizer.tds[TEXT_TABLE]
+        for name, i in TEXTAREA_TDS.items():
+            fields[name] = ''.join(td[i][2])
+    except (IndexError, KeyError, TypeError):
+        return None
+    if tokenizer.tables <= TEXT_TABLE:
+        return None
+    return fields
+
+
+def get_data(web_id, detailContent):
+    """Parse a detail page into the record tuple (... fields ..., checksum).
+
+    Same result as get_data_soup, using the targeted tokenizer when possible.
+    """
+    f = _extract_fast(detailContent)
+    if f is None:
+        return get_data_soup(web_id, detailContent)
+    data = (web_id, f['bezirk'], stripped(f['plz']), stripped(f['ort']), stripped(str(f['strasse'])),
+            stripped(f['anhang']), sanitize_date(f['erstbeobachtung']), f['beschreibung'], f['besonderes'],
+            f['mauersegler'], f['kontrolle'], f['sperling'], f['ersatz'], f['schwalbe'], f['wichtig'], f['star'],
+            f['sanierung'], f['fledermaus'], f['verloren'], f['andere'])
+    payload = ''.join(map(str, data))
+    checksum = hashlib.sha3_224(payload.encode('utf-8')).hexdigest()
+    return data + (checksum,)
+
+
+# record positions per field group; a change in one group only redoes the work that depends on it
+FINGERPRINT_GROUPS = (
+    ('fp_address', (2, 3, 4)),                    # plz, ort, strasse -> geocoding
+    ('fp_species', (9, 11, 13, 15, 17, 19)),      # mauersegler, sperling, schwalbe, star, fledermaus, andere
+    ('fp_status', (10, 12, 14, 16, 18)),          # kontrolle, ersatz, wichtig, sanierung, verloren
+    ('fp_text', (1, 5, 6, 7, 8)),                 # bezirk, anhang, erstbeobachtung, beschreibung, besonderes
+)
+
+
+def fingerprints(record):
+    """Return one sha3_224 per FINGERPRINT_GROUPS entry for a record tuple (or DB row in record order)."""
+    return tuple(hashlib.sha3_224('\x1f'.join(str(record[i]) for i in positions).encode('utf-8')).hexdigest()
+                 for _, positions in FINGERPRINT_GROUPS)
+
+
+class _ListingTokenizer(HTMLParser):
+    """Collect the web_id of every <a href="...ID..."> as the listing is fed in chunks."""
+
+    def __init__(self):
+        super().__init__()
+        self.found = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a':
+            return
+        href = dict(attrs).get('href')
+        if href and 'ID' in href:
+            m = re.search('[0-9]+', href)
+            if m:
+                self.found.append(int(m.group(0)))
+
+
+def iter_listing_ids(chunks):
+    """Yield each web_id linked from the listing once, while its chunks are still arriving.
+
+    Only the ASCII hrefs matter, so bytes are decoded as latin-1 (never fails,
+    no charset sniffing needed); no tree of the listing is kept.
+    """
+    tokenizer = _ListingTokenizer()
+    seen = set()
+
+    def drain():
+        found, tokenizer.found = tokenizer.found, []
+        for web_id in found:
+            if web_id not in seen:
+                seen.add(web_id)
+                yield web_id
+
+    for chunk in chunks:
+        tokenizer.feed(chunk.decode('latin-1') if isinstance(chunk, bytes) else chunk)
+        yield from drain()
+    tokenizer.close()
+    yield from drain()
+
+
+def listing_ids(content):
+    """Return the sorted web_ids linked from the `?find=%25` listing page."""
+    return sorted(iter_listing_ids([content]))
@@ -0,0 +1,197 @@
+"""Local stand-in for www.gebaeudebrueter-in-berlin.de.
+
+Serves `index.php?find=%25` (ID listing) and `index.php?ID=<web_id>` detail
+pages, either replayed from a directory of saved pages (`<web_id>.html`) or
+generated in the table layout `get_data` expects. Used to benchmark the
+scrapers without hitting the real site.
+
+Detail pages carry an ETag and are answered with 304 on a matching
+If-None-Match (disable with --no-validators). Responses are gzip-compressed
+when the client sends Accept-Encoding: gzip (disable with --no-gzip). --error-rate injects failures
+into that share of detail requests, answered with one of --error-codes
+(HTTP status; 0 drops the connection without a response).
+
+Run: python scripts/nabu_standin.py --port 8765 [--pages-dir DIR] [--size 100000] [--latency-ms 50]
+     [--error-rate 0.02 --error-codes 500,503,0]
+then point the scrapers at it with NABU_URL=http://127.0.0.1:8765/index.php
+"""
+import argparse
+import gzip
+import hashlib
+import html
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+STREETS = ['Hauptstraße', 'Schloßstraße', 'Kaiser-Wilhelm-Str.', 'Albrechtstraße', 'Birkbuschstraße', 'Feuerbachstr.']
+BEZIRKE = ['Steglitz-Zehlendorf', 'Tempelhof-Schöneberg', 'Pankow', 'Neukölln', 'Mitte']
+DATES = ['04.05.2009', '18.06.2015', 'Mai 2019', 'unbekannt', '', '28.06,16', '01.07.2020', '12.6.2012']
+
+
+def _checkbox(name, checked):
+    return '<input type="checkbox" name="{}"{}>'.format(name, ' checked' if checked else '')
+
+
+def _text(name, value):
+    return '<input type="text" name="{}" value="{}">'.format(name, html.escape(value, quote=True))
+
+
+def render_detail(web_id):
+    """Return a detail page for web_id in the NABU table layout (deterministic per id)."""
+    rnd = random.Random(web_id)
+    flag = lambda: rnd.random() < 0.3
+    street = '{} {}{}'.format(rnd.choice(STREETS), rnd.randint(1, 120), rnd.choice(['', '', 'a', '-12']))
+    # td indexes inside table[4] as read by get_data
+    cells = [
+        'Bezirk:', _text('bezirk', rnd.choice(BEZIRKE)), _checkbox('mauersegler', flag()), _checkbox('kontrolle', flag()),
+        'PLZ:', _text('plz', str(rnd.randint(10115, 14199))), _checkbox('sperling', flag()), _checkbox('ersatz', flag()),
+        'Ort:', _text('ort', 'Berlin'), _checkbox('schwalbe', flag()), _checkbox('wichtig', flag()),
+        'Straße:', _text('strasse', street), _checkbox('star', flag()), _checkbox('sanierung', flag()),
+        'Anhang:', _text('anhang', ''), _checkbox('fledermaus', flag()), _checkbox('verloren', flag()),
+        'Erstbeobachtung:', _text('erstbeobachtung', rnd.choice(DATES)), _checkbox('andere', flag()),
+    ]
+    rows = ''.join('<tr>' + ''.join('<td>{}</td>'.format(c) for c in cells[i:i + 4]) + '</tr>'
+                   for i in range(0, len(cells), 4))
+    text = ' '.join(rnd.choice(['Nistkästen', 'am Dach', 'Fassade', 'Mauersegler', 'saniert', '&', '<b>']) for _ in range(rnd.randint(3, 40)))
+    layout = ''.join('<table class="nav"><tr><td><a href="index.php?page={0}">Seite {0}</a></td></tr></table>'.format(i)
+                     for i in range(4))
+    return (
+        '<html><head><meta charset="utf-8"><title>Gebäudebrüter</title></head><body>'
+        + layout +
+        '<form><table class="detail">' + rows + '</table>'
+        '<table class="text"><tr><td>Beschreibung:</td><td><textarea name="beschreibung">{}</textarea></td></tr>'
+        '<tr><td>Besonderes:</td><td><textarea name="besonderes">{}</textarea></td></tr></table>'
+        '</form></body></html>'
+    ).format(html.escape(text), html.escape(text[:rnd.randint(0, 30)]))
+
+
+def render_listing(web_ids):
+    links = ''.join('<tr><td><a href="index.php?ID={0}">Fundort {0}</a></td></tr>'.format(i) for i in web_ids)
+    return ('<html><body><a href="index.php">Start</a><table>' + links + '</table></body></html>')
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes; without TCP_NODELAY every keep-alive
+    # request waits for the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+    # set by make_server
+    web_ids = ()
+    pages_dir = None
+    latency = 0.0
+    validators = True
+    gzip = True
+    error_rate = 0.0
+    error_codes = (500,)
+    rnd = random.Random(0)
+    rnd_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, etag=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if self.gzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(data, compresslevel=6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_detail(self, body):
+        if not self.validators:
+            return self._send(200, body)
+        etag = '"{}"'.format(hashlib.sha1(body.encode('utf-8')).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        return self._send(200, body, etag)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        query = parse_qs(urlsplit(self.path).query)
+        if 'find' in query:
+            return self._send(200, render_listing(self.web_ids))
+        try:
+            web_id = int(query['ID'][0])
+        except (KeyError, ValueError):
+            return self._send(404, 'not found')
+        if self.error_rate:
+            with self.rnd_lock:
+                fail = self.rnd.random() < self.error_rate
+                code = self.rnd.choice(self.error_codes)
+            if fail and code == 0:
+                self.close_connection = True
+                return
+            if fail:
+                return self._send(code, 'injected error')
+        if self.pages_dir:
+            path = os.path.join(self.pages_dir, '{}.html'.format(web_id))
+            if not os.path.exists(path):
+                return self._send(404, 'not found')
+            with open(path, encoding='utf-8', errors='replace') as f:
+                return self._send_detail(f.read())
+        return self._send_detail(render_detail(web_id))
+
+
+def make_server(port=0, web_ids=None, pages_dir=None, latency_ms=0, validators=True, error_rate=0.0,
+                error_codes=(500,), seed=0, use_gzip=True):
+    """Create a threaded stand-in server; returns (server, base_url)."""
+    if web_ids is None:
+        if pages_dir:
+            web_ids = sorted(int(n[:-5]) for n in os.listdir(pages_dir) if n.endswith('.html') and n[:-5].isdigit())
+        else:
+            web_ids = range(1, 1001)
+    handler = type('Handler', (StandinHandler,), {
+        'web_ids': list(web_ids), 'pages_dir': pages_dir, 'latency': latency_ms / 1000.0,
+        'validators': validators, 'gzip': use_gzip, 'error_rate': error_rate, 'error_codes': tuple(error_codes),
+        'rnd': random.Random(seed), 'rnd_lock': threading.Lock(),
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    return server, 'http://127.0.0.1:{}/index.php'.format(server.server_address[1])
+
+
+def start_server(**kwargs):
+    """Start the stand-in in a background thread; returns (server, base_url)."""
+    server, base_url = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--pages-dir', help='replay saved detail pages (<web_id>.html) instead of generating them')
+    ap.add_argument('--size', type=int, default=1000, help='number of generated ids')
+    ap.add_argument('--latency-ms', type=float, default=0)
+    ap.add_argument('--no-validators', action='store_true', help='do not send ETag / answer conditional requests')
+    ap.add_argument('--no-gzip', action='store_true', help='never compress responses')
+    ap.add_argument('--error-rate', type=float, default=0, help='share of detail requests that fail (0..1)')
+    ap.add_argument('--error-codes', default='500', help='comma separated statuses for injected errors, 0 = drop')
+    args = ap.parse_args()
+    web_ids = None if args.pages_dir else range(1, args.size + 1)
+    codes = [int(c) for c in args.error_codes.split(',') if c.strip()]
+    server, base_url = make_server(args.port, web_ids, args.pages_dir, args.latency_ms, not args.no_validators,
+                                   args.error_rate, codes, use_gzip=not args.no_gzip)
+    print('Serving NABU stand-in at', base_url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == '__main__':
+    main()
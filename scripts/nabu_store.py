@@ -0,0 +1,189 @@
+"""Checksum upsert of scraped records into `gebaeudebrueter`.
+
+Shared by nabuPageScraper.py, full_refetch_and_diff.py and
+scrape_missing_webids.py. A record is inserted when its web_id is unknown,
+updated when its checksum changed and left alone otherwise.
+
+Next to the checksum every row stores per-group fingerprints (fp_address,
+fp_species, fp_status, fp_text, see nabu_parse.FINGERPRINT_GROUPS), so an
+update only flags the work its changes need:
+new=1  address (strasse/plz/ort) changed -> re-geocode (generateLocationForPageMap.py)
+new=2  only the text changed -> redo the street flags / source prefix, no geocoding
+Species and status changes leave `new` as it is. A row without fingerprints
+(stored before them, see migrations.py step 5) gets them on its next parse:
+left otherwise untouched when its checksum matches, flagged new=1 like any
+update before the fingerprints when it does not.
+
+Records are buffered and written in batches: one SELECT for the checksums of
+the whole batch (for the added/updated/unchanged counts), one executemany
+upsert and one commit per batch. Env: SCRAPER_WRITE_BATCH (default 200).
+"""
+import csv
+import os
+
+from nabu_parse import FINGERPRINT_GROUPS, fingerprints
+from migrations import migrate
+
+WRITE_BATCH = int(os.environ.get('SCRAPER_WRITE_BATCH', 200))
+
+COLUMNS = ('web_id', 'bezirk', 'plz', 'ort', 'strasse', 'anhang', 'erstbeobachtung', 'beschreibung', 'besonderes',
+           'mauersegler', 'kontrolle', 'sperling', 'ersatz', 'schwalbe', 'wichtig',
+           'star', 'sanierung', 'fledermaus', 'verloren', 'andere', 'checksum')
+FP_COLUMNS = tuple(name for name, _ in FINGERPRINT_GROUPS)
+
+INSERT_QUERY = ('INSERT INTO gebaeudebrueter'
+                '(web_id, bezirk, plz, ort, strasse, anhang, erstbeobachtung, beschreibung, besonderes,'
+                'update_date, mauersegler, kontrolle, sperling, ersatz, schwalbe, wichtig,'
+                'star, sanierung, fledermaus, verloren, andere, checksum, fp_address, fp_species, fp_status, fp_text)'
+                'VALUES (?,?,?,?,?,?,?,?,?,DATETIME(\'now\'),?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)')
+
+# SET expressions see the old row, so `new` is decided from the stored fingerprints
+NEW_FLAG_CASE = ('CASE WHEN gebaeudebrueter.fp_address IS NOT excluded.fp_address THEN 1 '
+                 'WHEN gebaeudebrueter.new = 1 THEN 1 '
+                 'WHEN gebaeudebrueter.fp_text IS NOT excluded.fp_text THEN 2 '
+                 'ELSE gebaeudebrueter.new END')
+
+# relies on the unique web_id index (migration 7); rows whose checksum did not change are not touched
+UPSERT_QUERY = (INSERT_QUERY +
+                ' ON CONFLICT(web_id) DO UPDATE SET ' +
+                ', '.join('{0}=excluded.{0}'.format(c) for c in COLUMNS[1:] + FP_COLUMNS) +
+                ', update_date=DATETIME(\'NOW\'), new=' + NEW_FLAG_CASE +
+                ' WHERE gebaeudebrueter.checksum IS NOT excluded.checksum')
+# unchanged rows that have no fingerprints yet
+SEED_QUERY = ('UPDATE gebaeudebrueter SET fp_address=?, fp_species=?, fp_status=?, fp_text=? '
+              'WHERE web_id=? AND fp_address IS NULL')
+
+
+def new_flag(stored_address_fp, stored_text_fp, stored_new, fps):
+    """Python twin of NEW_FLAG_CASE, for a web_id seen twice in one batch."""
+    if stored_address_fp != fps[0] or stored_new == 1:
+        return 1
+    if stored_text_fp != fps[3]:
+        return 2
+    return stored_new
+
+
+class RecordWriter:
+    """Buffer parsed records and upsert them `batch_size` at a time.
+
+    added/updated/unchanged collect the web_ids per outcome (the shape
+    write_reports() turns into CSVs); they are filled when a batch is flushed.
+    address_changed lists the updated web_ids that were flagged for geocoding.
+    With a CrawlJournal every outcome is journaled in the batch's transaction.
+    Call flush() before closing the connection so the last batch is written
+    (the crawl engine does this on shutdown and on cancellation).
+    """
+
+    def __init__(self, conn, batch_size=WRITE_BATCH, journal=None):
+        self.conn = conn
+        self.journal = journal
+        self.cur = conn.cursor()
+        self.batch_size = max(1, int(batch_size))
+        self.batch = []
+        self.added = []
+        self.updated = []
+        self.unchanged = []
+        self.address_changed = []
+        migrate(conn)
+
+    def write(self, values):
+        """Queue one record tuple; the batch is written once it is full."""
+        self.batch.append(values)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def mark_unchanged(self, web_id):
+        """Count a record known to be unchanged without touching the DB (e.g. HTTP cache hit)."""
+        self.unchanged.append(web_id)
+        if self.journal is not None:
+            self.journal.record(web_id, 'unchanged')
+
+    def _stored_rows(self, web_ids):
+        """{web_id: [(checksum, fp_address, fp_text, new), ...]} for the web_ids of a batch."""
+        stored = {}
+        web_ids = list(set(web_ids))
+        # stay below SQLite's bound-parameter limit
+        for i in range(0, len(web_ids), 500):
+            chunk = web_ids[i:i + 500]
+            query = ('SELECT web_id, checksum, fp_address, fp_text, new FROM gebaeudebrueter '
+                     'WHERE web_id IN ({})'.format(','.join('?' * len(chunk))))
+            for row in self.cur.execute(query, chunk):
+                stored.setdefault(row[0], []).append(row[1:])
+        return stored
+
+    def flush(self):
+        """Write the buffered records in one transaction; returns [(web_id, outcome)]."""
+        if not self.batch:
+            if self.journal is not None:
+                self.journal.commit()
+            return []
+        batch, self.batch = self.batch, []
+        stored = self._stored_rows([values[0] for values in batch])
+        outcomes = []
+        changed = []
+        seeds = []
+        address_changed = []
+        for values in batch:
+            web_id, checksum = values[0], values[-1]
+            fps = fingerprints(values)
+            row = values + fps
+            known = stored.get(web_id)
+            if known is None:
+                outcome = 'added'
+                new = 1
+            elif all(k[0] != checksum for k in known):
+                outcome = 'updated'
+                _, address_fp, text_fp, new = known[0]
+                new = new_flag(address_fp, text_fp, new, fps)
+                if address_fp != fps[0]:
+                    address_changed.append(web_id)
+            else:
+                outcome = 'unchanged'
+                new = known[0][3]
+                if known[0][1] is None:
+                    seeds.append(fps + (web_id,))
+            if outcome != 'unchanged':
+                changed.append(row)
+            # a web_id seen twice in one batch is compared against the earlier record
+            stored[web_id] = [(checksum, fps[0], fps[3], new)]
+            outcomes.append((web_id, outcome))
+        try:
+            self.cur.executemany(UPSERT_QUERY, changed)
+            self.cur.executemany(SEED_QUERY, seeds)
+            if self.journal is not None:
+                self.journal.record_many(outcomes)
+            self.conn.commit()
+            if self.journal is not None:
+                self.journal.dirty = False
+        except BaseException:
+            self.conn.rollback()
+            self.batch = batch + self.batch
+            raise
+        for web_id, outcome in outcomes:
+            getattr(self, outcome).append(web_id)
+        self.address_changed.extend(address_changed)
+        return outcomes
+
+    def summary(self):
+        return 'added {}, updated {} ({} with address change), unchanged {}'.format(
+            len(self.added), len(self.updated), len(self.address_changed), len(self.unchanged))
+
+
+def write_id_report(path, web_ids):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['web_id'])
+        for wid in web_ids:
+            w.writerow([wid])
+
+
+def write_reports(report_dir, added, updated, errors, prefix='full_refetch'):
+    """Write <prefix>_added/_updated/_errors.csv like full_refetch_and_diff.py always did."""
+    os.makedirs(report_dir, exist_ok=True)
+    write_id_report(os.path.join(report_dir, prefix + '_added.csv'), added)
+    write_id_report(os.path.join(report_dir, prefix + '_updated.csv'), updated)
+    with open(os.path.join(report_dir, prefix + '_errors.csv'), 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['web_id', 'error'])
+        for wid, err in errors:
+            w.writerow([wid, err])
@@ -0,0 +1,122 @@
+"""Compressed, content-addressed archive of fetched NABU detail pages.
+
+Every page body the scrapers download is stored once under
+archive/objects/<aa>/<sha256>.html.gz; archive/index.sqlite records which
+web_id served which body and when. Identical bodies are stored only once.
+
+`replay_records()` re-runs get_data over the latest archived page of every
+web_id on a process pool (parse_stage.py), without any network access, so parser fixes can be
+applied to the whole table in seconds (nabuPageScraper.py --replay).
+
+Env: PAGE_ARCHIVE overrides the archive directory (default `archive`).
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+
+from nabu_fetch import URL, TIMEOUT, fetch_detail
+from nabu_parse import get_data
+from parse_stage import PARSE_CHUNK, PARSE_PROCESSES, parse_pages
+
+ARCHIVE_DIR = os.environ.get('PAGE_ARCHIVE', 'archive')
+
+
+class PageArchive:
+    """Archive writer/reader; store() may be called from the crawl worker threads."""
+
+    def __init__(self, path=ARCHIVE_DIR):
+        self.path = path
+        self.objects = os.path.join(path, 'objects')
+        os.makedirs(self.objects, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(path, 'index.sqlite'), check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS pages ('
+                          'web_id INTEGER NOT NULL, sha256 TEXT NOT NULL, fetched_at TEXT, '
+                          'PRIMARY KEY (web_id, sha256))')
+
+    def object_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest + '.html.gz')
+
+    def store(self, web_id, body):
+        """Archive a raw page body for web_id; returns its sha256."""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = '{}.{}.tmp'.format(path, threading.get_ident())
+            with gzip.open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, path)
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO pages (web_id, sha256, fetched_at) '
+                              'VALUES (?,?,DATETIME(\'now\'))', (web_id, digest))
+        return digest
+
+    def has(self, digest):
+        return os.path.exists(self.object_path(digest))
+
+    def read(self, digest):
+        with gzip.open(self.object_path(digest), 'rb') as f:
+            return f.read()
+
+    def latest(self):
+        """Return [(web_id, sha256)] of the most recently fetched body per web_id."""
+        with self.lock:
+            # INSERT OR REPLACE re-inserts a refetched body, so the highest rowid is the newest
+            rows = self.conn.execute(
+                'SELECT web_id, sha256 FROM pages WHERE rowid IN '
+                '(SELECT MAX(rowid) FROM pages GROUP BY web_id) ORDER BY web_id').fetchall()
+        return rows
+
+    def merge(self, other_path):
+        """Copy the pages of another archive (e.g. a crawl shard) into this one; returns the number of rows."""
+        other = PageArchive(other_path)
+        try:
+            rows = other.conn.execute('SELECT web_id, sha256, fetched_at FROM pages ORDER BY rowid').fetchall()
+            for _, digest, _ in rows:
+                path = self.object_path(digest)
+                if not os.path.exists(path) and other.has(digest):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    shutil.copyfile(other.object_path(digest), path)
+        finally:
+            other.close()
+        with self.lock:
+            self.conn.executemany('INSERT OR REPLACE INTO pages (web_id, sha256, fetched_at) VALUES (?,?,?)', rows)
+            self.conn.commit()
+        return len(rows)
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+class ArchivingJob:
+    """crawl_engine job: fetch, archive the raw body, then parse it."""
+
+    def __init__(self, archive):
+        self.archive = archive
+
+    def __call__(self, web_id, url=URL, timeout=TIMEOUT):
+        body = fetch_detail(web_id, url, timeout)
+        self.archive.store(web_id, body)
+        return get_data(web_id, body)
+
+
+def replay_records(archive_dir=ARCHIVE_DIR, processes=PARSE_PROCESSES, chunk_size=PARSE_CHUNK):
+    """Yield (web_id, record, error) for the latest archived page of every web_id.
+
+    Parsing runs in parse_stage.py's process pool; results come back in web_id
+    order so the single caller can own the DB connection.
+    """
+    archive = PageArchive(archive_dir)
+    items = [(web_id, archive.object_path(digest)) for web_id, digest in archive.latest()]
+    archive.close()
+    return parse_pages(items, processes, chunk_size)
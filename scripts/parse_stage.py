@@ -0,0 +1,56 @@
+"""Multi-process parse stage: get_data over stored pages, results back in input order.
+
+Work is cut into chunks of `chunk_size` pages; each worker process reads the
+gzipped bodies of a chunk itself (only paths cross the process boundary) and
+returns the parsed records of the whole chunk at once. Chunks come back in
+submission order, so the caller (the single writer that owns the SQLite
+connection) sees records in input order however many processes run.
+
+With processes=1 everything runs in the calling process, which is also the
+fastest choice for a handful of pages.
+
+Env: SCRAPER_PARSE_PROCESSES (default: one per core), SCRAPER_PARSE_CHUNK (pages per work unit, default 64)
+"""
+import gzip
+import os
+from itertools import islice
+from multiprocessing import Pool
+
+from nabu_parse import get_data
+
+PARSE_PROCESSES = int(os.environ.get('SCRAPER_PARSE_PROCESSES', 0)) or os.cpu_count() or 1
+PARSE_CHUNK = int(os.environ.get('SCRAPER_PARSE_CHUNK', 64))
+
+
+def parse_file(web_id, path):
+    """(web_id, record, error) for one gzipped page body; error is repr(exception) or None."""
+    try:
+        with gzip.open(path, 'rb') as f:
+            return web_id, get_data(web_id, f.read()), None
+    except Exception as e:
+        return web_id, None, repr(e)
+
+
+def _parse_chunk(chunk):
+    return [parse_file(web_id, path) for web_id, path in chunk]
+
+
+def _chunks(items, size):
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_pages(items, processes=PARSE_PROCESSES, chunk_size=PARSE_CHUNK):
+    """Yield (web_id, record, error) for every (web_id, path) in `items`, in input order."""
+    chunks = _chunks(items, max(1, chunk_size))
+    if processes <= 1:
+        for chunk in chunks:
+            yield from _parse_chunk(chunk)
+        return
+    with Pool(processes) as pool:
+        for results in pool.imap(_parse_chunk, chunks):
+            yield from results
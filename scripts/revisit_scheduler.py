@@ -0,0 +1,106 @@
+"""Pick which known web_ids to re-check, by how likely they are to have changed.
+
+Each record gets an estimated change rate (changes per day) from its history:
+the 'updated' outcomes in crawl_journal over the days it has been observed,
+where the observation starts at the first journal entry or, for records the
+journal has not seen yet, at update_date (the last time its content changed).
+One pseudo-change and PRIOR_DAYS keep the estimate finite, so a record
+edited last week scores far higher than one untouched since 2012.
+
+The chance that a record changed since it was last checked is then
+1 - exp(-rate * days_since_check). The last check is the latest journal
+entry; without one it is taken to be the last crawl that wrote to the DB.
+Records not checked for MAX_STALE_DAYS come first regardless, so static
+records are still revisited now and then. The `budget` highest are returned.
+
+Env: SCRAPER_REVISIT_PRIOR_DAYS (default 30), SCRAPER_REVISIT_MAX_STALE_DAYS (default 180)
+
+Usage: python scripts/revisit_scheduler.py [--db=brueter.sqlite] [--budget=25]
+       prints the ids the next `nabuPageScraper.py --incremental` would revisit.
+"""
+import math
+import os
+import sqlite3
+import sys
+
+from crawl_journal import ensure_journal_tables
+from db_utils import connect
+
+PRIOR_DAYS = float(os.environ.get('SCRAPER_REVISIT_PRIOR_DAYS', 30))
+MAX_STALE_DAYS = float(os.environ.get('SCRAPER_REVISIT_MAX_STALE_DAYS', 180))
+
+# dates are compared as julianday() values: update_date may hold dd.mm.yyyy (convert_date_format.py),
+# which julianday() maps to NULL, so such rows are ignored instead of outsorting the ISO dates as strings
+HISTORY_QUERY = '''
+SELECT g.web_id,
+       COALESCE(j.changes, 0),
+       julianday('now') - MIN(COALESCE(julianday(j.first_check), julianday(g.update_date)),
+                              COALESCE(julianday(g.update_date), julianday(j.first_check))),
+       julianday('now') - COALESCE(julianday(j.last_check), :last_crawl)
+FROM gebaeudebrueter g
+LEFT JOIN (SELECT web_id, SUM(outcome = 'updated') AS changes, MIN(at) AS first_check, MAX(at) AS last_check
+           FROM crawl_journal WHERE outcome <> 'error' GROUP BY web_id) j ON j.web_id = g.web_id
+'''
+
+
+def change_rate(changes, observed_days, prior_days=PRIOR_DAYS):
+    """Estimated changes per day."""
+    return (changes + 1.0) / (max(observed_days or 0.0, 0.0) + prior_days)
+
+
+def priority(changes, observed_days, since_check, prior_days=PRIOR_DAYS, max_stale_days=MAX_STALE_DAYS):
+    """Probability of a change since the last check; > 1 for records overdue by max_stale_days."""
+    since_check = max(since_check or 0.0, 0.0)
+    if since_check >= max_stale_days:
+        return 1.0 + since_check
+    return 1.0 - math.exp(-change_rate(changes, observed_days, prior_days) * since_check)
+
+
+def revisit_history(conn):
+    """{web_id: (changes, observed_days, days_since_check)} for every record in the DB."""
+    try:
+        ensure_journal_tables(conn)
+    except sqlite3.OperationalError:
+        # read-only DB without a journal (changeset dry run): no history yet
+        ensure_journal_tables(conn, temp=True)
+    last_crawl = conn.execute('SELECT MAX(day) FROM (SELECT MAX(julianday(update_date)) AS day FROM gebaeudebrueter '
+                              'UNION ALL SELECT julianday(MAX(at)) FROM crawl_journal)').fetchone()[0]
+    return {web_id: (changes, observed, since_check)
+            for web_id, changes, observed, since_check in conn.execute(HISTORY_QUERY, {'last_crawl': last_crawl})}
+
+
+def schedule_revisits(conn, candidate_ids, budget):
+    """The `budget` candidate ids most likely to have changed, most likely first."""
+    if budget <= 0:
+        return []
+    history = revisit_history(conn)
+    scored = []
+    for web_id in candidate_ids:
+        changes, observed, since_check = history.get(web_id, (0, None, None))
+        scored.append((-priority(changes, observed, since_check), web_id))
+    scored.sort()
+    return [web_id for _, web_id in scored[:budget]]
+
+
+def main():
+    db = 'brueter.sqlite'
+    budget = int(os.environ.get('SCRAPER_REVISIT_SAMPLE', 25))
+    for arg in sys.argv[1:]:
+        if arg.startswith('--db='):
+            db = arg.split('=', 1)[1]
+        elif arg.startswith('--budget='):
+            budget = int(arg.split('=', 1)[1])
+    conn = connect(db, readonly=True)
+    try:
+        history = revisit_history(conn)
+        for web_id in schedule_revisits(conn, list(history), budget):
+            changes, observed, since_check = history[web_id]
+            p = priority(changes, observed, since_check)
+            print('{}\t{}\tchanges={}\tobserved={:.0f}d\tsince_check={:.1f}d'.format(
+                web_id, 'overdue' if p > 1 else 'p={:.3f}'.format(p), changes, observed or 0, since_check or 0))
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
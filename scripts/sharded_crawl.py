@@ -0,0 +1,183 @@
+"""Range-sharded full crawl: N nabuPageScraper processes, each writing its own changeset, then one merge.
+
+The plan downloads the listing once, splits its sorted web_ids into N ranges
+of about the same size (the first starts at 0, the last is open) and stores
+them in DIR/plan.json, with each shard's ids in DIR/shard_<k>/ids.txt. Every
+shard is a `nabuPageScraper.py --ids=... --range=LO-HI --changeset=...` dry
+run with its own page archive in DIR/shard_<k>/; it crawls its id list and
+does not fetch the listing again. Ids added to the site after the plan are
+left for the next incremental run. The merge checks that every web_id lies in
+its shard's range and in one shard only, writes DIR/merged.jsonl in web_id
+order, copies the shard archives into the main archive and applies the
+merged changeset in one transaction (changeset.apply_changeset, same
+checksum checks as apply_changeset.py).
+
+Every shard gets the full crawl budget (SCRAPER_RPS, SCRAPER_MAX_IN_FLIGHT),
+so N shards request pages up to N times as fast as a single crawl. With
+--share-budget the budget is divided among the shards instead: the site
+sees the same load as one crawl and sharding only spreads the parsing over
+cores. Shards run on other machines should get the same setting.
+
+Usage:
+  python scripts/sharded_crawl.py [--shards=N] [--dir=shards] [--share-budget] [--no-apply] [--force]
+      plan, crawl all shards here, merge and apply
+  python scripts/sharded_crawl.py --plan [--shards=N] [--dir=shards] [--share-budget]
+      only write the plan and print one command per shard (e.g. for other machines, which
+      need their shard_<k>/ids.txt; copy the shard_<k> directories back into DIR afterwards)
+  python scripts/sharded_crawl.py --merge [--dir=shards] [--no-apply] [--force]
+      merge the shard results in DIR and apply them
+"""
+import json
+import os
+import subprocess
+import sys
+
+from changeset import ChangesetConflict, apply_changeset, merge_changesets
+from layout_check import preflight_or_exit
+from nabu_fetch import URL, DEFAULT_MAX_IN_FLIGHT, DEFAULT_RPS, fetch_listing
+from nabu_parse import listing_ids
+from page_archive import ARCHIVE_DIR, PageArchive
+from db_utils import connect
+
+DB = 'brueter.sqlite'
+SCRAPER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nabuPageScraper.py')
+
+
+def plan_shards(web_ids, n):
+    """[(lo, hi)] ranges covering all ids, about len(web_ids)/n each; hi None for the last."""
+    ids = sorted(web_ids)
+    bounds = sorted({0} | {ids[len(ids) * k // n] for k in range(1, n) if ids})
+    return [(lo, hi) for lo, hi in zip(bounds, bounds[1:] + [None])]
+
+
+def shard_dir(directory, k):
+    return os.path.join(directory, 'shard_{}'.format(k))
+
+
+def shard_command(directory, k, lo, hi):
+    return [sys.executable, SCRAPER, '--ids=' + os.path.join(shard_dir(directory, k), 'ids.txt'),
+            '--range={}-{}'.format(lo, '' if hi is None else hi),
+            '--changeset=' + os.path.join(shard_dir(directory, k), 'changeset.jsonl'), '--skip-layout-check']
+
+
+def shard_budget(n, share):
+    """(SCRAPER_RPS, SCRAPER_MAX_IN_FLIGHT) of each of n shards."""
+    if not share:
+        return DEFAULT_RPS, DEFAULT_MAX_IN_FLIGHT
+    return DEFAULT_RPS / n, max(1, DEFAULT_MAX_IN_FLIGHT // n)
+
+
+def write_plan(directory, n):
+    web_ids = listing_ids(fetch_listing(URL))
+    ranges = plan_shards(web_ids, n)
+    os.makedirs(directory, exist_ok=True)
+    for k, (lo, hi) in enumerate(ranges):
+        os.makedirs(shard_dir(directory, k), exist_ok=True)
+        with open(os.path.join(shard_dir(directory, k), 'ids.txt'), 'w', encoding='utf-8') as f:
+            f.writelines('{}\n'.format(web_id) for web_id in sorted(web_ids)
+                         if web_id >= lo and (hi is None or web_id < hi))
+    with open(os.path.join(directory, 'plan.json'), 'w', encoding='utf-8') as f:
+        json.dump({'url': URL, 'shards': [{'shard': k, 'lo': lo, 'hi': hi} for k, (lo, hi) in enumerate(ranges)]},
+                  f, indent=2)
+    return ranges
+
+
+def read_plan(directory):
+    with open(os.path.join(directory, 'plan.json'), encoding='utf-8') as f:
+        return [(s['lo'], s['hi']) for s in json.load(f)['shards']]
+
+
+def crawl_shards(directory, ranges, share_budget=False):
+    """Run every shard as a local process; returns the shards that failed."""
+    rps, max_in_flight = shard_budget(len(ranges), share_budget)
+    env = dict(os.environ, SCRAPER_RPS=str(rps), SCRAPER_MAX_IN_FLIGHT=str(max_in_flight))
+    procs = []
+    for k, (lo, hi) in enumerate(ranges):
+        os.makedirs(shard_dir(directory, k), exist_ok=True)
+        log = open(os.path.join(shard_dir(directory, k), 'log.txt'), 'w', encoding='utf-8')
+        shard_env = dict(env, PAGE_ARCHIVE=os.path.join(shard_dir(directory, k), 'archive'))
+        procs.append((k, log, subprocess.Popen(shard_command(directory, k, lo, hi), env=shard_env,
+                                               stdout=log, stderr=subprocess.STDOUT)))
+    failed = []
+    for k, log, proc in procs:
+        if proc.wait() != 0:
+            failed.append(k)
+        log.close()
+        print('shard {}: {}'.format(k, 'failed, see ' + log.name if proc.returncode else 'done'))
+    return failed
+
+
+def merge(directory, apply=True, force=False):
+    ranges = read_plan(directory)
+    shards = []
+    for k, (lo, hi) in enumerate(ranges):
+        path = os.path.join(shard_dir(directory, k), 'changeset.jsonl')
+        if not os.path.exists(path):
+            sys.exit('Missing {}; nothing was merged.'.format(path))
+        shards.append((path, lo, hi))
+    merged_path = os.path.join(directory, 'merged.jsonl')
+    try:
+        count = merge_changesets(shards, merged_path)
+    except ChangesetConflict as e:
+        print(e)
+        sys.exit('Nothing was merged.')
+    print('Merged {} shards: {} changes in {}'.format(len(shards), count, merged_path))
+    archive = PageArchive(ARCHIVE_DIR)
+    try:
+        for k in range(len(ranges)):
+            if os.path.isdir(os.path.join(shard_dir(directory, k), 'archive')):
+                archive.merge(os.path.join(shard_dir(directory, k), 'archive'))
+    finally:
+        archive.close()
+    if not apply:
+        print('Apply later with: python scripts/apply_changeset.py ' + merged_path)
+        return
+    conn = connect(DB)
+    try:
+        writer = apply_changeset(conn, merged_path, force=force)
+    except ChangesetConflict as e:
+        print(e)
+        sys.exit('Nothing was applied.')
+    finally:
+        conn.close()
+    print('Applied: {}, already applied {}'.format(writer.summary(), writer.skipped))
+
+
+def main():
+    n = os.cpu_count() or 1
+    directory = 'shards'
+    for arg in sys.argv[1:]:
+        if arg.startswith('--shards='):
+            n = max(1, int(arg.split('=', 1)[1]))
+        elif arg.startswith('--dir='):
+            directory = arg.split('=', 1)[1]
+    apply = '--no-apply' not in sys.argv[1:]
+    force = '--force' in sys.argv[1:]
+    share_budget = '--share-budget' in sys.argv[1:]
+    if '--merge' in sys.argv[1:]:
+        merge(directory, apply, force)
+        return
+    conn = connect(DB, readonly=True, upgrade=False) if os.path.exists(DB) else None
+    try:
+        preflight_or_exit(conn)
+    finally:
+        if conn is not None:
+            conn.close()
+    ranges = write_plan(directory, n)
+    if '--plan' in sys.argv[1:]:
+        for k, (lo, hi) in enumerate(ranges):
+            print(' '.join(shard_command(directory, k, lo, hi)))
+        rps, max_in_flight = shard_budget(len(ranges), share_budget)
+        print('Each shard should run with SCRAPER_RPS={} SCRAPER_MAX_IN_FLIGHT={} and its own PAGE_ARCHIVE.'.format(
+            rps, max_in_flight))
+        return
+    print('{} shards: {}'.format(len(ranges), ', '.join('{}-{}'.format(lo, '' if hi is None else hi)
+                                                         for lo, hi in ranges)))
+    failed = crawl_shards(directory, ranges, share_budget)
+    if failed:
+        sys.exit('Shards {} failed; rerun them and then --merge.'.format(', '.join(map(str, failed))))
+    merge(directory, apply, force)
+
+
+if __name__ == '__main__':
+    main()